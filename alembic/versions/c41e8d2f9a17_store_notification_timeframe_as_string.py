@@ -0,0 +1,29 @@
+"""Store NotificationHistory timeframe as a string
+
+Revision ID: c41e8d2f9a17
+Revises: 7a3c424c7031
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e8d2f9a17'
+down_revision: Union[str, None] = '7a3c424c7031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Timeframes are configurable now (TIMEFRAMES), so the column is no longer limited to 15m/4h
+    op.alter_column('notification_history', 'timeframe', existing_type=sa.Enum('15m', '4h'), type_=sa.String(8),
+                    existing_nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('notification_history', 'timeframe', existing_type=sa.String(8), type_=sa.Enum('15m', '4h'),
+                    existing_nullable=True)
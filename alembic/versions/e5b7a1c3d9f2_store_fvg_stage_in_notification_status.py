@@ -0,0 +1,34 @@
+"""Store FVG lifecycle stage in NotificationHistory status
+
+Revision ID: e5b7a1c3d9f2
+Revises: c41e8d2f9a17
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7a1c3d9f2'
+down_revision: Union[str, None] = 'c41e8d2f9a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PRICE_STATUSES = ('high', 'low')
+FVG_STAGES = ('created', 'partially_filled', 'filled')
+
+
+def upgrade() -> None:
+    # FVG creation and fill notifications get separate cooldowns, keyed by the stage stored in price_status
+    op.alter_column('notification_history', 'price_status', existing_type=sa.Enum(*PRICE_STATUSES),
+                    type_=sa.Enum(*PRICE_STATUSES, *FVG_STAGES), existing_nullable=True)
+
+
+def downgrade() -> None:
+    op.execute(sa.text("UPDATE notification_history SET price_status = NULL "
+                       "WHERE price_status IN ('created', 'partially_filled', 'filled')"))
+    op.alter_column('notification_history', 'price_status', existing_type=sa.Enum(*PRICE_STATUSES, *FVG_STAGES),
+                    type_=sa.Enum(*PRICE_STATUSES), existing_nullable=True)
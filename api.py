@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from sqlalchemy.orm import sessionmaker
 from lib.models import Base, Symbol
 from settings import DB_CONFIG, SECRET_KEY
 from lib.db_utils import wait_for_db
+from lib.symbol_snapshot import CachedResponse, SymbolSnapshot, dump_json
+from lib.market_snapshot import MarketSnapshotReader, MarketSnapshotUnavailable
+from lib import metrics
 import click
+import os
+import time
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
@@ -16,6 +21,55 @@ engine = wait_for_db(db_url)
 Session = sessionmaker(bind=engine)
 
 
+# Ответы строятся из снимка таблицы символов в памяти; клиенты, приславшие If-None-Match, получают 304
+snapshot = SymbolSnapshot(Session)
+MAX_BATCH_SYMBOLS = 100
+
+# Рыночные данные бот публикует в разделяемую память; API читает их оттуда без БД
+market_snapshot = MarketSnapshotReader(os.environ.get('MARKET_SNAPSHOT_NAME', 'izzy_market_snapshot'))
+
+API_CALLS = {'symbols', 'symbol', 'batch', 'market', 'prices'}
+REQUEST_SECONDS = metrics.histogram('izzy_api_request_seconds', 'API request duration', ('endpoint', 'status'))
+MARKET_SNAPSHOT_AGE = metrics.gauge('izzy_api_market_snapshot_age_seconds',
+                                    'Time since the bot last published the market snapshot; NaN if unavailable')
+
+
+# Метрики снимаются из отдельного потока; у датчика свой читатель, чтобы не ждать блокировку читателя запросов
+market_snapshot_metrics = MarketSnapshotReader(market_snapshot.name)
+
+
+def market_snapshot_age():
+    try:
+        return time.time() - market_snapshot_metrics.read(lambda header, arrays: header[5])
+    except MarketSnapshotUnavailable:
+        return float('nan')
+
+
+MARKET_SNAPSHOT_AGE.set_function(market_snapshot_age)
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Метки только из известных значений: произвольные call и пути не должны плодить ряды метрик
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if endpoint == '/api/glitter.jsp':
+            endpoint = request.args.get('call') if request.args.get('call') in API_CALLS else 'invalid'
+        REQUEST_SECONDS.labels(endpoint, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_handler():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route('/api/glitter.jsp', methods=['GET'])
 def api_handler():
     call = request.args.get('call')
@@ -24,42 +78,58 @@ def api_handler():
     elif call == 'symbol':
         symbol = request.args.get('symbol')
         return get_symbol(symbol)
+    elif call == 'batch':
+        return get_batch(request.args.get('symbols', ''))
+    elif call == 'market':
+        return get_market(request.args.get('symbol'))
+    elif call == 'prices':
+        return get_prices()
     else:
         return jsonify({'error': 'Invalid call parameter'}), 400
 
 
+def cached_json_response(cached):
+    response = Response(cached.body, mimetype='application/json')
+    response.set_etag(cached.etag)
+    # Клиент хранит ответ, но перепроверяет его при каждом опросе
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 def get_symbols():
-    session = Session()
-    try:
-        symbols = session.query(Symbol).all()
-        result = []
-        for symbol in symbols:
-            print(f"Symbol: {symbol.symbol}, Last Mark Price: {symbol.last_mark_price}")  # Debug print
-            result.append({
-                'symbol': symbol.symbol,
-                'icon_class': symbol.icon_class,
-                'last_mark_price': float(symbol.last_mark_price) if symbol.last_mark_price is not None else None
-            })
-        return jsonify(result)
-    finally:
-        session.close()
+    return cached_json_response(snapshot.get_symbols())
 
 
 def get_symbol(symbol_name):
-    session = Session()
+    cached = snapshot.get_symbol(symbol_name)
+    if cached is None:
+        return jsonify({'error': 'Symbol not found'}), 404
+    return cached_json_response(cached)
+
+
+def get_batch(symbol_names):
+    names = [name for name in symbol_names.split(',') if name]
+    if not names or len(names) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'Pass 1 to {MAX_BATCH_SYMBOLS} comma-separated symbols'}), 400
+    return cached_json_response(snapshot.get_batch(names))
+
+
+def get_market(symbol_name):
     try:
-        symbol = session.get(Symbol, symbol_name)
-        if symbol:
-            print(f"Symbol: {symbol.symbol}, Last Mark Price: {symbol.last_mark_price}")  # Debug print
-            return jsonify({
-                'symbol': symbol.symbol,
-                'icon_class': symbol.icon_class,
-                'last_mark_price': float(symbol.last_mark_price) if symbol.last_mark_price is not None else None
-            })
-        else:
-            return jsonify({'error': 'Symbol not found'}), 404
-    finally:
-        session.close()
+        market = market_snapshot.get_market(symbol_name or '')
+    except MarketSnapshotUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    if market is None:
+        return jsonify({'error': 'Symbol not found'}), 404
+    return cached_json_response(CachedResponse(dump_json(market)))
+
+
+def get_prices():
+    try:
+        prices = market_snapshot.get_mark_prices()
+    except MarketSnapshotUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    return cached_json_response(CachedResponse(dump_json(prices)))
 
 
 def insert_initial_symbols():
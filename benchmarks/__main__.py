@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# Замеры горячих путей: python -m benchmarks [--profile full] [--output results.json] [--baseline baseline.json]
+# Код возврата 1, если по сравнению с базовой линией есть регрессии
+import argparse
+import logging
+import os
+import sys
+
+from .cases import PROFILES, SUITES, collect
+from .runner import compare, format_time, load, run, save
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='IzzyMoonbow hot path benchmarks')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES), help='run only these suites')
+    parser.add_argument('-k', dest='pattern', help='run only benchmarks whose key contains this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum duration of one timing series, s')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a benchmark counts as a regression (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    # Уведомления и трекеры пишут в лог на каждую операцию — это не то, что замеряется
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('lib').setLevel(logging.ERROR)
+
+    benchmarks = collect(args.profile, args.suite, args.pattern)
+    results = run(benchmarks, args.repeat, args.min_time)
+    results['meta']['profile'] = args.profile
+    if args.output:
+        save(results, args.output)
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare")
+        return 0
+
+    rows = compare(results, load(args.baseline), args.tolerance)
+    print(f"\nComparison with {args.baseline}:")
+    for key, baseline, current, ratio, status in rows:
+        ratio = f"{ratio:.2f}x" if ratio is not None else '-'
+        print(f"{key:<60} {format_time(baseline):>10} -> {format_time(current):>10} {ratio:>7}  {status}")
+    regressions = [row for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import matplotlib
+
+from lib.chart import render_chart
+from lib.db_utils import create_async_db_engine, create_async_session_maker
+from lib.market import Market
+from lib.models import Base, Symbol, User
+from lib.notification_dispatcher import NotificationDispatcher
+from lib.notification_manager import NotificationManager
+from lib.replay import CapturingBot, ReplayExchange
+from lib.screener import ExtremeRangeScreener
+from lib.timeframes import TimeframeEngine, resample_history, resample_length
+from .generators import generate_candles, generate_universe
+from .runner import Benchmark
+
+# Размеры по профилям: quick — для проверки каждого изменения, full — полный диапазон (до 1000 символов и 10k свечей)
+PROFILES = {
+    'quick': {'symbols': (10, 100), 'candles': (100, 1000), 'chart_candles': (100,), 'users': (10,)},
+    'full': {'symbols': (10, 100, 1000), 'candles': (100, 1000, 10000), 'chart_candles': (100, 1000),
+             'users': (10, 100)},
+}
+
+
+# Биржа без сети из реплея; последние fresh свечей приходят отдельным обновлением, чтобы трекеры успели
+# выдать события FVG
+class BenchExchange(ReplayExchange):
+    def add_markets(self, universe: dict, window: int = 100, fresh: int = 16) -> dict:
+        for symbol, candles in universe.items():
+            market = make_market(symbol, candles[:-fresh], self.timeframes, window, self)
+            for tracker in market.fvg_trackers.values():
+                tracker.subscribe(self.publish_fvg_event)
+            market.update_from_data({market.base_timeframe: candles})
+            self.markets[symbol] = market
+        return self.markets
+
+
+# Рынок с окном графиков window свечей; без старших таймфреймов размер окна не ограничен историей
+def make_market(symbol: str, candles, timeframes=('15m',), window: int = 100, exchange=None) -> Market:
+    market = Market(exchange, symbol, timeframes)
+    if window != market.max_candles:
+        market.max_candles = window
+        market.engine = TimeframeEngine(timeframes, window)
+    market.update_from_data({market.base_timeframe: candles, **resample_history(candles, timeframes, window)})
+    return market
+
+
+def market_cases(profile: dict):
+    for count in profile['candles']:
+        def process_candles(count=count):
+            frame = generate_candles(count).to_dataframe()
+            market = Market(None, 'SYM0000USDT', ('15m',))
+            return lambda: market._process_candles(frame)
+
+        yield Benchmark('market.process_candles', {'candles': count}, process_candles, count)
+
+        def candle_fvgs(count=count):
+            candles = generate_candles(count)
+
+            def scan():
+                for candle in candles:
+                    fvg = candle.get_fvg(1.0)
+                    if fvg is not None:
+                        fvg.get_covered_size()
+            return scan
+
+        yield Benchmark('candle.get_fvg', {'candles': count}, candle_fvgs, count)
+
+        def market_fvgs(count=count):
+            market = make_market('SYM0000USDT', generate_candles(count), window=count)
+            return lambda: market.get_fvgs('15m')
+
+        yield Benchmark('market.get_fvgs', {'candles': count}, market_fvgs, count)
+
+    for symbols in profile['symbols']:
+        for count in profile['candles']:
+            params = {'symbols': symbols, 'candles': count}
+
+            # Холодная загрузка: создание рынков, слияние свечей и трекеры FVG
+            def update_from_data(symbols=symbols, count=count):
+                universe = generate_universe(symbols, count)
+
+                def load():
+                    for symbol, candles in universe.items():
+                        Market(None, symbol, ('15m',)).update_from_data({'15m': candles})
+                return load
+
+            yield Benchmark('market.update_from_data', params, update_from_data, symbols * count)
+
+            def extreme_range(symbols=symbols, count=count):
+                markets = [make_market(symbol, candles, window=count)
+                           for symbol, candles in generate_universe(symbols, count).items()]
+                return lambda: [market.is_price_in_extreme_range('15m') for market in markets]
+
+            yield Benchmark('market.is_price_in_extreme_range', params, extreme_range, symbols)
+
+            def screener(symbols=symbols, count=count):
+                markets = {symbol: make_market(symbol, candles, window=count)
+                           for symbol, candles in generate_universe(symbols, count).items()}
+                screener = ExtremeRangeScreener(('15m',))
+                return lambda: screener.screen(markets)
+
+            yield Benchmark('screener.screen', params, screener, symbols)
+
+
+def chart_cases(profile: dict):
+    matplotlib.use('Agg')
+    for count in profile['chart_candles']:
+        for template in (True, False):
+            def render(count=count, template=template):
+                market = make_market('SYM0000USDT', generate_candles(count), window=count)
+                payload = market.get_chart_payload('15m', 'fvg')
+                return lambda: render_chart(payload, use_template=template)
+
+            yield Benchmark('chart.render', {'candles': count, 'template': template}, render)
+
+
+# Полный цикл проверки уведомлений на SQLite: выборка пользователей и символов, таблица статусов, события FVG,
+# решения по паузам, рассылка без лимитов Telegram и запись истории
+def notification_cases(profile: dict):
+    for symbols in profile['symbols']:
+        for users in profile['users']:
+            def cycle(symbols=symbols, users=users):
+                exchange = BenchExchange()
+                events = []
+                exchange.subscribe_fvg_events(events.append)
+                exchange.add_markets(generate_universe(symbols, resample_length(exchange.timeframes, 100)))
+
+                loop = asyncio.new_event_loop()
+                directory = tempfile.mkdtemp(prefix='izzy-bench-')
+                engine = create_async_db_engine(f"sqlite:///{os.path.join(directory, 'izzy.db')}")
+                AsyncSession = create_async_session_maker(engine)
+                loop.run_until_complete(_prepare_database(engine, AsyncSession, exchange.markets, users))
+
+                dispatcher = NotificationDispatcher(global_rate=1e9)
+                dispatcher.PRIVATE_CHAT_RATE = 1e9
+                manager = NotificationManager(exchange, AsyncSession, dispatcher=dispatcher)
+                context = SimpleNamespace(bot=CapturingBot())
+
+                def run_cycle():
+                    manager.cooldowns.last_sent.clear()
+                    manager.fvg_events.clear()
+                    for event in events:
+                        manager.on_fvg_event(event)
+                    loop.run_until_complete(manager.check_and_send_notifications(context))
+
+                def teardown():
+                    loop.run_until_complete(engine.dispose())
+                    loop.close()
+                    shutil.rmtree(directory, ignore_errors=True)
+                return run_cycle, teardown
+
+            yield Benchmark('notifications.cycle', {'symbols': symbols, 'users': users}, cycle, symbols)
+
+
+async def _prepare_database(engine, AsyncSession, markets: dict, users: int):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with AsyncSession() as session:
+        for user_id in range(1, users + 1):
+            session.add(User(id=user_id, notification_timeout=3600, price_notifications=True,
+                             fvg_notifications=True))
+        for symbol in markets:
+            session.add(Symbol(symbol=symbol, icon_class='', monitor_fvg=True, fvg_threshold=0.0))
+        await session.commit()
+
+
+SUITES = {
+    'market': market_cases,
+    'chart': chart_cases,
+    'notifications': notification_cases,
+}
+
+
+def collect(profile: str = 'quick', suites=None, pattern: str = None) -> list:
+    benchmarks = []
+    for name, suite in SUITES.items():
+        if suites and name not in suites:
+            continue
+        benchmarks.extend(benchmark for benchmark in suite(PROFILES[profile])
+                          if pattern is None or pattern in benchmark.key)
+    return benchmarks
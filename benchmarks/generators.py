@@ -0,0 +1,39 @@
+import numpy as np
+
+from lib.candle_series import CandleSeries
+from lib.timeframes import TIMEFRAME_MS
+
+# Начало синтетической истории: 2024-01-01 UTC, кратно любому таймфрейму
+START_MS = 1_704_067_200_000
+
+
+# Детерминированная синтетическая история OHLC+ОИ: случайное блуждание цены с волатильностью volatility
+# (доля цены на свечу) и импульсами — с вероятностью gap_density свеча проходит несколько волатильностей,
+# и тени её соседей не пересекаются, то есть образуется имбаланс. Одинаковые параметры дают одинаковые свечи
+def generate_candles(count: int, volatility: float = 0.01, gap_density: float = 0.05, seed: int = 0,
+                     timeframe: str = '15m', start_price: float = 100.0, oi_missing: float = 0.0) -> CandleSeries:
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0, volatility, count)
+    gaps = rng.random(count) < gap_density
+    returns[gaps] += rng.choice((-1.0, 1.0), gaps.sum()) * volatility * rng.uniform(3.0, 6.0, gaps.sum())
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wicks = np.abs(rng.normal(0.0, volatility / 2, (2, count)))
+    high = np.maximum(open_, close) * (1 + wicks[0])
+    low = np.minimum(open_, close) * (1 - wicks[1])
+    volume = rng.lognormal(3.0, 1.0, count)
+    open_interest = 1e6 * np.exp(np.cumsum(rng.normal(0.0, volatility / 2, count)))
+    if oi_missing:
+        open_interest[rng.random(count) < oi_missing] = np.nan
+    timestamps = START_MS + np.arange(count, dtype=np.int64) * TIMEFRAME_MS[timeframe]
+    return CandleSeries(timestamps, open_, high, low, close, volume, open_interest)
+
+
+# Набор символов с разными ценами и сидами; история каждого символа не зависит от их числа
+def generate_universe(symbols: int, count: int, volatility: float = 0.01, gap_density: float = 0.05,
+                      timeframe: str = '15m') -> dict:
+    return {
+        f"SYM{index:04d}USDT": generate_candles(count, volatility, gap_density, seed=index, timeframe=timeframe,
+                                                start_price=10.0 ** (index % 5 - 1))
+        for index in range(symbols)
+    }
@@ -0,0 +1,115 @@
+import json
+import platform
+import statistics
+import time
+import timeit
+
+import numpy as np
+
+
+# Один замер: имя случая, его параметры и функция без аргументов; items — сколько единиц работы
+# (свечей, символов, графиков) делает один вызов, для пропускной способности
+class Benchmark:
+    __slots__ = ('name', 'params', 'setup', 'items')
+
+    def __init__(self, name: str, params: dict, setup, items: int = 1):
+        self.name = name
+        self.params = params
+        # Подготовка данных не входит в замер: setup() возвращает функцию, которую и замеряем, или пару
+        # (функция, teardown), если после замера нужно освободить ресурсы (event loop, БД, временные файлы)
+        self.setup = setup
+        self.items = items
+
+    @property
+    def key(self) -> str:
+        params = ','.join(f"{name}={value}" for name, value in self.params.items())
+        return f"{self.name}[{params}]" if params else self.name
+
+
+# Замерить функцию: число вызовов в серии подбирается так, чтобы серия шла не меньше min_time,
+# результат — медиана и минимум времени одного вызова по repeat сериям
+def measure(benchmark: Benchmark, repeat: int = 5, min_time: float = 0.2) -> dict:
+    function = benchmark.setup()
+    function, teardown = function if isinstance(function, tuple) else (function, None)
+    try:
+        timer = timeit.Timer(function)
+        number = 1
+        while True:
+            elapsed = timer.timeit(number)
+            if elapsed >= min_time or number >= 1_000_000:
+                break
+            number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+        timings = [elapsed / number] + [timer.timeit(number) / number for _ in range(repeat - 1)]
+    finally:
+        if teardown is not None:
+            teardown()
+    median = statistics.median(timings)
+    return {
+        'params': benchmark.params,
+        'median': median,
+        'min': min(timings),
+        'number': number,
+        'repeat': repeat,
+        'items_per_second': benchmark.items / median if median else None,
+    }
+
+
+def run(benchmarks, repeat: int = 5, min_time: float = 0.2, report=print) -> dict:
+    results = {}
+    for benchmark in benchmarks:
+        results[benchmark.key] = result = measure(benchmark, repeat, min_time)
+        report(f"{benchmark.key:<60} {format_time(result['median']):>10}  "
+               f"({result['items_per_second']:,.0f} items/s)")
+    return {'meta': environment(), 'results': results}
+
+
+def environment() -> dict:
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+# Сравнить с базовой линией по лучшей серии (она меньше всего зависит от фоновой нагрузки): регрессия —
+# время выросло больше чем на tolerance (доля). Возвращает строки (ключ, базовое время, текущее время,
+# отношение, статус) для всех случаев текущего прогона
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    rows = []
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            rows.append((key, None, result['min'], None, 'new'))
+            continue
+        ratio = result['min'] / base['min']
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((key, base['min'], result['min'], ratio, status))
+    return rows
+
+
+def format_time(seconds) -> str:
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(results: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -1,38 +1,127 @@
 import logging
 
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from .fvg import FVG
 
+if TYPE_CHECKING:
+    from .candle_series import CandleSeries
 
+# Признак того, что соседняя свеча берётся из серии, а не задана вручную
+_FROM_SERIES = object()
+
+
+# Свеча — лёгкое представление строки CandleSeries по индексу
 class Candle:
-    def __init__(self, data: pd.Series):
-        self.data = data
-        self.open = float(data['open'])
-        self.high = float(data['high'])
-        self.low = float(data['low'])
-        self.close = float(data['close'])
-        self.timestamp = data.name
-        self.open_interest = float(data['open_interest']) if 'open_interest' in data else None
-        self.prev: Optional['Candle'] = None
-        self.next: Optional['Candle'] = None
+    __slots__ = ('series', 'index', '_prev', '_next')
+
+    def __init__(self, data, index: int = 0):
+        if isinstance(data, pd.Series):
+            from .candle_series import CandleSeries
+            data = CandleSeries.from_rows([data])
+            index = 0
+
+        self.series: 'CandleSeries' = data
+        self.index = index
+        self._prev = _FROM_SERIES
+        self._next = _FROM_SERIES
+
+    # Между процессами свеча передаётся как ссылка на строку серии; соседи, заданные вручную, не переносятся
+    def __reduce__(self):
+        return Candle, (self.series, self.index)
+
+    @property
+    def open(self) -> float:
+        return float(self.series.open[self.index])
+
+    @property
+    def high(self) -> float:
+        return float(self.series.high[self.index])
+
+    @property
+    def low(self) -> float:
+        return float(self.series.low[self.index])
+
+    @property
+    def close(self) -> float:
+        return float(self.series.close[self.index])
+
+    @property
+    def volume(self) -> float:
+        return float(self.series.volume[self.index])
+
+    @property
+    def open_interest(self) -> Optional[float]:
+        value = self.series.open_interest[self.index]
+        return None if np.isnan(value) else float(value)
+
+    @property
+    def timestamp_ms(self) -> int:
+        return int(self.series.timestamps[self.index])
+
+    @property
+    def timestamp(self) -> pd.Timestamp:
+        return pd.Timestamp(self.timestamp_ms, unit='ms')
+
+    @property
+    def data(self) -> pd.Series:
+        values = {column: getattr(self.series, column)[self.index] for column in self.series.COLUMNS}
+        return pd.Series(values, name=self.timestamp)
+
+    @property
+    def prev(self) -> Optional['Candle']:
+        if self._prev is not _FROM_SERIES:
+            return self._prev
+        return Candle(self.series, self.index - 1) if self.index > 0 else None
+
+    @prev.setter
+    def prev(self, candle: Optional['Candle']):
+        self._prev = candle
+
+    @property
+    def next(self) -> Optional['Candle']:
+        if self._next is not _FROM_SERIES:
+            return self._next
+        return Candle(self.series, self.index + 1) if self.index + 1 < len(self.series) else None
+
+    @next.setter
+    def next(self, candle: Optional['Candle']):
+        self._next = candle
+
+    # Свечи, идущие после текущей со смещением offset
+    def following(self, offset: int = 1) -> 'CandleSeries':
+        if self._next is _FROM_SERIES:
+            return self.series[self.index + offset:]
+
+        from .candle_series import CandleSeries
+        candles = []
+        current = self
+        for _ in range(offset):
+            current = current.next if current else None
+        while current:
+            candles.append(current)
+            current = current.next
+        return CandleSeries.from_candles(candles)
 
     def is_bullish(self) -> bool:
         return self.close >= self.open
 
     def get_fvg(self, min_gap_percent: float) -> Optional[FVG]:
-        if not (self.prev and self.next):
+        prev_candle = self.prev
+        next_candle = self.next
+        if not (prev_candle and next_candle):
             return None
 
         if self.is_bullish():
-            fvg_size = self.next.low - self.prev.high
-            fvg_size_in_percent = (fvg_size / self.prev.high) * 100.0
+            fvg_size = next_candle.low - prev_candle.high
+            fvg_size_in_percent = (fvg_size / prev_candle.high) * 100.0
             if (fvg_size > 0) and fvg_size_in_percent > min_gap_percent:
-                return FVG(self.prev.high, self.next.low, self)
+                return FVG(prev_candle.high, next_candle.low, self)
         else:
-            fvg_size = self.prev.low - self.next.high
-            fvg_size_in_percent = (fvg_size / self.next.high) * 100.0
+            fvg_size = prev_candle.low - next_candle.high
+            fvg_size_in_percent = (fvg_size / next_candle.high) * 100.0
             if fvg_size > 0 and fvg_size_in_percent > min_gap_percent:
-                return FVG(self.prev.low, self.next.high, self)
+                return FVG(prev_candle.low, next_candle.high, self)
 
         return None
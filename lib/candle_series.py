@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, Iterator, Optional, Union
+
+from .candle import Candle
+
+
+# Колоночное хранилище свечей: по одному непрерывному массиву NumPy на каждое поле
+class CandleSeries:
+    __slots__ = ('timestamps', 'open', 'high', 'low', 'close', 'volume', 'open_interest')
+
+    COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'open_interest')
+
+    def __init__(self, timestamps, open, high, low, close, volume=None, open_interest=None):
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        size = len(self.timestamps)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = self._column_or_nan(volume, size)
+        self.open_interest = self._column_or_nan(open_interest, size)
+
+    @staticmethod
+    def _column_or_nan(values, size: int) -> np.ndarray:
+        if values is None:
+            return np.full(size, np.nan)
+        return np.ascontiguousarray(values, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> 'CandleSeries':
+        return cls(np.empty(0, dtype=np.int64), *(np.empty(0) for _ in cls.COLUMNS))
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'CandleSeries':
+        if df.empty or 'close' not in df.columns:
+            return cls.empty()
+
+        df = df.sort_index()
+        timestamps = df.index.values.astype('datetime64[ms]').astype(np.int64)
+        columns = [df[column].to_numpy(dtype=np.float64, copy=True) if column in df.columns else None
+                   for column in cls.COLUMNS]
+        return cls(timestamps, *columns)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[pd.Series]) -> 'CandleSeries':
+        return cls.from_dataframe(pd.DataFrame(list(rows)))
+
+    @classmethod
+    def from_candles(cls, candles: Iterable[Candle]) -> 'CandleSeries':
+        candles = list(candles)
+        if not candles:
+            return cls.empty()
+
+        timestamps = [candle.timestamp_ms for candle in candles]
+        columns = [[getattr(candle, column) for candle in candles] for column in cls.COLUMNS]
+        columns[-1] = [np.nan if value is None else value for value in columns[-1]]
+        return cls(timestamps, *columns)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Candle, 'CandleSeries']:
+        if isinstance(key, slice):
+            return CandleSeries(self.timestamps[key], *(getattr(self, column)[key] for column in self.COLUMNS))
+
+        size = len(self.timestamps)
+        index = key + size if key < 0 else key
+        if not 0 <= index < size:
+            raise IndexError(f"Candle index out of range: {key}")
+        return Candle(self, index)
+
+    def __iter__(self) -> Iterator[Candle]:
+        for index in range(len(self.timestamps)):
+            yield Candle(self, index)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + sum(getattr(self, column).nbytes for column in self.COLUMNS)
+
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.timestamps[-1]) if len(self.timestamps) else None
+
+    def copy(self) -> 'CandleSeries':
+        return CandleSeries(self.timestamps.copy(), *(getattr(self, column).copy() for column in self.COLUMNS))
+
+    # Объединить с более свежими свечами: пересекающиеся свечи заменяются новыми, недостающий ОИ берётся из старых
+    def merge(self, newer: 'CandleSeries', max_length: int = None) -> 'CandleSeries':
+        if not len(newer):
+            merged = self
+        elif not len(self):
+            merged = newer
+        else:
+            keep = int(np.searchsorted(self.timestamps, newer.timestamps[0]))
+            overlap = self.timestamps[keep:]
+            positions = np.searchsorted(newer.timestamps, overlap)
+            matched = positions < len(newer)
+            matched[matched] &= newer.timestamps[positions[matched]] == overlap[matched]
+
+            open_interest = newer.open_interest.copy()
+            missing = np.isnan(open_interest[positions[matched]])
+            open_interest[positions[matched][missing]] = self.open_interest[keep:][matched][missing]
+
+            merged = CandleSeries(
+                np.concatenate([self.timestamps[:keep], newer.timestamps]),
+                *(np.concatenate([getattr(self, column)[:keep], getattr(newer, column)])
+                  for column in self.COLUMNS[:-1]),
+                np.concatenate([self.open_interest[:keep], open_interest]),
+            )
+
+        return merged.tail(max_length) if max_length else merged
+
+    def tail(self, count: int) -> 'CandleSeries':
+        return self[-count:] if count < len(self) else self
+
+    def to_dataframe(self) -> pd.DataFrame:
+        index = pd.DatetimeIndex(self.timestamps.astype('datetime64[ms]'), name='timestamp')
+        return pd.DataFrame({column: getattr(self, column) for column in self.COLUMNS}, index=index)
@@ -0,0 +1,92 @@
+import logging
+import os
+import re
+import shutil
+
+import numpy as np
+
+from .candle_series import CandleSeries
+
+
+# Дисковый кэш свечей: по каталогу на символ и таймфрейм, по файлу на колонку (сырые little-endian массивы).
+# Файлы дописываются в конец и читаются через memmap; при сбое во время записи длина берётся по самой короткой колонке
+class CandleStore:
+    COLUMNS = (('timestamps', '<i8'),) + tuple((column, '<f8') for column in CandleSeries.COLUMNS)
+    RECORD_SIZE = 8
+
+    def __init__(self, root: str, max_records: int = 5000):
+        self.root = root
+        self.max_records = max_records
+        self.logger = logging.getLogger(__name__)
+
+    def _directory(self, symbol: str, timeframe: str) -> str:
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', symbol) or not re.fullmatch(r'[A-Za-z0-9]+', timeframe):
+            raise ValueError(f"Invalid cache key: {symbol} {timeframe}")
+        return os.path.join(self.root, symbol, timeframe)
+
+    def _length(self, directory: str) -> int:
+        sizes = []
+        for column, _ in self.COLUMNS:
+            path = os.path.join(directory, column)
+            sizes.append(os.path.getsize(path) // self.RECORD_SIZE if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def load(self, symbol: str, timeframe: str, count: int = None) -> CandleSeries:
+        directory = self._directory(symbol, timeframe)
+        length = self._length(directory)
+        if not length:
+            return CandleSeries.empty()
+
+        start = max(length - count, 0) if count else 0
+        columns = []
+        for column, dtype in self.COLUMNS:
+            values = np.memmap(os.path.join(directory, column), dtype=dtype, mode='r', shape=(length,))
+            columns.append(np.array(values[start:]))
+            del values
+        return CandleSeries(*columns)
+
+    # Записать свечи, начиная с первой из переданных: более поздние записи в файле заменяются.
+    # Если между сохранёнными и новыми свечами есть разрыв, кэш начинается заново
+    def write(self, symbol: str, timeframe: str, candles: CandleSeries, interval_ms: int = None):
+        if not len(candles):
+            return
+
+        directory = self._directory(symbol, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        length = self._length(directory)
+        position = 0
+        if length:
+            stored = np.memmap(os.path.join(directory, 'timestamps'), dtype='<i8', mode='r', shape=(length,))
+            first_timestamp = int(candles.timestamps[0])
+            if interval_ms is None or first_timestamp <= int(stored[-1]) + interval_ms:
+                position = int(np.searchsorted(stored, first_timestamp))
+            del stored
+
+        offset = position * self.RECORD_SIZE
+        for column, dtype in self.COLUMNS:
+            path = os.path.join(directory, column)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(np.ascontiguousarray(getattr(candles, column), dtype=dtype).tobytes())
+
+        if position + len(candles) > self.max_records:
+            self._compact(symbol, timeframe)
+
+    # Оставить последние max_records / 2 свечей: пишем новый каталог и подменяем им старый
+    def _compact(self, symbol: str, timeframe: str):
+        directory = self._directory(symbol, timeframe)
+        candles = self.load(symbol, timeframe, self.max_records // 2)
+        compacted = directory + '.compact'
+        previous = directory + '.old'
+        shutil.rmtree(compacted, ignore_errors=True)
+        shutil.rmtree(previous, ignore_errors=True)
+        os.makedirs(compacted)
+        for column, dtype in self.COLUMNS:
+            with open(os.path.join(compacted, column), 'wb') as f:
+                f.write(np.ascontiguousarray(getattr(candles, column), dtype=dtype).tobytes())
+
+        os.replace(directory, previous)
+        os.replace(compacted, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+        self.logger.debug(f"Compacted candle cache for {symbol} {timeframe} to {len(candles)} records")
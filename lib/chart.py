@@ -1,53 +1,43 @@
 import logging
+from functools import lru_cache
 
+import matplotlib
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba
 import mplfinance as mpf
+import numpy as np
 from io import BytesIO
 from typing import List
+from . import metrics
 from .fvg import FVG
-import pandas as pd
+from .candle_series import CandleSeries
+
+RENDER_SECONDS = metrics.histogram('izzy_chart_render_seconds', 'Time to draw and save a chart in this process')
+
+
+@lru_cache(maxsize=1)
+def get_chart_style():
+    mc = mpf.make_marketcolors(up='g', down='r', inherit=True)
+    return mpf.make_mpf_style(marketcolors=mc, gridstyle=':', gridaxis='both')
 
 
 class Chart:
-    def __init__(self, candles, title: str):
+    def __init__(self, candles: CandleSeries, title: str, template: 'ChartTemplate' = None):
         self.candles = candles
-        self.df = pd.DataFrame([c.data for c in candles])
         self.title = title
-        self._plot_candlesticks()
+        self.template = template
+        if template is not None:
+            template.update(candles, title)
+            self.fig, self.axes, self.ax = template.fig, template.axes, template.ax
+        else:
+            self.df = candles.to_dataframe()
+            self._plot_candlesticks()
 
     def _plot_candlesticks(self):
-        # Define custom style
-        mc = mpf.make_marketcolors(up='g', down='r', inherit=True)
-        style = mpf.make_mpf_style(marketcolors=mc, gridstyle=':', gridaxis='both')
-
-        ap = mpf.make_addplot(self.df['open_interest'], panel=1, type='line', ylabel='ОИ')
-
-        # Plot candlesticks
-        self.fig, self.axes = mpf.plot(
-            self.df,
-            type='candle',
-            style=style,
-            title=self.title,
-            ylabel='Цена, USDT',
-            volume=False,
-            figsize=(10, 6),
-            returnfig=True,
-            addplot=ap
-        )
-
-        # Get the main price axis
+        self.fig, self.axes = _plot_figure(self.df, self.title)
         self.ax = self.axes[0]
 
-        # Customize grid
-        self.ax.grid(True, linestyle=':', alpha=0.6)
-        self.ax.set_axisbelow(True)  # Place grid behind other elements
-
-        # Customize x-axis
-        self.ax.tick_params(axis='x', rotation=0)
-
-        # Adjust the layout
-        self.fig.subplots_adjust(left=0.05, right=0.95, top=0.8, bottom=0.05)
-
     def draw_range(self, start_price: float, end_price: float, color: str, alpha: float = 0.3):
         self.ax.axhspan(start_price, end_price, facecolor=color, alpha=alpha)
 
@@ -61,13 +51,162 @@ class Chart:
 
     def highlight_price_ranges(self, low_threshold, high_threshold):
         if low_threshold:
-            self.ax.axhspan(self.df['low'].min(), low_threshold, facecolor='lightcoral', alpha=0.3)
+            self.ax.axhspan(self.candles.low.min(), low_threshold, facecolor='lightcoral', alpha=0.3)
         if high_threshold:
-            self.ax.axhspan(high_threshold, self.df['high'].max(), facecolor='lightgreen', alpha=0.3)
+            self.ax.axhspan(high_threshold, self.candles.high.max(), facecolor='lightgreen', alpha=0.3)
 
     def save(self) -> BytesIO:
         buf = BytesIO()
-        self.fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+        if self.template is not None:
+            # Фигура шаблона остаётся открытой для следующих графиков
+            self.fig.savefig(buf, format='png', dpi=300, bbox_inches=self.template.get_tight_bbox())
+        else:
+            self.fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+            plt.close(self.fig)
         buf.seek(0)
-        plt.close(self.fig)
         return buf
+
+
+def _plot_figure(df, title: str):
+    ap = mpf.make_addplot(df['open_interest'], panel=1, type='line', ylabel='ОИ')
+
+    # Plot candlesticks
+    fig, axes = mpf.plot(
+        df,
+        type='candle',
+        style=get_chart_style(),
+        title=title,
+        ylabel='Цена, USDT',
+        volume=False,
+        figsize=(10, 6),
+        returnfig=True,
+        addplot=ap
+    )
+
+    # Get the main price axis
+    ax = axes[0]
+
+    # Customize grid
+    ax.grid(True, linestyle=':', alpha=0.6)
+    ax.set_axisbelow(True)  # Place grid behind other elements
+
+    # Customize x-axis
+    ax.tick_params(axis='x', rotation=0)
+
+    # Adjust the layout
+    fig.subplots_adjust(left=0.05, right=0.95, top=0.8, bottom=0.05)
+    return fig, axes
+
+
+# Формат подписей времени, как его выбирает mplfinance
+def _date_format(dates: np.ndarray) -> str:
+    first, last = mdates.num2date(dates[0]), mdates.num2date(dates[-1])
+    if (dates[-1] - dates[0]) / len(dates) < 0.33:
+        return '%b %d, %H:%M' if first.date() != last.date() else '%H:%M'
+    return '%Y-%b-%d' if first.year != last.year else '%b %d'
+
+
+# Готовая фигура на size свечей: при рендеринге меняются только данные артистов, заголовок, пределы осей
+# и наложения, а фигура, оси, стиль и панель ОИ строятся один раз
+class ChartTemplate:
+    def __init__(self, size: int):
+        self.size = size
+        prices = np.linspace(1.0, 2.0, size)
+        placeholder = CandleSeries(np.arange(size, dtype=np.int64) * 60_000, prices, prices, prices, prices,
+                                   np.ones(size), np.ones(size))
+        self.fig, self.axes = _plot_figure(placeholder.to_dataframe(), '')
+        self.ax = self.axes[0]
+        self.oi_ax = self.axes[2]
+        # Рендерер фигуры сразу с разрешением сохранения, чтобы обрезка совпадала с bbox_inches='tight'
+        self.fig.set_dpi(300)
+        self.wicks, self.bodies = self.ax.collections[:2]
+        self.oi_line = self.oi_ax.lines[0]
+        self.formatters = [ax.xaxis.get_major_formatter() for ax in self.axes]
+        self.base_patches = set(self.ax.patches)
+
+        # Цвета тела, контура и фитиля для растущих и падающих свечей (как их раскрашивает mplfinance)
+        mc = get_chart_style()['marketcolors']
+        self.colors = {
+            direction: (to_rgba(mc['candle'][direction], mc['alpha']), to_rgba(mc['edge'][direction]),
+                        to_rgba(mc['wick'][direction]))
+            for direction in ('up', 'down')
+        }
+        self.half_width = self.bodies.get_paths()[0].get_extents().width / 2
+        self.x = np.arange(size, dtype=np.float64)
+
+    def update(self, candles: CandleSeries, title: str):
+        if len(candles) != self.size:
+            raise ValueError(f"Template is built for {self.size} candles, got {len(candles)}")
+
+        for patch in set(self.ax.patches) - self.base_patches:
+            patch.remove()
+
+        x, opens, closes = self.x, candles.open, candles.close
+        left, right = x - self.half_width, x + self.half_width
+        self.bodies.set_verts(np.stack([
+            np.column_stack([left, opens]), np.column_stack([left, closes]),
+            np.column_stack([right, closes]), np.column_stack([right, opens])
+        ], axis=1))
+        body_low, body_high = np.minimum(opens, closes), np.maximum(opens, closes)
+        self.wicks.set_segments(np.concatenate([
+            np.stack([np.column_stack([x, candles.low]), np.column_stack([x, body_low])], axis=1),
+            np.stack([np.column_stack([x, candles.high]), np.column_stack([x, body_high])], axis=1),
+        ]))
+
+        up = opens < closes
+        colors = [np.where(up[:, None], up_color, down_color)
+                  for up_color, down_color in zip(self.colors['up'], self.colors['down'])]
+        self.bodies.set_facecolors(colors[0])
+        self.bodies.set_edgecolors(colors[1])
+        self.wicks.set_colors(np.concatenate([colors[2], colors[2]]))
+
+        self.oi_line.set_data(x, candles.open_interest)
+        self.oi_ax.relim()
+        self.oi_ax.autoscale_view()
+
+        # Пределы считаются как в mplfinance: по свечам с полшага по краям, затем отступы осей;
+        # наложения, добавленные после update, расширяют их так же, как при обычном построении
+        step = (x[-1] - x[0]) / len(x) if len(x) > 1 else 0.75
+        self.ax.ignore_existing_data_limits = True
+        self.ax.update_datalim([(x[0] - step, np.nanmin(candles.low)), (x[-1] + step, np.nanmax(candles.high))])
+        self.ax.autoscale_view()
+
+        dates = mdates.date2num(candles.timestamps.astype('datetime64[ms]'))
+        date_format = _date_format(dates)
+        for formatter in self.formatters:
+            formatter.dates, formatter.len, formatter.fmt = dates, len(dates), date_format
+        self.fig._suptitle.set_text(title)
+
+    # Та же обрезка полей, что bbox_inches='tight', но без лишнего полного прохода отрисовки
+    def get_tight_bbox(self):
+        return self.fig.get_tightbbox(self.fig.canvas.get_renderer()).padded(plt.rcParams['savefig.pad_inches'])
+
+
+@lru_cache(maxsize=4)
+def get_chart_template(size: int) -> ChartTemplate:
+    return ChartTemplate(size)
+
+
+# Отрисовка по компактному описанию графика: его можно передать в процесс рендеринга без объектов Candle.
+# payload: candles (CandleSeries), title, ranges [(start, end, color, alpha)], price_ranges (low, high) или None
+def render_chart(payload: dict, use_template: bool = True) -> bytes:
+    with RENDER_SECONDS.time():
+        candles = payload['candles']
+        template = get_chart_template(len(candles)) if use_template and len(candles) else None
+        chart = Chart(candles, payload['title'], template)
+        for start_price, end_price, color, alpha in payload.get('ranges', ()):
+            chart.draw_range(start_price, end_price, color, alpha)
+        if payload.get('price_ranges'):
+            chart.highlight_price_ranges(*payload['price_ranges'])
+        return chart.save().getvalue()
+
+
+# Подготовить процесс к рендерингу: импорт бэкенда, стиль, шрифты и шаблон на size свечей,
+# чтобы первый настоящий график не платил за это
+def warm_up(size: int = 100):
+    matplotlib.use('Agg')
+    get_chart_style()
+    prices = np.linspace(1.0, 2.0, size)
+    candles = CandleSeries(np.arange(size, dtype=np.int64) * 60_000, prices, prices + 0.1, prices - 0.1, prices,
+                           np.ones(size), np.ones(size))
+    render_chart({'candles': candles, 'title': 'warm-up'})
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+
+# LRU-кэш отрендеренных PNG. Одинаковые одновременные запросы ждут один общий рендер (single-flight).
+# Ключ: (символ, таймфрейм, время последней свечи, набор наложений)
+class ChartCache:
+    def __init__(self, max_entries: int = 128, max_age: float = 60.0):
+        self.max_entries = max_entries
+        # Формирующаяся свеча меняется без смены ключа, поэтому записи живут не дольше max_age секунд
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, key: Hashable):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            created, data = entry
+            if time.monotonic() - created > self.max_age:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, key: Hashable, data: bytes):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def get_or_render(self, key: Hashable, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        future = self.inflight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Исключение достаётся ожидающим; если их нет, не даём asyncio ругаться на непрочитанную ошибку
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.inflight[key] = future
+        try:
+            data = await render()
+            self.put(key, data)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+    # Сбросить графики символа (или одного его таймфрейма) при поступлении новых свечей
+    def invalidate(self, symbol: str, timeframe: str = None):
+        with self.lock:
+            stale = [key for key in self.entries if key[0] == symbol and (timeframe is None or key[1] == timeframe)]
+            for key in stale:
+                del self.entries[key]
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from telegram.error import BadRequest
+
+
+# Отправка графиков с загрузкой в Telegram один раз: после первой отправки PNG запоминается file_id фото,
+# и следующие получатели того же графика получают его по file_id без повторной загрузки.
+# Записи живут столько же, сколько отрендеренный график в кэше биржи (ключ меняется с новой свечой)
+class ChartDelivery:
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.file_ids = exchange.chart_file_ids
+        self.uploads = {}
+        self.uploaded = 0
+        self.reused = 0
+        self.logger = logging.getLogger(__name__)
+
+    # Отправить график в чат; False, если для графика нет данных
+    async def send_chart(self, bot, chat_id: int, symbol: str, timeframe: str, overlay: str = 'plain',
+                         caption: str = None) -> bool:
+        key = self.exchange.get_chart_key(symbol, timeframe, overlay)
+        if key is None:
+            return False
+
+        rejected = False
+        while True:
+            file_id = self.file_ids.get(key)
+            if file_id is None:
+                upload = self.uploads.get(key)
+                if upload is None:
+                    return await self._upload(bot, chat_id, key, symbol, timeframe, overlay, caption)
+                # Тот же график прямо сейчас загружается для другого получателя — ждём его file_id.
+                # Если загрузка не удалась (например, тот получатель заблокировал бота), проверяем заново:
+                # загружать снова станет ровно один из ожидающих, остальные дождутся его
+                try:
+                    file_id = await asyncio.shield(upload)
+                except Exception:
+                    continue
+                if file_id is None:
+                    return False
+
+            try:
+                await bot.send_photo(chat_id, photo=file_id, caption=caption)
+                self.reused += 1
+                return True
+            except BadRequest as e:
+                # Telegram не принял file_id — загружаем график заново. Если отклонён и второй file_id, дело
+                # не в нём, а в чате (например, чат не найден). Forbidden (бот заблокирован) отдаём вызывающему сразу
+                if rejected:
+                    raise
+                rejected = True
+                self.logger.warning(f"Cached chart file_id for {symbol} ({timeframe}) rejected: {str(e)}")
+                self.file_ids.invalidate(symbol, timeframe)
+
+    async def _upload(self, bot, chat_id, key, symbol, timeframe, overlay, caption) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку загрузки получат ожидающие; если их нет, не даём asyncio ругаться на непрочитанную ошибку
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.uploads[key] = future
+        try:
+            chart_bytes = await self.exchange.get_chart_bytes(symbol, timeframe, overlay)
+            if chart_bytes is None:
+                future.set_result(None)
+                return False
+
+            message = await bot.send_photo(chat_id, photo=chart_bytes, caption=caption)
+            file_id = message.photo[-1].file_id
+            self.file_ids.put(key, file_id)
+            self.uploaded += 1
+            future.set_result(file_id)
+            return True
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self.uploads.get(key) is future:
+                del self.uploads[key]
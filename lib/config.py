@@ -1,6 +1,8 @@
 import os
 import logging
 
+from .timeframes import parse_timeframes
+
 
 class Config:
     def __init__(self):
@@ -15,10 +17,56 @@ class Config:
         self.DB_USER = os.environ.get('DB_USER', 'root')
         self.DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
         self.DB_NAME = os.environ.get('DB_NAME', 'izzy_db')
+        # Full SQLAlchemy URL overriding the MySQL settings above, e.g. sqlite:///izzy.db for local testing
+        self.DB_URL = os.environ.get('DB_URL')
+        # Async connection pool used by the bot handlers and jobs
+        self.DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+        self.DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+        # Market data ingestion: 'poll' (REST every minute) or 'stream' (Bybit WebSocket)
+        self.INGESTION_MODE = os.environ.get('INGESTION_MODE', 'poll')
+        self.STREAM_URL = os.environ.get('STREAM_URL', 'wss://stream.bybit.com/v5/public/linear')
+        # Comma-separated chart/notification timeframes. Only the smallest one is polled from Bybit; the history of
+        # the others is fetched once (cold start without the candle cache) and their forming candles are resampled
+        # from the smallest one locally
+        self.TIMEFRAMES = os.environ.get('TIMEFRAMES', '15m,4h')
+
+        # Worker processes sharing the symbols between them (fetching, candle cache, resampling, FVG tracking and
+        # screening); 0 keeps everything in the bot process. Workers send their changes every SHARD_PUBLISH_INTERVAL s
+        self.SHARD_WORKERS = int(os.environ.get('SHARD_WORKERS', 0))
+        self.SHARD_PUBLISH_INTERVAL = float(os.environ.get('SHARD_PUBLISH_INTERVAL', 1))
+
+        # Prometheus metrics endpoint of the bot (http://host:METRICS_PORT/metrics); 0 disables it.
+        # Local only by default; set METRICS_HOST=0.0.0.0 to let a scraper on another host or container reach it
+        self.METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+        self.METRICS_PORT = int(os.environ.get('METRICS_PORT', 9101))
+
+        # On-disk candle cache for warm restarts; empty value disables it
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(root_dir, 'cache'))
+
+        # Chart rendering processes; 0 renders charts inside the bot event loop
+        self.RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))
+        self.RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 30))
+
+        # How often buffered user activity (profiles, last_seen) is written to the database, seconds
+        self.USER_FLUSH_INTERVAL = int(os.environ.get('USER_FLUSH_INTERVAL', 10))
+
+        # How often the bot re-reads the symbol table to pick up changes made outside of it, seconds
+        self.SYMBOL_REFRESH_INTERVAL = int(os.environ.get('SYMBOL_REFRESH_INTERVAL', 30))
+
+        # Shared-memory market snapshot read by api.py and other local processes; empty name disables it
+        self.MARKET_SNAPSHOT_NAME = os.environ.get('MARKET_SNAPSHOT_NAME', 'izzy_market_snapshot')
+        self.MARKET_SNAPSHOT_INTERVAL = float(os.environ.get('MARKET_SNAPSHOT_INTERVAL', 1))
+        # Initial symbol capacity of the snapshot; it is re-created with more room when more symbols are tracked
+        self.MARKET_SNAPSHOT_SYMBOLS = int(os.environ.get('MARKET_SNAPSHOT_SYMBOLS', 64))
+        self.MARKET_SNAPSHOT_CANDLES = int(os.environ.get('MARKET_SNAPSHOT_CANDLES', 100))
 
         self.logger.info("Config initialized successfully")
 
     def get_db_url(self):
+        if self.DB_URL:
+            return self.DB_URL
         url = f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}/{self.DB_NAME}"
         self.logger.debug(f"Generated database URL: {url}")
         return url
@@ -29,4 +77,7 @@ class Config:
         missing_vars = [var for var in required_vars if getattr(self, var) is None]
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+        if self.INGESTION_MODE not in ('poll', 'stream'):
+            raise ValueError(f"Invalid INGESTION_MODE: {self.INGESTION_MODE}")
+        parse_timeframes(self.TIMEFRAMES)
         self.logger.info("Config validation completed")
@@ -1,6 +1,11 @@
+import asyncio
+import logging
 import time
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+logger = logging.getLogger(__name__)
 
 
 def wait_for_db(db_url, max_retries=30, retry_interval=2):
@@ -18,3 +23,39 @@ def wait_for_db(db_url, max_retries=30, retry_interval=2):
             time.sleep(retry_interval)
 
     raise Exception("Max retries reached. Unable to connect to the database.")
+
+
+# Асинхронный драйвер для того же URL: pymysql -> aiomysql, sqlite -> aiosqlite
+def get_async_db_url(db_url: str) -> str:
+    driver, _, rest = db_url.partition('://')
+    drivers = {'mysql': 'mysql+aiomysql', 'mysql+pymysql': 'mysql+aiomysql', 'sqlite': 'sqlite+aiosqlite'}
+    return f"{drivers.get(driver, driver)}://{rest}"
+
+
+def create_async_db_engine(db_url: str, pool_size: int = 10, max_overflow: int = 10) -> AsyncEngine:
+    db_url = get_async_db_url(db_url)
+    if db_url.startswith('sqlite'):
+        return create_async_engine(db_url)
+    # MySQL закрывает простаивающие соединения (wait_timeout), поэтому соединения проверяются и пересоздаются
+    return create_async_engine(db_url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True,
+                               pool_recycle=3600)
+
+
+# Сессии не сбрасывают загруженные атрибуты после commit: объекты читаются и после закрытия сессии
+def create_async_session_maker(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+# Асинхронная проверка готовности БД: SELECT 1 через пул движка
+async def wait_for_db_async(engine: AsyncEngine, max_retries=30, retry_interval=2):
+    for attempt in range(1, max_retries + 1):
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text('SELECT 1'))
+            return engine
+        except (OperationalError, OSError) as e:
+            logger.warning(f"Database is not ready, retrying in {retry_interval}s (attempt {attempt}/{max_retries}): "
+                           f"{str(e)}")
+            await asyncio.sleep(retry_interval)
+
+    raise Exception("Max retries reached. Unable to connect to the database.")
@@ -1,103 +1,571 @@
 import logging
 import queue
+import random
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 
-import numpy as np
-import pandas as pd
+import requests
+from pybit.exceptions import FailedRequestError, InvalidRequestError
 from pybit.unified_trading import HTTP
 
+from .exchange_stream import ExchangeStream
+from .candle_series import CandleSeries
+from .candle_store import CandleStore
+from .chart_cache import ChartCache
+from . import metrics
 from .exchange_updater import ExchangeUpdater
+from .kline_parser import build_candle_series
 from .market import Market
+from .market_workers import ShardCoordinator
+from .render_pool import RenderPool
+from .rate_limiter import TokenBucket
+from .screener import ExtremeRangeScreener, StatusTable
+from .timeframes import DEFAULT_TIMEFRAMES, INTERVAL_MS, INTERVAL_TIMEFRAMES, KLINE_INTERVALS, OI_INTERVALS, \
+    history_length, parse_timeframes
+
+FETCH_CYCLE_SECONDS = metrics.histogram('izzy_fetch_cycle_seconds', 'Time to fetch all markets from Bybit')
+SYMBOL_FETCH_SECONDS = metrics.histogram('izzy_symbol_fetch_seconds',
+                                         'Time to fetch candles and open interest of one market')
+MARKET_APPLY_SECONDS = metrics.histogram('izzy_market_apply_seconds',
+                                         'Time to apply fetched data to the markets (merge, resample, FVG tracking)')
+REQUESTS = metrics.counter('izzy_exchange_requests_total', 'Bybit REST requests', ('endpoint',))
+RETRIES = metrics.counter('izzy_exchange_retries_total', 'Retried Bybit REST requests', ('endpoint',))
+FAILURES = metrics.counter('izzy_exchange_failures_total', 'Bybit REST requests failed after retries',
+                           ('endpoint',))
+RATE_LIMIT_WAIT = metrics.counter('izzy_exchange_rate_limit_wait_seconds_total',
+                                  'Time spent waiting for Bybit rate limits', ('endpoint',))
+MARKETS = metrics.gauge('izzy_markets', 'Markets with data in this process')
+MARKET_DATA_AGE = metrics.gauge('izzy_market_data_age_seconds', 'Time since the market last received data',
+                                ('symbol',))
+CHART_RENDER_LATENCY = metrics.histogram('izzy_chart_render_latency_seconds',
+                                         'Time from a chart cache miss to PNG bytes, including the render pool queue')
 
 
 class Exchange:
-    def __init__(self, symbol_manager, api_key: str, api_secret: str):
+    # Интервал свечей Bybit -> длительность свечи
+    INTERVAL_MS = INTERVAL_MS
+    # Максимум строк в одном ответе Bybit; длинная история загружается страницами
+    KLINE_PAGE = 1000
+    OI_PAGE = 200
+
+    # Bybit ограничивает публичные REST-запросы 600 запросами за 5 секунд с одного IP;
+    # держим запас и дополнительно ограничиваем каждый эндпоинт отдельно
+    IP_RATE_LIMIT = 100
+    ENDPOINT_RATE_LIMITS = {'kline': 50, 'open_interest': 50}
+    # Коды Bybit, после которых запрос имеет смысл повторить: лимит запросов и временные ошибки сервера
+    RETRY_CODES = {10002, 10006, 10016}
+    MAX_RETRIES = 4
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 8.0
+
+    def __init__(self, symbol_manager, api_key: str, api_secret: str, ingestion_mode: str = 'poll',
+                 stream_url: str = ExchangeStream.PUBLIC_URL, fetch_workers: int = 8, cache_dir: str = None,
+                 render_pool: RenderPool = None, timeframes=DEFAULT_TIMEFRAMES, shard_workers: int = 0,
+                 shard_publish_interval: float = 1.0, rate_limit_share: float = 1.0):
         self.symbol_manager = symbol_manager
-        self.session = HTTP(api_key=api_key, api_secret=api_secret, testnet=False)
+        # Повторы делает сам Exchange (с учётом лимитов), поэтому встроенные повторы pybit отключены
+        self.session = HTTP(api_key=api_key, api_secret=api_secret, testnet=False, max_retries=1)
+        self.session.client.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=fetch_workers))
+        self.fetch_workers = fetch_workers
+        self.fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='exchange-fetch')
+        # Лимиты общие для IP: процессу-воркеру из N достаётся 1/N каждого из них
+        self.ip_rate_limiter = TokenBucket(self.IP_RATE_LIMIT * rate_limit_share)
+        self.rate_limiters = {endpoint: TokenBucket(rate * rate_limit_share)
+                              for endpoint, rate in self.ENDPOINT_RATE_LIMITS.items()}
+        # Пауза перед повтором запроса; подменяется в тестах
+        self.sleep = time.sleep
+        self.fetch_stats_lock = threading.Lock()
+        self.fetch_stats = self._empty_fetch_stats()
+        self.last_fetch_stats = None
         self.markets = {}
+        self.max_candles = 100
+        # С биржи постоянно загружается только базовый (младший) таймфрейм; история старших загружается один раз
+        # их собственным интервалом, а их формирующиеся свечи рынки собирают из базовых
+        self.timeframes = parse_timeframes(timeframes)
+        self.base_timeframe = self.timeframes[0]
+        self.base_interval = KLINE_INTERVALS[self.base_timeframe]
+        self.history_length = history_length(self.timeframes, self.max_candles)
+        # Статусы крайних диапазонов всех рынков; пересчитывается перед каждой проверкой уведомлений
+        self.screener = ExtremeRangeScreener(self.timeframes)
+        self.status_table = StatusTable.empty(self.timeframes)
+        # Счётчик изменений рыночных данных (растёт под market_data_lock) и его значение на момент расчёта таблицы
+        self.data_version = 0
+        self.status_version = -1
+        # Сопоставление ОИ свечам: 'exact', 'asof' (последнее известное значение) или 'drop'
+        self.oi_alignment = 'asof'
+        # Время открытия самой свежей полученной свечи для каждой пары (символ, интервал)
+        self.last_timestamps = {}
         self.logger = logging.getLogger(__name__)
         self.market_data_lock = threading.Lock()
-        self.updater = ExchangeUpdater(self)
-        self.updater.start()
+        self.fvg_listeners = []
+        self.candle_close_listeners = []
+        # Символы, догрузка которых с REST уже идёт
+        self.backfilling = set()
+        self.backfill_lock = threading.Lock()
+        # После сжатия в кэше остаётся половина записей — её должно хватать на всю историю базового таймфрейма
+        self.candle_store = CandleStore(cache_dir, max(5000, 2 * self.history_length)) if cache_dir else None
+        # Запись кэша свечей вне market_data_lock; один поток сохраняет порядок записей каждого рынка
+        self.candle_store_executor = (ThreadPoolExecutor(max_workers=1, thread_name_prefix='candle-store')
+                                      if cache_dir else None)
+        self.chart_cache = ChartCache()
+        # file_id уже загруженных в Telegram графиков с теми же ключами, что и в chart_cache
+        self.chart_file_ids = ChartCache()
+        # Без пула графики рендерятся прямо в event loop
+        self.render_pool = render_pool
+        self.ingestion_mode = ingestion_mode
+        self.updater = None
+        self.stream = None
+        self.shards = None
+        # Частичные таблицы статусов воркеров в шардированном режиме
+        self.shard_tables = {}
+        if shard_workers > 0:
+            # Загрузкой и анализом занимаются процессы-воркеры (с тем же классом биржи), здесь только их результаты
+            self.shards = ShardCoordinator(self, shard_workers, type(self), {
+                'api_key': api_key, 'api_secret': api_secret, 'ingestion_mode': ingestion_mode,
+                'stream_url': stream_url, 'cache_dir': cache_dir, 'timeframes': self.timeframes,
+                'publish_interval': shard_publish_interval
+            }).start()
+            self.shards.rebalance(self.symbol_manager.get_symbols())
+        elif ingestion_mode == 'stream':
+            self.load_cached_markets()
+            self.stream = ExchangeStream(self, stream_url)
+            self.stream.start()
+            self.logger.info("ExchangeStream thread started")
+        else:
+            self.load_cached_markets()
+            self.updater = ExchangeUpdater(self)
+            self.updater.start()
+            self.logger.info("ExchangeUpdater thread started")
+        self.symbol_manager.subscribe(self.on_symbols_changed)
+        MARKETS.set_function(lambda: len(self.markets))
+        MARKET_DATA_AGE.set_function(self.get_market_data_age)
         self.logger.info(f"Exchange initialized with {len(self.markets)} markets")
-        self.logger.info("ExchangeUpdater thread started")
+
+    # Набор символов изменился: рынки удалённых символов убираются сразу, в потоковом режиме
+    # подписки исправляются и новые рынки догружаются, не дожидаясь очередного heartbeat
+    def on_symbols_changed(self, symbols: list):
+        with self.market_data_lock:
+            added = [symbol for symbol in symbols if symbol not in self.markets]
+            self.markets = {symbol: market for symbol, market in self.markets.items() if symbol in symbols}
+            self.data_version += 1
+        self.logger.info(f"Symbols changed: {len(symbols)} symbols, {len(added)} new")
+
+        if self.shards is not None:
+            self.shards.rebalance(symbols)
+            return
+        if added:
+            self.load_cached_markets(added)
+        if self.updater is not None and added:
+            self.updater.refresh()
+        if self.stream is not None and self.stream.connected.is_set():
+            self.stream.sync_subscriptions()
+            if added:
+                self.start_backfill(added)
 
     def update_markets(self):
-        try:
-            new_data = self.updater.data_queue.get_nowait()
-            with self.market_data_lock:
+        if self.updater is None:
+            # В потоковом режиме рынки обновляются по мере поступления сообщений
+            return
+
+        updates = 0
+        while True:
+            try:
+                new_data = self.updater.data_queue.get_nowait()
+            except queue.Empty:
+                break
+            with MARKET_APPLY_SECONDS.time(), self.market_data_lock:
                 self.process_new_market_data(new_data)
-            self.logger.info("Markets updated with new data")
-        except queue.Empty:
+            updates += 1
+
+        if updates:
+            self.logger.info(f"Markets updated with new data ({updates} batches)")
+        else:
             self.logger.debug("No new market data available")
 
     def process_new_market_data(self, new_data):
-        symbols = self.symbol_manager.get_symbols()
+        symbols = set(self.symbol_manager.get_symbols())
         for symbol, data in new_data.items():
             if symbol in symbols:
                 if symbol not in self.markets:
-                    self.markets[symbol] = Market(self, symbol)
+                    self.markets[symbol] = self.create_market(symbol)
                 self.markets[symbol].update_from_data(data)
+                self.invalidate_charts(symbol)
 
         self.markets = {symbol: market for symbol, market in self.markets.items() if symbol in symbols}
+        self.data_version += 1
+
+    # Поднять рынки из дискового кэша, чтобы графики и уведомления работали сразу после перезапуска,
+    # а первая загрузка с биржи была дельтой от последней сохранённой свечи
+    def load_cached_markets(self, symbols=None):
+        if self.candle_store is None:
+            return
+
+        try:
+            symbols = symbols or self.symbol_manager.get_symbols()
+        except Exception as e:
+            self.logger.error(f"Unable to load cached markets: {str(e)}")
+            return
+
+        with self.market_data_lock:
+            for symbol in symbols:
+                if symbol in self.markets:
+                    continue
+                market = self.create_market(symbol)
+                last_timestamps = market.load_from_store()
+                if not last_timestamps:
+                    continue
+                self.markets[symbol] = market
+                for timeframe, timestamp in last_timestamps.items():
+                    self.last_timestamps[(symbol, KLINE_INTERVALS[timeframe])] = timestamp
+            self.data_version += 1
+        self.logger.info(f"Loaded {len(self.markets)} markets from candle cache")
+
+    # Шардированный режим: принять изменения от воркера (вызывается из потока координатора)
+    def apply_shard_result(self, result):
+        with self.market_data_lock:
+            symbols = set(self.symbol_manager.get_symbols())
+            for symbol, (mark_price, windows, open_fvgs) in result.markets.items():
+                if symbol not in symbols:
+                    continue
+                if symbol not in self.markets:
+                    self.markets[symbol] = self.create_market(symbol)
+                self.markets[symbol].apply_shard_update(mark_price, windows, open_fvgs)
+                # При опросе графики сбрасываются с каждой загрузкой, в потоке — только на закрытии свечи
+                if windows and self.ingestion_mode == 'poll':
+                    self.invalidate_charts(symbol)
+            self.markets = {symbol: market for symbol, market in self.markets.items() if symbol in symbols}
+            self.shard_tables[result.shard] = result.status_table
+            self.status_table = StatusTable.concat(self.shard_tables.values(), self.timeframes)
+
+        for event in result.fvg_events:
+            self.publish_fvg_event(event)
+        for symbol, timeframe in result.closed:
+            self.invalidate_charts(symbol, timeframe)
+            for listener in self.candle_close_listeners:
+                listener(symbol, timeframe)
+
+    def create_market(self, symbol: str) -> Market:
+        market = Market(self, symbol)
+        for tracker in market.fvg_trackers.values():
+            tracker.subscribe(self.publish_fvg_event)
+        return market
+
+    # REST-догрузка для потокового режима: при подключении и при разрывах в потоке
+    def backfill_markets(self, symbols=None):
+        market_data = self.fetch_markets(symbols or self.symbol_manager.get_symbols())
+        with self.market_data_lock:
+            self.process_new_market_data(market_data)
+        self.logger.info(f"Backfilled {len(market_data)} markets")
+
+    # Догрузить символы в фоне. Символы, догрузка которых уже идёт, пропускаются: иначе каждое сообщение потока
+    # с дырой в данных запускало бы ещё одну загрузку того же символа, и они делили бы лимиты запросов
+    def start_backfill(self, symbols=None):
+        with self.backfill_lock:
+            symbols = [symbol for symbol in (symbols or self.symbol_manager.get_symbols())
+                       if symbol not in self.backfilling]
+            self.backfilling.update(symbols)
+        if not symbols:
+            return None
+
+        def backfill():
+            try:
+                self.backfill_markets(symbols)
+            except Exception as e:
+                self.logger.error(f"Error backfilling {len(symbols)} markets: {str(e)}")
+            finally:
+                with self.backfill_lock:
+                    self.backfilling.difference_update(symbols)
+
+        thread = threading.Thread(target=backfill, daemon=True)
+        thread.start()
+        return thread
+
+    # Закрытие базовой свечи закрывает и свечи старших таймфреймов, которые на ней заканчиваются
+    def apply_stream_kline(self, symbol: str, interval: str, items: list):
+        if interval != self.base_interval:
+            return
+
+        closed = []
+        with self.market_data_lock:
+            market = self.markets.get(symbol)
+            if market is None:
+                return
+            self.data_version += 1
+            for item in items:
+                timestamp = int(item['start'])
+                applied = market.apply_candle(
+                    self.base_timeframe, timestamp, float(item['open']), float(item['high']), float(item['low']),
+                    float(item['close']), float(item['volume'])
+                )
+                if not applied:
+                    self.request_resync(symbol)
+                    self.start_backfill([symbol])
+                    return
+                if item.get('confirm'):
+                    closed.extend(tf for tf in market.engine.closing_timeframes(timestamp) if tf not in closed)
+
+        for timeframe in closed:
+            self.invalidate_charts(symbol, timeframe)
+            for listener in self.candle_close_listeners:
+                listener(symbol, timeframe)
+
+    def apply_stream_ticker(self, symbol: str, data: dict):
+        with self.market_data_lock:
+            market = self.markets.get(symbol)
+            if market is None:
+                return
+            mark_price = data.get('markPrice')
+            open_interest = data.get('openInterest')
+            market.apply_ticker(
+                float(mark_price) if mark_price else None,
+                float(open_interest) if open_interest else None
+            )
+
+    # Пересчитать таблицу статусов по всем рынкам; таблица неизменяема, читатели берут её без блокировки
+    def screen_markets(self) -> StatusTable:
+        if self.shards is not None:
+            # Таблицу по частям считают воркеры
+            return self.status_table
+        with self.market_data_lock:
+            version = self.data_version
+            table = self.screener.screen(self.markets)
+            self.status_table = table
+            self.status_version = version
+        return table
+
+    # Таблица статусов по текущим данным для читателей между проверками уведомлений (снимок, графики диапазонов):
+    # пересчитывается, только если данные изменились с прошлого расчёта
+    def get_status_table(self) -> StatusTable:
+        if self.shards is None and self.status_version != self.data_version:
+            return self.screen_markets()
+        return self.status_table
+
+    def subscribe_candle_close(self, listener):
+        self.candle_close_listeners.append(listener)
+
+    def subscribe_fvg_events(self, listener):
+        self.fvg_listeners.append(listener)
+
+    def publish_fvg_event(self, event):
+        for listener in self.fvg_listeners:
+            listener(event)
 
     def get_market(self, symbol: str) -> Market:
         with self.market_data_lock:
             return self.markets.get(symbol)
 
+    # Сколько секунд назад каждый рынок получил данные (для метрик)
+    def get_market_data_age(self) -> dict:
+        now = time.time()
+        with self.market_data_lock:
+            return {(symbol,): now - market.updated_at for symbol, market in self.markets.items()
+                    if market.updated_at is not None}
+
+    def invalidate_charts(self, symbol: str, timeframe: str = None):
+        self.chart_cache.invalidate(symbol, timeframe)
+        self.chart_file_ids.invalidate(symbol, timeframe)
+
+    # Ключ содержимого графика: меняется с каждой новой свечой
+    def get_chart_key(self, symbol: str, timeframe: str, overlay: str = 'plain') -> Optional[tuple]:
+        market = self.get_market(symbol)
+        if market is None:
+            return None
+        return symbol, timeframe, market.get_candles(timeframe).last_timestamp(), overlay
+
+    # PNG графика из кэша; одинаковые одновременные запросы рендерятся один раз
+    async def get_chart_bytes(self, symbol: str, timeframe: str, overlay: str = 'plain') -> Optional[bytes]:
+        market = self.get_market(symbol)
+        if market is None:
+            return None
+
+        key = self.get_chart_key(symbol, timeframe, overlay)
+
+        async def render():
+            with CHART_RENDER_LATENCY.time():
+                if self.render_pool is None:
+                    return market.get_chart_bytes(timeframe, overlay)
+                payload = market.get_chart_payload(timeframe, overlay)
+                return await self.render_pool.render(payload) if payload is not None else None
+
+        return await self.chart_cache.get_or_render(key, render)
+
+    # Загрузить заново историю таймфрейма (по умолчанию базового) при следующем запросе рынка
+    def request_resync(self, symbol: str, timeframe: str = None):
+        timeframe = timeframe or self.base_timeframe
+        self.logger.info(f"Full {timeframe} resync requested for {symbol}")
+        self.last_timestamps.pop((symbol, KLINE_INTERVALS[timeframe]), None)
+
     def fetch_all_market_data(self):
         symbols = self.symbol_manager.get_symbols()
+        market_data = self.fetch_markets(symbols)
+
+        for key in [key for key in self.last_timestamps if key[0] not in symbols]:
+            del self.last_timestamps[key]
+        return market_data
+
+    # Параллельная загрузка рынков; скорость ограничивается лимитами Bybit, а не числом символов
+    def fetch_markets(self, symbols) -> dict:
+        started = time.monotonic()
+        with self.fetch_stats_lock:
+            self.fetch_stats = self._empty_fetch_stats()
+
         market_data = {}
-        for symbol in symbols:
+        futures = {self.fetch_executor.submit(self.fetch_market_data, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
             try:
-                kline_15m = self.get_kline(symbol, interval="15", limit=100)
-                kline_4h = self.get_kline(symbol, interval="240", limit=100)
-                market_data[symbol] = {
-                    '15m': kline_15m,
-                    '4h': kline_4h
-                }
+                market_data[symbol] = future.result()
             except Exception as e:
                 self.logger.error(f"Error fetching data for {symbol}: {str(e)}")
+
+        with self.fetch_stats_lock:
+            stats = dict(self.fetch_stats)
+        stats['symbols'] = len(market_data)
+        stats['wall_time'] = time.monotonic() - started
+        self.last_fetch_stats = stats
+        FETCH_CYCLE_SECONDS.observe(stats['wall_time'])
+        self.logger.info(
+            f"Fetched {stats['symbols']}/{len(futures)} markets in {stats['wall_time']:.2f}s: "
+            f"{stats['requests']} requests, {stats['retries']} retries, {stats['failures']} failures, "
+            f"{stats['rate_limit_wait']:.2f}s waiting for rate limits"
+        )
         return market_data
 
-    def get_kline(self, symbol: str, interval: str, limit: int):
+    @staticmethod
+    def _empty_fetch_stats() -> dict:
+        return {'requests': 0, 'retries': 0, 'failures': 0, 'rate_limit_wait': 0.0}
+
+    def _count(self, name: str, value=1):
+        with self.fetch_stats_lock:
+            self.fetch_stats[name] += value
+
+    # Запрос к Bybit с учётом лимитов и повторами с экспоненциальной задержкой и случайным разбросом
+    def _request(self, endpoint: str, method, **params):
+        attempt = 0
+        while True:
+            waited = self.ip_rate_limiter.acquire() + self.rate_limiters[endpoint].acquire()
+            self._count('rate_limit_wait', waited)
+            self._count('requests')
+            RATE_LIMIT_WAIT.labels(endpoint).inc(waited)
+            REQUESTS.labels(endpoint).inc()
+            try:
+                return method(**params)
+            except (FailedRequestError, InvalidRequestError, requests.exceptions.RequestException) as e:
+                retryable = not isinstance(e, InvalidRequestError) or e.status_code in self.RETRY_CODES
+                if not retryable or attempt >= self.MAX_RETRIES:
+                    self._count('failures')
+                    FAILURES.labels(endpoint).inc()
+                    raise
+                delay = random.uniform(0, min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** attempt))
+                self.logger.warning(f"Retrying {endpoint} for {params.get('symbol')} in {delay:.2f}s: {e}")
+                self._count('retries')
+                RETRIES.labels(endpoint).inc()
+                attempt += 1
+                self.sleep(delay)
+
+    # Базовый таймфрейм — дельтой. Историю старшего таймфрейма (max_candles свечей, по запросу свечей и ОИ)
+    # загружаем, только если её ещё нет: при запуске без кэша или когда она перестала стыковаться с базой
+    def fetch_market_data(self, symbol: str) -> dict:
+        data = {'delta': {}}
+        timeframe = self.base_timeframe
+        with SYMBOL_FETCH_SECONDS.time():
+            data[timeframe], data['delta'][timeframe] = self.fetch_kline_delta(symbol, self.base_interval)
+            for timeframe in self.timeframes[1:]:
+                key = (symbol, KLINE_INTERVALS[timeframe])
+                if key in self.last_timestamps:
+                    continue
+                candles = self.get_kline(symbol, KLINE_INTERVALS[timeframe], self.max_candles)
+                if len(candles):
+                    data[timeframe] = candles
+                    self.last_timestamps[key] = candles.last_timestamp()
+        return data
+
+    # Загрузить только свечи, начиная с последней полученной (она могла ещё формироваться).
+    # Полная загрузка — при первом запросе, после запроса resync или если дельта не стыкуется с известными данными
+    def fetch_kline_delta(self, symbol: str, interval: str):
+        key = (symbol, interval)
+        since = self.last_timestamps.get(key)
+        candles = self.get_kline(symbol, interval, self.history_length, start=since)
+        if not len(candles):
+            return candles, False
+
+        is_delta = since is not None and int(candles.timestamps[0]) == since
+        self.last_timestamps[key] = candles.last_timestamp()
+        return candles, is_delta
+
+    def get_kline(self, symbol: str, interval: str, limit: int, start: int = None) -> CandleSeries:
         try:
-            klines = self.session.get_kline(
+            # При дельта-запросе начинаем с известной свечи, поэтому лишние строки не запрашиваем
+            kline_params = {'start': start} if start is not None else {}
+            kline_data = self._request_pages(
+                'kline',
+                self.session.get_kline,
+                self.KLINE_PAGE,
+                limit,
+                'end',
+                lambda item: int(item[0]),
                 category="linear",
                 symbol=symbol,
                 interval=interval,
-                limit=limit
-            )
-            kline_data = klines['result']['list']
-
-            oiIntervalTime = '15min' if interval == '15' else '4h'
-            response = self.session.get_open_interest(
-                category="linear",
-                symbol=symbol,
-                intervalTime=oiIntervalTime,
-                limit=limit
+                **kline_params
             )
-            oi_data = response['result']['list']
 
-            df = pd.DataFrame(kline_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'].astype(np.int64), unit='ms')
-            df.set_index('timestamp', inplace=True)
-            df = df.astype(float)
-            df = df.sort_index()
+            # Для 2h, 6h и 12h у Bybit нет интервала ОИ: их история приходит без него
+            oi_interval = OI_INTERVALS.get(INTERVAL_TIMEFRAMES[interval])
+            oi_data = []
+            if oi_interval is not None:
+                oi_params = {'startTime': start} if start is not None else {}
+                oi_data = self._request_pages(
+                    'open_interest',
+                    self.session.get_open_interest,
+                    self.OI_PAGE,
+                    limit,
+                    'endTime',
+                    lambda item: int(item['timestamp']),
+                    category="linear",
+                    symbol=symbol,
+                    intervalTime=oi_interval,
+                    **oi_params
+                )
 
-            for item in oi_data:
-                # {'openInterest': '4144631.00000000', 'timestamp': '1726617600000'}
-                timestamp = pd.to_datetime(float(item['timestamp']), unit='ms')
-                open_interest = float(item['openInterest'])
-                df.loc[timestamp, 'open_interest'] = open_interest
-
-            return df
+            candles, report = build_candle_series(kline_data, oi_data,
+                                                  self.oi_alignment if oi_interval is not None else 'exact')
+            if report.dropped or report.missing or report.unmatched_oi:
+                self.logger.debug(f"Open interest alignment for {symbol} ({interval}): {report}")
+            return candles
         except Exception as e:
             self.logger.error(f"Error fetching kline data for {symbol}: {str(e)}")
-            return pd.DataFrame()
+            return CandleSeries.empty()
+
+    # Загрузить до limit строк страницами от новых к старым: каждая следующая страница заканчивается
+    # перед самой старой строкой предыдущей
+    def _request_pages(self, endpoint: str, method, page_size: int, limit: int, end_param: str, timestamp_of,
+                       **params) -> list:
+        rows = []
+        while len(rows) < limit:
+            size = min(page_size, limit - len(rows))
+            page = self._request(endpoint, method, limit=size, **params)['result']['list']
+            rows.extend(page)
+            if len(page) < size:
+                break
+            params[end_param] = min(timestamp_of(row) for row in page) - 1
+        return rows
 
     def stop(self):
-        self.logger.info("Stopping ExchangeUpdater thread")
-        self.updater.stop()
-        self.updater.join()
-        self.logger.info("ExchangeUpdater thread stopped")
+        self.fetch_executor.shutdown(wait=False, cancel_futures=True)
+        if self.shards is not None:
+            self.shards.stop()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.join()
+            self.logger.info("ExchangeStream thread stopped")
+        if self.updater is not None:
+            self.logger.info("Stopping ExchangeUpdater thread")
+            self.updater.stop()
+            self.updater.join()
+            self.logger.info("ExchangeUpdater thread stopped")
+        if self.candle_store_executor is not None:
+            # Дописать принятые свечи, чтобы после перезапуска не загружать их заново
+            self.candle_store_executor.shutdown(wait=True)
@@ -0,0 +1,136 @@
+import json
+import logging
+import socket
+import threading
+
+import websocket
+
+
+# Потоковое получение свечей и тикеров через публичный WebSocket Bybit вместо опроса по REST
+class ExchangeStream(threading.Thread):
+    PUBLIC_URL = 'wss://stream.bybit.com/v5/public/linear'
+    # Bybit принимает не более 10 топиков в одном запросе подписки
+    SUBSCRIBE_BATCH = 10
+
+    def __init__(self, exchange, url: str = PUBLIC_URL, ping_interval: int = 20, reconnect_delay: int = 5):
+        super().__init__(daemon=True)
+        self.exchange = exchange
+        self.url = url
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.stop_event = threading.Event()
+        self.ws = None
+        self.connected = threading.Event()
+        self.subscribed_symbols = set()
+        self.subscriptions_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def run(self):
+        self.logger.info(f"ExchangeStream thread started ({self.url})")
+        while not self.stop_event.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.on_open,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                on_close=self.on_close
+            )
+            try:
+                self.ws.run_forever()
+            except Exception as e:
+                self.logger.error(f"WebSocket error: {e}")
+            self.connected.clear()
+
+            if not self.stop_event.is_set():
+                self.logger.warning(f"WebSocket disconnected, reconnecting in {self.reconnect_delay} seconds")
+                self.stop_event.wait(self.reconnect_delay)
+
+    def stop(self):
+        self.logger.info("Stopping ExchangeStream thread")
+        self.stop_event.set()
+        ws = self.ws
+        if ws is None:
+            return
+
+        ws.keep_running = False
+        sock = ws.sock
+        if sock is not None and sock.sock is not None:
+            # Закрытие сокета из другого потока не будит select в run_forever, поэтому соединение разрываем явно
+            try:
+                sock.send_close()
+                sock.sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, websocket.WebSocketException):
+                pass
+        ws.close(timeout=0)
+
+    # Старшие таймфреймы рынки собирают из базовых свечей, поэтому свечи нужны только базового интервала
+    def topics(self, symbol: str) -> list:
+        return [f"kline.{self.exchange.base_interval}.{symbol}", f"tickers.{symbol}"]
+
+    def on_open(self, ws):
+        self.logger.info("WebSocket connected")
+        with self.subscriptions_lock:
+            self.subscribed_symbols = set()
+        self.sync_subscriptions()
+        self.connected.set()
+        threading.Thread(target=self._heartbeat, args=(ws,), daemon=True).start()
+
+        # За время переподключения могли закрыться свечи — догружаем пропущенное через REST
+        self.exchange.start_backfill()
+
+    # Привести подписки к текущему списку символов
+    def sync_subscriptions(self):
+        symbols = set(self.exchange.symbol_manager.get_symbols())
+        with self.subscriptions_lock:
+            added = sorted(symbols - self.subscribed_symbols)
+            removed = sorted(self.subscribed_symbols - symbols)
+            self.subscribed_symbols = symbols
+
+        self._send_topics('subscribe', [topic for symbol in added for topic in self.topics(symbol)])
+        self._send_topics('unsubscribe', [topic for symbol in removed for topic in self.topics(symbol)])
+
+    def _send_topics(self, op: str, topics: list):
+        for i in range(0, len(topics), self.SUBSCRIBE_BATCH):
+            self.ws.send(json.dumps({'op': op, 'args': topics[i:i + self.SUBSCRIBE_BATCH]}))
+        if topics:
+            self.logger.info(f"WebSocket {op}: {len(topics)} topics")
+
+    def _heartbeat(self, ws):
+        while not self.stop_event.wait(self.ping_interval):
+            if ws is not self.ws or not self.connected.is_set():
+                return
+            try:
+                ws.send(json.dumps({'op': 'ping'}))
+                self.sync_subscriptions()
+            except Exception as e:
+                self.logger.warning(f"WebSocket heartbeat failed: {e}")
+                return
+
+    def on_message(self, ws, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            self.logger.warning(f"Invalid WebSocket message: {message[:200]}")
+            return
+
+        topic = payload.get('topic')
+        if topic is None:
+            if payload.get('success') is False:
+                self.logger.error(f"WebSocket request failed: {payload.get('ret_msg')}")
+            return
+
+        try:
+            if topic.startswith('kline.'):
+                _, interval, symbol = topic.split('.')
+                self.exchange.apply_stream_kline(symbol, interval, payload['data'])
+            elif topic.startswith('tickers.'):
+                self.exchange.apply_stream_ticker(topic.split('.', 1)[1], payload['data'])
+        except Exception:
+            self.logger.exception(f"Error processing WebSocket message for {topic}")
+
+    def on_error(self, ws, error):
+        self.logger.error(f"WebSocket error: {error}")
+
+    def on_close(self, ws, close_status_code, close_msg):
+        self.connected.clear()
+        self.logger.info(f"WebSocket closed ({close_status_code})")
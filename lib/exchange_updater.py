@@ -1,8 +1,12 @@
 import threading
 import queue
-import time
 import logging
 
+from . import metrics
+
+QUEUE_DEPTH = metrics.gauge('izzy_updater_queue_depth', 'Fetched market batches waiting to be applied')
+ERRORS = metrics.counter('izzy_updater_errors_total', 'Failed market fetch cycles')
+
 
 class ExchangeUpdater(threading.Thread):
     def __init__(self, exchange, update_interval=60):
@@ -10,7 +14,9 @@ class ExchangeUpdater(threading.Thread):
         self.exchange = exchange
         self.update_interval = update_interval
         self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
         self.data_queue = queue.Queue()
+        QUEUE_DEPTH.set_function(self.data_queue.qsize)
         self.logger = logging.getLogger(__name__)
 
     def run(self):
@@ -19,11 +25,18 @@ class ExchangeUpdater(threading.Thread):
             try:
                 new_data = self.exchange.fetch_all_market_data()
                 self.data_queue.put(new_data)
-                time.sleep(self.update_interval)
+                self.wake_event.wait(self.update_interval)
             except Exception as e:
                 self.logger.error(f"Error updating markets: {e}")
-                time.sleep(5)
+                ERRORS.inc()
+                self.wake_event.wait(5)
+            self.wake_event.clear()
+
+    # Загрузить рынки сейчас, не дожидаясь следующего цикла (например, после добавления символов)
+    def refresh(self):
+        self.wake_event.set()
 
     def stop(self):
         self.logger.info("Stopping ExchangeUpdater thread")
         self.stop_event.set()
+        self.wake_event.set()
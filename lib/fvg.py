@@ -7,34 +7,32 @@ if TYPE_CHECKING:
 
 # Для простоты определим FVG как разницу между ближайшими фитилями соседних свечей
 class FVG:
-    def __init__(self, start_price: float, end_price: float, parent_candle: 'Candle'):
+    def __init__(self, start_price: float, end_price: float, parent_candle: 'Candle', covered_size: float = None):
         self.size = abs(end_price - start_price)
         self.start_price = start_price
         self.end_price = end_price
         self.parent_candle = parent_candle
+        # Заранее посчитанная проторговка (см. fvg_detector); None — считать по свечам
+        self.covered_size = covered_size
 
     def is_bullish(self) -> bool:
         return self.parent_candle.is_bullish()
 
     # Вернуть размер проторгованной части имбаланса
     def get_covered_size(self) -> float:
-        current_candle = self.parent_candle.next.next
-        covered_size = 0.0
-        while current_candle:
-            if self.is_bullish():
-                if current_candle.low < self.end_price:
-                    diff = self.end_price - current_candle.low
-                    if diff > covered_size:
-                        covered_size = min(diff, self.size)
-            else:
-                if current_candle.high > self.end_price:
-                    diff = current_candle.high - self.end_price
-                    if diff > covered_size:
-                        covered_size = min(diff, self.size)
-
-            current_candle = current_candle.next
-
-        return covered_size
+        if self.covered_size is not None:
+            return self.covered_size
+
+        following = self.parent_candle.following(2)
+        if not len(following):
+            return 0.0
+
+        if self.is_bullish():
+            covered_size = self.end_price - float(following.low.min())
+        else:
+            covered_size = float(following.high.max()) - self.end_price
+
+        return min(max(covered_size, 0.0), self.size)
 
     # Определить сколько процентов составляет проторгованная часть имбаланса от общего размера
     def get_covered_size_percent(self) -> float:
@@ -0,0 +1,116 @@
+import numpy as np
+from typing import Sequence
+
+from .candle_series import CandleSeries
+
+# Запись об имбалансе: строка батча, индекс родительской свечи, направление, границы и проторгованная часть
+FVG_DTYPE = np.dtype([
+    ('row', np.int32),
+    ('index', np.int32),
+    ('bullish', np.bool_),
+    ('start_price', np.float64),
+    ('end_price', np.float64),
+    ('size', np.float64),
+    ('covered_size', np.float64),
+    ('lower_bound', np.float64),
+    ('upper_bound', np.float64),
+])
+
+
+def _suffix_extremes(low: np.ndarray, high: np.ndarray):
+    # Минимум low и максимум high от каждой свечи до конца серии; NaN (выравнивание батча) игнорируются
+    suffix_low = np.fmin.accumulate(low[:, ::-1], axis=1)[:, ::-1]
+    suffix_high = np.fmax.accumulate(high[:, ::-1], axis=1)[:, ::-1]
+    return suffix_low, suffix_high
+
+
+def detect_fvgs(open_, high, low, close, min_gap_percent: float = 1.0,
+                max_covered_percent: float = None) -> np.ndarray:
+    """Найти все имбалансы за один проход. Принимает 1-D серию или 2-D батч (символы x свечи).
+
+    Семантика совпадает с Candle.get_fvg и FVG.get_covered_size. Если задан max_covered_percent,
+    имбалансы, проторгованные на этот процент и больше, отбрасываются (как FVG.is_covered).
+    """
+    open_, high, low, close = (np.atleast_2d(np.asarray(column, dtype=np.float64))
+                               for column in (open_, high, low, close))
+    rows, size = close.shape
+    if size < 3:
+        return np.empty(0, dtype=FVG_DTYPE)
+
+    prev_high, prev_low = high[:, :-2], low[:, :-2]
+    next_high, next_low = high[:, 2:], low[:, 2:]
+    bullish = close[:, 1:-1] >= open_[:, 1:-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bull_size = next_low - prev_high
+        bull_percent = (bull_size / prev_high) * 100.0
+        bear_size = prev_low - next_high
+        bear_percent = (bear_size / next_high) * 100.0
+
+    found = np.where(bullish,
+                     (bull_size > 0) & (bull_percent > min_gap_percent),
+                     (bear_size > 0) & (bear_percent > min_gap_percent))
+    row_index, offset = np.nonzero(found)
+    bullish = bullish[row_index, offset]
+
+    start_price = np.where(bullish, prev_high[row_index, offset], prev_low[row_index, offset])
+    end_price = np.where(bullish, next_low[row_index, offset], next_high[row_index, offset])
+    gap_size = np.abs(end_price - start_price)
+
+    # Проторговка считается начиная со свечи, следующей за next (offset + 3 в координатах серии)
+    suffix_low, suffix_high = _suffix_extremes(low, high)
+    suffix_low = np.concatenate([suffix_low, np.full((rows, 1), np.inf)], axis=1)
+    suffix_high = np.concatenate([suffix_high, np.full((rows, 1), -np.inf)], axis=1)
+    following = offset + 3
+    min_low = suffix_low[row_index, following]
+    max_high = suffix_high[row_index, following]
+    min_low = np.where(np.isnan(min_low), np.inf, min_low)
+    max_high = np.where(np.isnan(max_high), -np.inf, max_high)
+
+    covered = np.where(bullish, end_price - min_low, max_high - end_price)
+    covered = np.minimum(np.maximum(covered, 0.0), gap_size)
+
+    result = np.empty(len(row_index), dtype=FVG_DTYPE)
+    result['row'] = row_index
+    result['index'] = offset + 1
+    result['bullish'] = bullish
+    result['start_price'] = start_price
+    result['end_price'] = end_price
+    result['size'] = gap_size
+    result['covered_size'] = covered
+    result['lower_bound'] = np.where(bullish, start_price, end_price + covered)
+    result['upper_bound'] = np.where(bullish, end_price - covered, start_price)
+
+    if max_covered_percent is not None:
+        result = result[(covered / gap_size) * 100.0 < max_covered_percent]
+
+    return result
+
+
+def detect_series_fvgs(series: CandleSeries, min_gap_percent: float = 1.0,
+                       max_covered_percent: float = None) -> np.ndarray:
+    return detect_fvgs(series.open, series.high, series.low, series.close, min_gap_percent, max_covered_percent)
+
+
+def stack_series(series_list: Sequence[CandleSeries], column: str) -> np.ndarray:
+    # Выровнять серии разной длины по последней свече, дополнив начало NaN
+    length = max((len(series) for series in series_list), default=0)
+    stacked = np.full((len(series_list), length), np.nan)
+    for row, series in enumerate(series_list):
+        if len(series):
+            stacked[row, length - len(series):] = getattr(series, column)
+    return stacked
+
+
+def detect_batch_fvgs(series_list: Sequence[CandleSeries], min_gap_percent: float = 1.0,
+                      max_covered_percent: float = None) -> np.ndarray:
+    """Найти имбалансы сразу для многих символов. Поле index пересчитано в координаты каждой серии."""
+    if not series_list:
+        return np.empty(0, dtype=FVG_DTYPE)
+
+    columns = [stack_series(series_list, column) for column in ('open', 'high', 'low', 'close')]
+    result = detect_fvgs(*columns, min_gap_percent=min_gap_percent, max_covered_percent=max_covered_percent)
+
+    padding = np.array([columns[0].shape[1] - len(series) for series in series_list], dtype=np.int32)
+    result['index'] -= padding[result['row']]
+    return result
@@ -0,0 +1,138 @@
+import logging
+import numpy as np
+from typing import Callable, List
+
+from .candle_series import CandleSeries
+from .fvg import FVG
+from .fvg_detector import detect_series_fvgs
+
+
+class FVGEvent:
+    kind = None
+    __slots__ = ('symbol', 'timeframe', 'fvg', 'timestamp')
+
+    def __init__(self, symbol: str, timeframe: str, fvg: FVG, timestamp: int):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.fvg = fvg
+        # Время закрытия свечи (epoch ms), на которой произошло событие
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.symbol} {self.timeframe} {self.fvg.start_price}-{self.fvg.end_price}>"
+
+
+class FVGCreated(FVGEvent):
+    kind = 'created'
+    __slots__ = ()
+
+
+class FVGPartiallyFilled(FVGEvent):
+    kind = 'partially_filled'
+    __slots__ = ()
+
+
+class FVGFilled(FVGEvent):
+    kind = 'filled'
+    __slots__ = ()
+
+
+# Отслеживает непроторгованные имбалансы одного рынка на одном таймфрейме по мере закрытия свечей
+class FVGTracker:
+    def __init__(self, symbol: str, timeframe: str, min_gap_percent: float = 1.0, filled_percent: float = 90):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.min_gap_percent = min_gap_percent
+        self.filled_percent = filled_percent
+        self.open_fvgs: List[FVG] = []
+        self.last_timestamp = None
+        self.listeners: List[Callable[[FVGEvent], None]] = []
+        self.logger = logging.getLogger(__name__)
+
+    def subscribe(self, listener: Callable[[FVGEvent], None]):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[FVGEvent], None]):
+        self.listeners.remove(listener)
+
+    def update(self, candles: CandleSeries) -> List[FVGEvent]:
+        # Последняя свеча серии ещё формируется — учитываем только закрытые
+        closed = candles[:-1]
+        if not len(closed):
+            return []
+
+        start = self._resume_index(closed)
+        if start is None:
+            self._seed(closed)
+            return []
+
+        events = []
+        for index in range(start, len(closed)):
+            events.extend(self._advance(closed, index))
+        self.last_timestamp = closed.last_timestamp()
+
+        for event in events:
+            self._emit(event)
+        return events
+
+    def _resume_index(self, closed: CandleSeries):
+        if self.last_timestamp is None:
+            return None
+        position = int(np.searchsorted(closed.timestamps, self.last_timestamp))
+        if position >= len(closed) or closed.timestamps[position] != self.last_timestamp:
+            return None
+        return position + 1
+
+    # Начальное состояние (после запуска или разрыва в данных) строится без событий, чтобы не слать историю
+    def _seed(self, closed: CandleSeries):
+        gaps = detect_series_fvgs(closed, self.min_gap_percent, self.filled_percent)
+        self.open_fvgs = [
+            FVG(float(gap['start_price']), float(gap['end_price']), self._detached(closed, int(gap['index'])),
+                float(gap['covered_size']))
+            for gap in gaps
+        ]
+        self.last_timestamp = closed.last_timestamp()
+        self.logger.debug(f"FVG tracker {self.symbol} {self.timeframe} seeded with {len(self.open_fvgs)} gaps")
+
+    def _advance(self, closed: CandleSeries, index: int) -> List[FVGEvent]:
+        candle = closed[index]
+        timestamp = candle.timestamp_ms
+        events = []
+
+        still_open = []
+        for fvg in self.open_fvgs:
+            if fvg.is_bullish():
+                covered_size = fvg.end_price - candle.low
+            else:
+                covered_size = candle.high - fvg.end_price
+            covered_size = min(max(covered_size, 0.0), fvg.size)
+
+            if covered_size > fvg.covered_size:
+                fvg.covered_size = covered_size
+                if fvg.get_covered_size_percent() >= self.filled_percent:
+                    events.append(FVGFilled(self.symbol, self.timeframe, fvg, timestamp))
+                    continue
+                events.append(FVGPartiallyFilled(self.symbol, self.timeframe, fvg, timestamp))
+            still_open.append(fvg)
+        self.open_fvgs = still_open
+
+        # Закрытие свечи index завершает тройку свечей с родительской index - 1
+        if index >= 2:
+            fvg = closed[index - 1].get_fvg(self.min_gap_percent)
+            if fvg is not None:
+                fvg = FVG(fvg.start_price, fvg.end_price, self._detached(closed, index - 1), 0.0)
+                self.open_fvgs.append(fvg)
+                events.append(FVGCreated(self.symbol, self.timeframe, fvg, timestamp))
+
+        return events
+
+    @staticmethod
+    def _detached(closed: CandleSeries, index: int):
+        return closed[index:index + 1].copy()[0]
+
+    def _emit(self, event: FVGEvent):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception:
+                self.logger.exception(f"Error in FVG event listener for {self.symbol} {self.timeframe}")
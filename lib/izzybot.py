@@ -1,7 +1,9 @@
 # system imports
+import asyncio
 import datetime
 import json
 import logging
+import threading
 
 # Database imports
 from sqlalchemy.orm import sessionmaker
@@ -11,13 +13,22 @@ from telegram.ext import Application, CommandHandler, ContextTypes, CallbackCont
     CallbackQueryHandler
 
 from lib.models import Base
+from . import metrics
 from .config import Config
+from .db_utils import create_async_db_engine, create_async_session_maker, wait_for_db_async
 # Izzy imports
+from .chart_delivery import ChartDelivery
 from .exchange import Exchange
+from .market_snapshot import MarketSnapshotWriter
+from .metrics import MetricsServer
 from .notification_manager import NotificationManager
+from .render_pool import RenderPool, RenderPoolBusy
 from .symbol_manager import SymbolManager
 from .user_manager import UserManager
 
+JOB_SECONDS = metrics.histogram('izzy_job_seconds', 'Duration of scheduled bot jobs', ('job',))
+HANDLER_SECONDS = metrics.histogram('izzy_handler_seconds', 'Duration of Telegram update handlers', ('handler',))
+
 
 class IzzyBot:
     def __init__(self, config: Config, engine):
@@ -27,11 +38,16 @@ class IzzyBot:
         self.logger.info("Logging setup completed")
 
         self.logger.info("Initializing application")
-        self.application = Application.builder().token(self.config.TELEGRAM_BOT_TOKEN).build()
+        self.application = Application.builder().token(self.config.TELEGRAM_BOT_TOKEN) \
+            .post_init(self.post_init).post_shutdown(self.post_shutdown).build()
         self.logger.info("Application initialized")
 
         self.engine = engine
         self.Session = sessionmaker(bind=self.engine)
+        # Обработчики и задачи бота работают с БД асинхронно, чтобы запросы не останавливали event loop
+        self.async_engine = create_async_db_engine(self.config.get_db_url(), self.config.DB_POOL_SIZE,
+                                                   self.config.DB_MAX_OVERFLOW)
+        self.AsyncSession = create_async_session_maker(self.async_engine)
         self.logger.info("Session maker created")
 
         self.create_tables()
@@ -39,10 +55,30 @@ class IzzyBot:
         
         # Initialize managers and exchange
         self.logger.info("Initializing managers")
-        self.user_manager = UserManager(self.Session)
-        self.symbol_manager = SymbolManager(self.Session)
-        self.exchange = Exchange(self.symbol_manager, self.config.BYBIT_API_KEY, self.config.BYBIT_API_SECRET)
-        self.notification_manager = NotificationManager(self.exchange, self.Session)
+        self.user_manager = UserManager(self.AsyncSession)
+        self.symbol_manager = SymbolManager(self.Session, self.AsyncSession)
+        self.symbol_keyboards = {}
+        self.symbol_manager.subscribe(self.on_symbols_changed)
+        self.render_pool = None
+        if self.config.RENDER_WORKERS > 0:
+            self.render_pool = RenderPool(self.config.RENDER_WORKERS, timeout=self.config.RENDER_TIMEOUT).start()
+        self.exchange = Exchange(self.symbol_manager, self.config.BYBIT_API_KEY, self.config.BYBIT_API_SECRET,
+                                 ingestion_mode=self.config.INGESTION_MODE, stream_url=self.config.STREAM_URL,
+                                 cache_dir=self.config.CACHE_DIR, render_pool=self.render_pool,
+                                 timeframes=self.config.TIMEFRAMES, shard_workers=self.config.SHARD_WORKERS,
+                                 shard_publish_interval=self.config.SHARD_PUBLISH_INTERVAL)
+        self.market_snapshot = None
+        if self.config.MARKET_SNAPSHOT_NAME:
+            self.market_snapshot = MarketSnapshotWriter(self.config.MARKET_SNAPSHOT_NAME, self.exchange.timeframes,
+                                                        max_symbols=self.config.MARKET_SNAPSHOT_SYMBOLS,
+                                                        candles=self.config.MARKET_SNAPSHOT_CANDLES)
+        self.metrics_server = None
+        if self.config.METRICS_PORT:
+            self.metrics_server = MetricsServer(self.config.METRICS_HOST, self.config.METRICS_PORT).start()
+        self.chart_delivery = ChartDelivery(self.exchange)
+        self.notification_manager = NotificationManager(self.exchange, self.AsyncSession, self.chart_delivery)
+        self.stream_check_pending = threading.Event()
+        self.exchange.subscribe_candle_close(self.on_candle_closed)
         self.logger.info("Managers initialized")
 
         # Add handlers after initializing all components
@@ -89,6 +125,30 @@ class IzzyBot:
     async def common_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         self.user_manager.update_user_info(update)
 
+    async def post_init(self, application: Application) -> None:
+        await wait_for_db_async(self.async_engine)
+        await self.notification_manager.start()
+
+    # Сохранить всё, что копится в памяти, пока event loop ещё работает
+    async def post_shutdown(self, application: Application) -> None:
+        await self.notification_manager.flush_history()
+        await self.user_manager.flush()
+        await self.async_engine.dispose()
+
+    async def activity_flush_handler(self, context: CallbackContext) -> None:
+        with JOB_SECONDS.labels('activity_flush').time():
+            await self.user_manager.flush()
+
+    # Подхватить изменения таблицы символов, сделанные в обход бота
+    async def symbol_refresh_handler(self, context: CallbackContext) -> None:
+        with JOB_SECONDS.labels('symbol_refresh').time():
+            await self.symbol_manager.refresh_async()
+
+    # Опубликовать состояние рынков в разделяемую память для API
+    async def market_snapshot_handler(self, context: CallbackContext) -> None:
+        with JOB_SECONDS.labels('market_snapshot').time():
+            await asyncio.to_thread(self.market_snapshot.publish, self.exchange)
+
     async def hour_handler(self, context: CallbackContext) -> None:
         pass
 
@@ -97,10 +157,23 @@ class IzzyBot:
 
     async def minute_handler(self, context: CallbackContext) -> None:
         self.logger.info("Minute handler called")
-        self.exchange.update_markets()
-        await self.notification_manager.check_and_send_notifications(context)
+        with JOB_SECONDS.labels('minute').time():
+            self.exchange.update_markets()
+            await self.notification_manager.check_and_send_notifications(context)
         self.logger.info("Minute handler completed")
 
+    # Вызывается из потока WebSocket при закрытии свечи: проверяем уведомления сразу, а не в следующую минуту.
+    # Свечи всех символов закрываются одновременно, поэтому проверки схлопываются в одну
+    def on_candle_closed(self, symbol: str, timeframe: str) -> None:
+        if not self.stream_check_pending.is_set():
+            self.stream_check_pending.set()
+            self.application.job_queue.run_once(self.candle_close_handler, when=0)
+
+    async def candle_close_handler(self, context: CallbackContext) -> None:
+        self.stream_check_pending.clear()
+        with JOB_SECONDS.labels('candle_close').time():
+            await self.notification_manager.check_and_send_notifications(context)
+
     def run(self):
         try:
             self.logger.info("Starting bot")
@@ -108,38 +181,49 @@ class IzzyBot:
         finally:
             self.logger.info("Stopping bot")
             self.exchange.stop()
+            if self.render_pool is not None:
+                self.render_pool.stop()
+            if self.market_snapshot is not None:
+                self.market_snapshot.close()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
             self.logger.info("Bot stopped")
 
     def get_symbols(self) -> list:
         return self.symbol_manager.get_symbols()
 
+    # Клавиатура выбора символа и таймфрейма; строится заново только при изменении набора символов
+    def get_symbol_keyboard(self, prefix: str) -> InlineKeyboardMarkup:
+        keyboard = self.symbol_keyboards.get(prefix)
+        if keyboard is None:
+            keyboard = InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton(f"{symbol} ({timeframe})", callback_data=f"{prefix}_symbol_{symbol}_{timeframe}")
+                    for timeframe in self.exchange.timeframes
+                ]
+                for symbol in self.symbol_manager.get_symbols()
+            ])
+            self.symbol_keyboards[prefix] = keyboard
+        return keyboard
+
+    def on_symbols_changed(self, symbols: list) -> None:
+        self.symbol_keyboards = {}
+
     async def chart_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         self.user_manager.update_user_info(update)
-        symbols = self.symbol_manager.get_symbols()
-        keyboard = [
-            [
-                InlineKeyboardButton(f"{symbol} (15m)", callback_data=f"chart_symbol_{symbol}_15m"),
-                InlineKeyboardButton(f"{symbol} (4h)", callback_data=f"chart_symbol_{symbol}_4h")
-            ]
-            for symbol in symbols
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.get_symbol_keyboard('chart')
         await update.message.reply_text("Выберите символ и временной интервал для построения графика:", reply_markup=reply_markup)
 
     async def fvg_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         self.user_manager.update_user_info(update)
-        symbols = self.symbol_manager.get_symbols()
-        keyboard = [
-            [
-                InlineKeyboardButton(f"{symbol} (15m)", callback_data=f"fvg_symbol_{symbol}_15m"),
-                InlineKeyboardButton(f"{symbol} (4h)", callback_data=f"fvg_symbol_{symbol}_4h")
-            ]
-            for symbol in symbols
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.get_symbol_keyboard('fvg')
         await update.message.reply_text("Выберите символ и временной интервал для построения графика с FVG:", reply_markup=reply_markup)
 
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        with HANDLER_SECONDS.labels('button_callback').time():
+            await self._button_callback(update, context)
+
+    async def _button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         query = update.callback_query
         await query.answer()
         chart_requested = query.data.startswith("chart_symbol_")
@@ -155,15 +239,17 @@ class IzzyBot:
                         return
 
                     if chart_requested:
-                        chart = market.get_chart(timeframe)
-                        chart_bytes = chart.save()
-                        await query.message.reply_photo(photo=chart_bytes, caption=f"График для {symbol} ({timeframe})")
+                        overlay, caption = 'plain', f"График для {symbol} ({timeframe})"
+                    else:
+                        overlay, caption = 'fvg', f"Непроторгованные имбалансы для {symbol} ({timeframe})"
 
-                    if fvg_requested:
-                        chart = market.get_chart_with_fvgs(timeframe)
-                        chart_bytes = chart.save()
-                        await query.message.reply_photo(photo=chart_bytes, caption=f"Непроторгованные имбалансы для {symbol} ({timeframe})")
+                    if not await self.chart_delivery.send_chart(context.bot, query.message.chat_id, symbol, timeframe,
+                                                                overlay, caption):
+                        await query.message.reply_text(f"Извините, нет данных для графика {symbol} ({timeframe}).")
 
+                except (RenderPoolBusy, asyncio.TimeoutError):
+                    self.logger.warning(f"Chart rendering for {symbol} ({timeframe}) is overloaded or timed out")
+                    await query.message.reply_text("Сейчас строится слишком много графиков, попробуйте через минуту.")
                 except Exception as e:
                     self.logger.exception(f"Error creating chart for symbol {symbol}, timeframe: {timeframe}, error: {str(e)}")
                     await query.message.reply_text(f"Произошла ошибка при обработке команды.")
@@ -181,6 +267,13 @@ class IzzyBot:
         minute_job = job_queue.run_repeating(self.minute_handler, interval=60, first=1)
         hour_job = job_queue.run_repeating(self.hour_handler, interval=3600, first=1)
         day_job = job_queue.run_daily(self.day_handler, time=datetime.time(hour=0, minute=0, second=0))
+        job_queue.run_repeating(self.activity_flush_handler, interval=self.config.USER_FLUSH_INTERVAL,
+                                first=self.config.USER_FLUSH_INTERVAL)
+        job_queue.run_repeating(self.symbol_refresh_handler, interval=self.config.SYMBOL_REFRESH_INTERVAL,
+                                first=self.config.SYMBOL_REFRESH_INTERVAL)
+        if self.market_snapshot is not None:
+            job_queue.run_repeating(self.market_snapshot_handler, interval=self.config.MARKET_SNAPSHOT_INTERVAL,
+                                    first=1)
         
         self.logger.info(f"Minute job scheduled: {minute_job}")
         self.logger.info(f"Hour job scheduled: {hour_job}")
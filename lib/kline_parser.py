@@ -0,0 +1,105 @@
+import numpy as np
+
+from .candle_series import CandleSeries
+
+
+# Итог сопоставления свечей и открытого интереса
+class AlignmentReport:
+    __slots__ = ('policy', 'candles', 'matched', 'filled', 'missing', 'dropped', 'unmatched_oi')
+
+    def __init__(self, policy: str, candles: int = 0, matched: int = 0, filled: int = 0, missing: int = 0,
+                 dropped: int = 0, unmatched_oi: int = 0):
+        self.policy = policy
+        self.candles = candles
+        # Свечи с ОИ ровно на их время открытия
+        self.matched = matched
+        # Свечи, которым ОИ подставлен из предыдущего значения (политика asof)
+        self.filled = filled
+        # Свечи, оставшиеся без ОИ
+        self.missing = missing
+        # Свечи, отброшенные из-за отсутствия ОИ (политика drop)
+        self.dropped = dropped
+        # Значения ОИ, для которых нет свечи; в серию они не попадают
+        self.unmatched_oi = unmatched_oi
+
+    def __repr__(self):
+        return (f"<AlignmentReport {self.policy}: {self.candles} candles, {self.matched} matched, "
+                f"{self.filled} filled, {self.missing} missing, {self.dropped} dropped, "
+                f"{self.unmatched_oi} unmatched OI>")
+
+
+ALIGNMENT_POLICIES = ('exact', 'asof', 'drop')
+
+
+def parse_klines(kline_data: list):
+    # Ответ Bybit: [[start, open, high, low, close, volume, turnover], ...] от новых к старым
+    if not kline_data:
+        return np.empty(0, dtype=np.int64), np.empty((0, 5))
+
+    raw = np.asarray(kline_data)
+    timestamps = raw[:, 0].astype(np.int64)
+    values = raw[:, 1:6].astype(np.float64)
+
+    timestamps, unique = np.unique(timestamps, return_index=True)
+    return timestamps, values[unique]
+
+
+def parse_open_interest(oi_data: list):
+    # Ответ Bybit: [{'openInterest': '4144631.00000000', 'timestamp': '1726617600000'}, ...]
+    timestamps = np.array([item['timestamp'] for item in oi_data], dtype=np.int64)
+    values = np.array([item['openInterest'] for item in oi_data], dtype=np.float64)
+
+    timestamps, unique = np.unique(timestamps, return_index=True)
+    return timestamps, values[unique]
+
+
+def align_open_interest(timestamps: np.ndarray, oi_timestamps: np.ndarray, oi_values: np.ndarray,
+                        policy: str = 'asof'):
+    """Сопоставить ОИ свечам одним векторным проходом.
+
+    Возвращает (значения ОИ для каждой свечи, маска оставляемых свечей, AlignmentReport).
+    """
+    if policy not in ALIGNMENT_POLICIES:
+        raise ValueError(f"Invalid alignment policy: {policy}")
+
+    open_interest = np.full(len(timestamps), np.nan)
+    keep = np.ones(len(timestamps), dtype=bool)
+    report = AlignmentReport(policy, candles=len(timestamps))
+    if not len(timestamps):
+        report.unmatched_oi = len(oi_timestamps)
+        return open_interest, keep, report
+
+    # Индекс последнего значения ОИ с временем не позже открытия свечи
+    position = np.searchsorted(oi_timestamps, timestamps, side='right') - 1
+    has_previous = position >= 0
+    exact = np.zeros(len(timestamps), dtype=bool)
+    if len(oi_timestamps):
+        exact = has_previous & (oi_timestamps[np.maximum(position, 0)] == timestamps)
+
+    if policy == 'asof':
+        open_interest[has_previous] = oi_values[position[has_previous]]
+        report.filled = int(np.count_nonzero(has_previous & ~exact))
+        report.missing = int(np.count_nonzero(~has_previous))
+    else:
+        open_interest[exact] = oi_values[position[exact]]
+        if policy == 'drop':
+            keep = exact
+            report.dropped = int(np.count_nonzero(~exact))
+        else:
+            report.missing = int(np.count_nonzero(~exact))
+
+    report.matched = int(np.count_nonzero(exact))
+    report.unmatched_oi = len(oi_timestamps) - report.matched
+    report.candles = int(np.count_nonzero(keep))
+    return open_interest, keep, report
+
+
+def build_candle_series(kline_data: list, oi_data: list, policy: str = 'asof'):
+    timestamps, values = parse_klines(kline_data)
+    oi_timestamps, oi_values = parse_open_interest(oi_data)
+    open_interest, keep, report = align_open_interest(timestamps, oi_timestamps, oi_values, policy)
+
+    values = values[keep]
+    series = CandleSeries(timestamps[keep], values[:, 0], values[:, 1], values[:, 2], values[:, 3], values[:, 4],
+                          open_interest[keep])
+    return series, report
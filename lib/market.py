@@ -1,56 +1,223 @@
 import logging
+import time
+
+import numpy as np
 import pandas as pd
 from typing import List, Optional
+from . import metrics
 from .chart_generator import ChartGenerator
 from .fvg import FVG
-from .chart import Chart
-from .candle import Candle
+from .fvg_detector import detect_series_fvgs
+from .fvg_tracker import FVGTracker
+from .chart import Chart, render_chart
+from .candle_series import CandleSeries
+from .screener import STATUS_NAMES, classify
+from .timeframes import DEFAULT_TIMEFRAMES, KLINE_INTERVALS, TIMEFRAME_MS, TimeframeEngine
+
+UPDATE_SECONDS = metrics.histogram('izzy_market_update_seconds',
+                                   'Time to merge fetched candles of one market, resample and track FVGs',
+                                   buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
 
 
 class Market:
-    def __init__(self, exchange, symbol: str):
+    def __init__(self, exchange, symbol: str, timeframes=None):
         self.exchange = exchange
         self.symbol = symbol
         self.max_candles = 100
-        self.candles_15m: List[Candle] = []
-        self.candles_4h: List[Candle] = []
+        if timeframes is None:
+            timeframes = exchange.timeframes if exchange is not None else DEFAULT_TIMEFRAMES
+        # Старшие таймфреймы загружаются с биржи один раз, дальше их свечи собираются из базового (младшего)
+        self.engine = TimeframeEngine(timeframes, self.max_candles)
+        self.timeframes = self.engine.timeframes
+        self.base_timeframe = self.engine.base_timeframe
         self.logger = logging.getLogger(__name__)
         self.chart_generator = ChartGenerator()
+        # Последняя цена маркировки из тикера (потоковый режим)
+        self.mark_price = None
+        # Когда рынок последний раз получил данные (time.time()); None — ещё не получал
+        self.updated_at = None
+        self.fvg_trackers = {timeframe: FVGTracker(symbol, timeframe) for timeframe in self.timeframes}
+        self.candle_store = exchange.candle_store if exchange is not None else None
+        # Поток записи кэша биржи: рынки обновляются под market_data_lock (в том числе из event loop),
+        # поэтому файлы пишутся не здесь. Без него запись синхронная
+        self.candle_store_executor = exchange.candle_store_executor if self.candle_store is not None else None
 
-        self.high_threshold_15m = None
-        self.low_threshold_15m = None
-        self.high_threshold_4h = None
-        self.low_threshold_4h = None
-
+    # data — базовые свечи и, если загружалась, история старших таймфреймов: {таймфрейм: свечи, 'delta': {...}}
     def update_from_data(self, data):
-        self.candles_15m = self._process_candles(data['15m'])
-        self.candles_4h = self._process_candles(data['4h'])
+        with UPDATE_SECONDS.time():
+            timeframe = self.base_timeframe
+            candles = self._process_candles(data[timeframe])
+            is_delta = data.get('delta', {}).get(timeframe, False)
+            base = self._merge_candles(timeframe, candles, is_delta)
+            changed_from = int(candles.timestamps[0]) if is_delta and len(candles) else None
+            history = {tf: self._process_candles(data[tf]) for tf in self.timeframes[1:] if tf in data}
+            self._update_engine(base, changed_from, history)
+            if len(candles) or history:
+                self._store_timeframes(changed_from, history)
+            self.update_fvg_trackers()
+        if len(candles):
+            self.updated_at = time.time()
 
-    def update(self, session):
-        new_candles_15m = self.exchange.get_kline(self.symbol, interval="15", limit=self.max_candles)
-        new_candles_4h = self.exchange.get_kline(self.symbol, interval="240", limit=self.max_candles)
-
-        self.candles_15m = self._process_candles(new_candles_15m)
-        self.candles_4h = self._process_candles(new_candles_4h)
-
-    def _process_candles(self, candles_data: pd.DataFrame) -> List[Candle]:
-        candles = [Candle(row) for _, row in candles_data.iterrows()]
-        for i in range(1, len(candles)):
-            candles[i].prev = candles[i - 1]
-            candles[i - 1].next = candles[i]
-        return candles
-
-    def get_candles(self, timeframe: str) -> List[Candle]:
-        if timeframe == '15m':
-            return self.candles_15m
-        elif timeframe == '4h':
-            return self.candles_4h
+    def _update_engine(self, base: CandleSeries, changed_from: int = None, history: dict = None):
+        for timeframe in self.engine.update(base, changed_from, history):
+            # База начинается позже последней известной свечи таймфрейма (бот долго не работал):
+            # его история загружается заново
+            self.logger.warning(f"Gap between {timeframe} history and {self.base_timeframe} data for {self.symbol}, "
+                                f"reloading {timeframe} history")
+            if self.exchange is not None:
+                self.exchange.request_resync(self.symbol, timeframe)
+
+    def _merge_candles(self, timeframe: str, candles: CandleSeries, is_delta: bool) -> CandleSeries:
+        current = self.engine.base
+        if not len(candles):
+            return current
+        if not is_delta:
+            self._store_candles(timeframe, candles)
+            return candles
+
+        # Дельта должна начинаться с уже известной свечи, иначе в данных дыра и нужна полная загрузка
+        last_timestamp = current.last_timestamp()
+        if last_timestamp is None or candles.timestamps[0] > last_timestamp:
+            self.logger.warning(f"Gap in {timeframe} data for {self.symbol}, requesting full resync")
+            if self.exchange is not None:
+                self.exchange.request_resync(self.symbol)
+            return current if len(current) else candles
+
+        self._store_candles(timeframe, candles)
+        return current.merge(candles, self.engine.base_length)
+
+    # Серии не меняются после создания (кроме ОИ формирующейся свечи), поэтому их можно писать из другого потока
+    def _store_candles(self, timeframe: str, candles: CandleSeries):
+        if self.candle_store is None:
+            return
+        if self.candle_store_executor is not None:
+            self.candle_store_executor.submit(self._write_candles, timeframe, candles)
         else:
-            raise ValueError(f"Invalid timeframe: {timeframe}")
+            self._write_candles(timeframe, candles)
+
+    def _write_candles(self, timeframe: str, candles: CandleSeries):
+        try:
+            self.candle_store.write(self.symbol, timeframe, candles, TIMEFRAME_MS[timeframe])
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error writing candle cache for {self.symbol} {timeframe}: {str(e)}")
+
+    # Старшие таймфреймы в кэше: загруженная история целиком, дальше — корзины, которые затронуло обновление базы
+    def _store_timeframes(self, changed_from: int = None, history: dict = None):
+        if self.candle_store is None:
+            return
+        for timeframe in self.timeframes[1:]:
+            series = self.engine.get(timeframe)
+            if changed_from is not None and timeframe not in (history or {}):
+                bucket = changed_from - changed_from % TIMEFRAME_MS[timeframe]
+                series = series[int(np.searchsorted(series.timestamps, bucket)):]
+            self._store_candles(timeframe, series)
+
+    # Восстановить свечи из дискового кэша после перезапуска; возвращает время последней свечи по таймфреймам.
+    # Таймфрейма, которого нет в ответе (нет в кэше или не стыкуется с базой), история загрузится с биржи
+    def load_from_store(self) -> dict:
+        last_timestamps = {}
+        if self.candle_store is None:
+            return last_timestamps
+
+        candles = {}
+        for timeframe in self.timeframes:
+            length = self.engine.base_length if timeframe == self.base_timeframe else self.max_candles
+            try:
+                candles[timeframe] = self.candle_store.load(self.symbol, timeframe, length)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Error reading candle cache for {self.symbol} {timeframe}: {str(e)}")
+                candles[timeframe] = CandleSeries.empty()
+        base = candles.pop(self.base_timeframe)
+        if not len(base):
+            return last_timestamps
+
+        history = {timeframe: series for timeframe, series in candles.items() if len(series)}
+        detached = self.engine.update(base, history=history)
+        last_timestamps[self.base_timeframe] = base.last_timestamp()
+        for timeframe, series in history.items():
+            if timeframe not in detached:
+                last_timestamps[timeframe] = series.last_timestamp()
+        self.update_fvg_trackers()
+        return last_timestamps
+
+    # Применить базовую свечу из потока: заменить формирующуюся или добавить следующую. О закрытии свечи
+    # (confirm) слушателей оповещает Exchange.apply_stream_kline.
+    # Возвращает False, если свеча не стыкуется с имеющимися данными и нужна догрузка
+    def apply_candle(self, timeframe: str, timestamp: int, open: float, high: float, low: float, close: float,
+                     volume: float) -> bool:
+        if timeframe != self.base_timeframe:
+            raise ValueError(f"Only {self.base_timeframe} candles can be applied, got {timeframe}")
+
+        candles = self.engine.base
+        last_timestamp = candles.last_timestamp()
+        if last_timestamp is None:
+            return False
+        self.updated_at = time.time()
+
+        if timestamp > last_timestamp:
+            if timestamp != last_timestamp + self.engine.base_ms:
+                return False
+            new_candle = CandleSeries([timestamp], [open], [high], [low], [close], [volume])
+            self._update_engine(candles.merge(new_candle, self.engine.base_length), timestamp)
+            self._store_candles(timeframe, self.engine.base.tail(2))
+            self._store_timeframes(last_timestamp)
+            self.update_fvg_trackers()
+            return True
+
+        index = int(np.searchsorted(candles.timestamps, timestamp))
+        if index < len(candles) and candles.timestamps[index] == timestamp:
+            # Свеча заменяется в новой серии, а не на месте: окна графиков отдаются на рендер без блокировки
+            # и не должны увидеть свечу, у которой open/high/low/close взяты из разных сообщений
+            candle = CandleSeries([timestamp], [open], [high], [low], [close], [volume])
+            self.engine.update(candles.merge(candle).merge(candles[index + 1:]), timestamp)
+        return True
+
+    def apply_ticker(self, mark_price: float = None, open_interest: float = None):
+        if mark_price is not None:
+            self.mark_price = mark_price
+        self.updated_at = time.time()
+        if open_interest is not None:
+            self.engine.set_open_interest(open_interest)
+
+    # Шардированный режим: свечи, старшие таймфреймы и имбалансы считает процесс-воркер,
+    # здесь рынок только принимает его изменения для графиков и снимка
+    def apply_shard_update(self, mark_price: float, windows: dict, open_fvgs: dict = None):
+        self.mark_price = mark_price
+        self.updated_at = time.time()
+        self.engine.merge_windows(windows)
+        for timeframe, fvgs in (open_fvgs or {}).items():
+            self.fvg_trackers[timeframe].open_fvgs = fvgs
+
+    def update(self, session):
+        candles = self.exchange.get_kline(self.symbol, interval=KLINE_INTERVALS[self.base_timeframe],
+                                          limit=self.engine.base_length)
+        self.engine.update(self._process_candles(candles))
+        self.update_fvg_trackers()
+
+    def update_fvg_trackers(self):
+        for timeframe, tracker in self.fvg_trackers.items():
+            tracker.update(self.get_candles(timeframe))
+
+    def _process_candles(self, candles_data) -> CandleSeries:
+        if isinstance(candles_data, CandleSeries):
+            return candles_data
+        return CandleSeries.from_dataframe(candles_data)
+
+    def get_candles(self, timeframe: str) -> CandleSeries:
+        return self.engine.get(timeframe)
+
+    def get_fvg_array(self, timeframe: str, min_gap_percent: float = 1.0, max_covered_percent: float = 90):
+        return detect_series_fvgs(self.get_candles(timeframe), min_gap_percent, max_covered_percent)
 
     def get_fvgs(self, timeframe: str) -> List[FVG]:
         candles = self.get_candles(timeframe)
-        return [fvg for candle in candles if (fvg := candle.get_fvg(1.0)) is not None and not fvg.is_covered()]
+        return [
+            FVG(float(gap['start_price']), float(gap['end_price']), candles[int(gap['index'])], float(gap['covered_size']))
+            for gap in self.get_fvg_array(timeframe)
+        ]
+
+    def get_open_fvgs(self, timeframe: str) -> List[FVG]:
+        return list(self.fvg_trackers[timeframe].open_fvgs)
 
     def get_chart(self, timeframe: str) -> Optional[Chart]:
         candles = self.get_candles(timeframe)
@@ -77,40 +244,57 @@ class Market:
         chart.draw_fvgs(fvgs)
         return chart
 
-    def is_price_in_extreme_range(self, timeframe: str) -> str:
+    # Описание графика для render_chart: overlay — 'plain', 'fvg' (имбалансы) или 'range' (крайние ценовые диапазоны)
+    def get_chart_payload(self, timeframe: str, overlay: str = 'plain') -> Optional[dict]:
         candles = self.get_candles(timeframe)
         if not candles:
-            return 'normal'
+            self.logger.error(f"No candle data for {self.symbol} on {timeframe} timeframe")
+            return None
 
-        current_price = candles[-1].close
-        high = max(candle.high for candle in candles)
-        low = min(candle.low for candle in candles)
+        payload = {
+            'candles': candles,
+            'title': f"{self.symbol} - {timeframe} ({self.get_chart_time_range(timeframe)})",
+            'ranges': [],
+            'price_ranges': None,
+        }
+        if overlay == 'fvg':
+            payload['ranges'] = [
+                (fvg.get_lower_bound(), fvg.get_upper_bound(), 'green' if fvg.is_bullish() else 'red', 0.1)
+                for fvg in self.get_fvgs(timeframe)
+            ]
+        elif overlay == 'range':
+            table = self.exchange.get_status_table() if self.exchange is not None else None
+            if table is not None and self.symbol in table:
+                payload['price_ranges'] = table.get_thresholds(self.symbol, timeframe)
+            else:
+                payload['price_ranges'] = self.get_price_thresholds(timeframe)
+        return payload
 
-        range_size = high - low
+    def get_chart_bytes(self, timeframe: str, overlay: str = 'plain') -> Optional[bytes]:
+        payload = self.get_chart_payload(timeframe, overlay)
+        return render_chart(payload) if payload is not None else None
 
-        if timeframe == '15m':
-            self.high_threshold_15m = high - 0.1 * range_size
-            self.low_threshold_15m = low + 0.1 * range_size
+    # Пороги и статус по текущим свечам рынка. Уведомления, графики и снимок читают их из таблицы статусов
+    # биржи (Exchange.screen_markets), которая считается сразу для всех символов
+    def get_price_thresholds(self, timeframe: str):
+        candles = self.get_candles(timeframe)
+        if not candles:
+            return None, None
+        _, low_threshold, high_threshold = classify(candles.high.max(), candles.low.min(), candles.close[-1])
+        return float(low_threshold), float(high_threshold)
 
-            if current_price >= self.high_threshold_15m:
-                return 'high'
-            elif current_price <= self.low_threshold_15m:
-                return 'low'
-            else:
-                return 'normal'
-        elif timeframe == '4h':
-            self.high_threshold_4h = high - 0.1 * range_size
-            self.low_threshold_4h = low + 0.1 * range_size
-
-            if current_price >= self.high_threshold_4h:
-                return 'high'
-            elif current_price <= self.low_threshold_4h:
-                return 'low'
-            else:
-                return 'normal'
+    def is_price_in_extreme_range(self, timeframe: str) -> str:
+        candles = self.get_candles(timeframe)
+        if not candles:
+            return 'normal'
+        status, _, _ = classify(candles.high.max(), candles.low.min(), candles.close[-1])
+        return STATUS_NAMES[int(status) + 1]
 
     def get_mark_price(self) -> float:
-        return self.candles_15m[-1].close if self.candles_15m else None
+        if self.mark_price is not None:
+            return self.mark_price
+        candles = self.engine.base
+        return float(candles.close[-1]) if len(candles) else None
 
     def get_chart_time_range(self, timeframe: str) -> str:
         candles = self.get_candles(timeframe)
@@ -0,0 +1,295 @@
+import logging
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Снимок рынков в разделяемой памяти: бот пишет, API и другие процессы читают без БД и без обмена сообщениями.
+#
+# Согласованность — seqlock: писатель делает счётчик seq нечётным, обновляет данные и снова делает его чётным.
+# Читатель запоминает чётный seq, читает данные и проверяет, что seq не изменился; иначе читает заново.
+#
+# Раскладка: заголовок, имена таймфреймов (по 8 байт), затем массивы из SNAPSHOT_ARRAYS подряд.
+# Размеры массивов задаются ёмкостью из заголовка: S символов, T таймфреймов, N свечей, F имбалансов
+
+MAGIC = b'IZZYSNAP'
+LAYOUT_VERSION = 1
+# magic, layout, state, seq, version, published_at, max_symbols, symbol_count, timeframes, candles, max_fvgs
+HEADER = struct.Struct('<8sIIQQdIIIII4x')
+SEQ_OFFSET = 16
+STATE_LIVE = 1
+STATE_CLOSED = 2
+
+# Сегменты, созданные писателями этого процесса: их регистрацию в resource_tracker читатель не трогает
+_created = set()
+
+STATUS_CODES = {'low': -1, 'normal': 0, 'high': 1}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+CANDLE_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'open_interest')
+
+SNAPSHOT_ARRAYS = (
+    ('symbols', 'S24', ('S',)),
+    ('mark_price', '<f8', ('S',)),
+    ('status', '<i8', ('S', 'T')),
+    # Нижний и верхний пороги крайних диапазонов
+    ('thresholds', '<f8', ('S', 'T', 2)),
+    ('candle_count', '<i8', ('S', 'T')),
+    ('timestamps', '<i8', ('S', 'T', 'N')),
+    ('candles', '<f8', ('S', 'T', 'N', len(CANDLE_COLUMNS))),
+    ('fvg_count', '<i8', ('S', 'T')),
+    # Нижняя граница, верхняя граница, 1.0 для бычьего имбаланса
+    ('fvgs', '<f8', ('S', 'T', 'F', 3)),
+)
+
+
+def _layout(max_symbols: int, timeframes: int, candles: int, max_fvgs: int):
+    sizes = {'S': max_symbols, 'T': timeframes, 'N': candles, 'F': max_fvgs}
+    offset = HEADER.size + 8 * timeframes
+    layout = []
+    for name, dtype, dims in SNAPSHOT_ARRAYS:
+        shape = tuple(sizes.get(dim, dim) for dim in dims)
+        layout.append((name, np.dtype(dtype), shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def _views(buffer, layout) -> dict:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, dtype, shape, offset in layout}
+
+
+# max_symbols — начальная ёмкость: если символов станет больше, сегмент создаётся заново большего размера,
+# а подключённые читатели увидят, что старый закрыт, и переподключатся
+class MarketSnapshotWriter:
+    def __init__(self, name: str, timeframes=('15m', '4h'), max_symbols: int = 64, candles: int = 100,
+                 max_fvgs: int = 16):
+        self.name = name
+        self.timeframes = tuple(timeframes)
+        self.candles = candles
+        self.max_fvgs = max_fvgs
+        self.version = 0
+        self.logger = logging.getLogger(__name__)
+        self._create(max_symbols)
+
+    def _create(self, max_symbols: int):
+        self.max_symbols = max_symbols
+        layout, size = _layout(max_symbols, len(self.timeframes), self.candles, self.max_fvgs)
+        # Сегмент, оставшийся от упавшего процесса бота, создаём заново
+        try:
+            stale = shared_memory.SharedMemory(self.name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        _created.add(self.shm._name)
+        self.arrays = _views(self.shm.buf, layout)
+        self.seq = np.ndarray((1,), dtype='<u8', buffer=self.shm.buf, offset=SEQ_OFFSET)
+        # Заголовок пишется последним: пока в сегменте нет MAGIC, читатели считают его ещё не готовым
+        for i, timeframe in enumerate(self.timeframes):
+            start = HEADER.size + 8 * i
+            self.shm.buf[start:start + 8] = timeframe.encode().ljust(8, b'\0')
+        self._write_header(0, 0.0)
+        self.logger.info(f"Market snapshot '{self.name}' created for {max_symbols} symbols ({size} bytes)")
+
+    def _write_header(self, symbol_count: int, published_at: float, state: int = STATE_LIVE):
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, LAYOUT_VERSION, state, int(self.seq[0]), self.version,
+                         published_at, self.max_symbols, symbol_count, len(self.timeframes), self.candles,
+                         self.max_fvgs)
+
+    # Собрать состояние рынков и опубликовать его одной транзакцией seqlock
+    def publish(self, exchange):
+        status_table = exchange.get_status_table()
+        with exchange.market_data_lock:
+            rows = [self._collect(market, status_table) for market in exchange.markets.values()]
+        if len(rows) > self.max_symbols:
+            # Запас вдвое, чтобы постепенный рост числа символов не пересоздавал сегмент на каждом новом
+            max_symbols = max(len(rows), 2 * self.max_symbols)
+            self.logger.info(f"Market snapshot grows from {self.max_symbols} to {max_symbols} symbols")
+            self._remove()
+            self._create(max_symbols)
+
+        arrays = self.arrays
+        self.seq[0] += 1
+        try:
+            for array in arrays.values():
+                array.fill(0)
+            arrays['mark_price'].fill(np.nan)
+            arrays['thresholds'].fill(np.nan)
+            for i, (symbol, mark_price, timeframes) in enumerate(rows):
+                arrays['symbols'][i] = symbol.encode()
+                arrays['mark_price'][i] = mark_price if mark_price is not None else np.nan
+                for j, (status, thresholds, candles, fvgs) in enumerate(timeframes):
+                    arrays['status'][i, j] = STATUS_CODES[status]
+                    arrays['thresholds'][i, j] = [np.nan if value is None else value for value in thresholds]
+                    count = len(candles)
+                    arrays['candle_count'][i, j] = count
+                    arrays['timestamps'][i, j, :count] = candles.timestamps
+                    for k, column in enumerate(CANDLE_COLUMNS):
+                        arrays['candles'][i, j, :count, k] = getattr(candles, column)
+                    arrays['fvg_count'][i, j] = len(fvgs)
+                    if fvgs:
+                        arrays['fvgs'][i, j, :len(fvgs)] = fvgs
+            self.version += 1
+            self._write_header(len(rows), time.time())
+        finally:
+            self.seq[0] += 1
+
+    # Статус и пороги берутся из таблицы статусов биржи; для рынков, которых в ней ещё нет, считаются на месте
+    def _collect(self, market, status_table):
+        timeframes = []
+        for timeframe in self.timeframes:
+            if market.symbol in status_table:
+                status = status_table.get_status(market.symbol, timeframe)
+                thresholds = status_table.get_thresholds(market.symbol, timeframe)
+            else:
+                status = market.is_price_in_extreme_range(timeframe)
+                thresholds = market.get_price_thresholds(timeframe)
+            candles = market.get_candles(timeframe).tail(self.candles).copy()
+            fvgs = [(fvg.get_lower_bound(), fvg.get_upper_bound(), float(fvg.is_bullish()))
+                    for fvg in market.get_open_fvgs(timeframe)[-self.max_fvgs:]]
+            timeframes.append((status, thresholds, candles, fvgs))
+        return market.symbol, market.get_mark_price(), timeframes
+
+    # Читатели, всё ещё подключённые к сегменту, увидят, что он закрыт, и переподключатся к новому
+    def _remove(self):
+        self.seq[0] += 1
+        self._write_header(0, time.time(), STATE_CLOSED)
+        del self.seq, self.arrays
+        self.shm.close()
+        self.shm.unlink()
+        _created.discard(self.shm._name)
+
+    def close(self):
+        self._remove()
+        self.logger.info(f"Market snapshot '{self.name}' removed")
+
+
+class MarketSnapshotUnavailable(Exception):
+    pass
+
+
+# Чтение снимка: массивы отображаются прямо на разделяемую память, без копирования.
+# Один читатель можно использовать из нескольких потоков: подключение, чтение и закрытие идут под блокировкой,
+# иначе поток мог бы закрыть сегмент, пока другой ещё читает его буфер.
+# Если писатель упал, не закрыв снимок, а новый создал сегмент заново, старый сегмент так и остаётся живым
+# для читателя; поэтому снимок, не обновлявшийся дольше stale_after секунд, переоткрывается по имени
+class MarketSnapshotReader:
+    def __init__(self, name: str, max_retries: int = 1000, stale_after: float = 5.0):
+        self.name = name
+        self.max_retries = max_retries
+        self.stale_after = stale_after
+        self.shm = None
+        self.attached_at = 0.0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _attach(self):
+        self._detach()
+        try:
+            shm = shared_memory.SharedMemory(self.name)
+        except FileNotFoundError:
+            raise MarketSnapshotUnavailable(f"Market snapshot '{self.name}' is not published")
+        # До Python 3.13 подключение регистрирует сегмент в resource_tracker, и тот удалил бы его при выходе читателя
+        if shm._name not in _created:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+        header = HEADER.unpack_from(shm.buf, 0) if shm.size >= HEADER.size else None
+        if header is None or header[0] == bytes(len(MAGIC)):
+            shm.close()
+            raise MarketSnapshotUnavailable(f"Market snapshot '{self.name}' is not ready yet")
+        if header[0] != MAGIC or header[1] != LAYOUT_VERSION:
+            shm.close()
+            raise MarketSnapshotUnavailable(f"Unsupported market snapshot layout in '{self.name}'")
+        max_symbols, _, timeframe_count, candles, max_fvgs = header[6:]
+        self.timeframes = [bytes(shm.buf[HEADER.size + 8 * i:HEADER.size + 8 * (i + 1)]).rstrip(b'\0').decode()
+                           for i in range(timeframe_count)]
+        layout, _ = _layout(max_symbols, timeframe_count, candles, max_fvgs)
+        self.arrays = _views(shm.buf, layout)
+        self.seq = np.ndarray((1,), dtype='<u8', buffer=shm.buf, offset=SEQ_OFFSET)
+        self.shm = shm
+        self.attached_at = time.monotonic()
+
+    # Снимок давно не обновлялся — возможно, его писатель упал и сегмент уже создан заново.
+    # Переоткрываем не чаще раза в stale_after секунд, чтобы остановленный бот не стоил переподключения на каждый запрос
+    def _is_stale(self, header) -> bool:
+        return (time.time() - header[5] > self.stale_after
+                and time.monotonic() - self.attached_at > self.stale_after)
+
+    # Выполнить fn(header, arrays) над согласованным состоянием снимка. fn работает прямо с разделяемой памятью
+    # и может быть вызвана повторно, поэтому всё, что нужно после чтения, она должна скопировать
+    def read(self, fn):
+        with self.lock:
+            if self.shm is None:
+                self._attach()
+            for _ in range(self.max_retries):
+                seq = int(self.seq[0])
+                header = HEADER.unpack_from(self.shm.buf, 0)
+                if header[2] == STATE_CLOSED or self._is_stale(header):
+                    self._attach()
+                    continue
+                if seq % 2:
+                    time.sleep(0)
+                    continue
+                result = fn(header, self.arrays)
+                if int(self.seq[0]) == seq:
+                    return result
+        raise MarketSnapshotUnavailable(f"Market snapshot '{self.name}' is being rewritten too often")
+
+    def _market(self, arrays, index: int) -> dict:
+        timeframes = {}
+        for j, timeframe in enumerate(self.timeframes):
+            count = int(arrays['candle_count'][index, j])
+            fvg_count = int(arrays['fvg_count'][index, j])
+            low, high = (None if np.isnan(value) else float(value) for value in arrays['thresholds'][index, j])
+            candles = arrays['candles'][index, j, :count]
+            timeframes[timeframe] = {
+                'status': STATUS_NAMES[int(arrays['status'][index, j])],
+                'low_threshold': low,
+                'high_threshold': high,
+                'candles': {
+                    'timestamp': arrays['timestamps'][index, j, :count].tolist(),
+                    **{column: np.where(np.isnan(candles[:, k]), None, candles[:, k]).tolist()
+                       for k, column in enumerate(CANDLE_COLUMNS)}
+                },
+                'open_fvgs': [{'lower': float(lower), 'upper': float(upper), 'bullish': bool(bullish)}
+                              for lower, upper, bullish in arrays['fvgs'][index, j, :fvg_count]]
+            }
+        mark_price = float(arrays['mark_price'][index])
+        return {
+            'symbol': arrays['symbols'][index].decode(),
+            'mark_price': None if np.isnan(mark_price) else mark_price,
+            'timeframes': timeframes
+        }
+
+    def get_market(self, symbol: str):
+        def read_market(header, arrays):
+            symbols = arrays['symbols'][:header[7]]
+            matches = np.flatnonzero(symbols == symbol.encode())
+            if not len(matches):
+                return None
+            market = self._market(arrays, int(matches[0]))
+            market['version'], market['published_at'] = header[4], header[5]
+            return market
+
+        return self.read(read_market)
+
+    def get_mark_prices(self) -> dict:
+        def read_prices(header, arrays):
+            count = header[7]
+            return {symbol.decode(): (None if np.isnan(price) else float(price))
+                    for symbol, price in zip(arrays['symbols'][:count], arrays['mark_price'][:count])}
+
+        return self.read(read_prices)
+
+    def _detach(self):
+        if self.shm is not None:
+            self.arrays = self.seq = None
+            self.shm.close()
+            self.shm = None
+
+    def close(self):
+        with self.lock:
+            self._detach()
@@ -0,0 +1,240 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Шардированный режим: символы распределяются между процессами-воркерами. Каждый воркер — отдельный Exchange
+# для своих символов: загрузка с биржи (опрос или поток), дисковый кэш свечей, старшие таймфреймы, трекеры FVG
+# и таблица статусов крайних диапазонов. Процессу бота воркер шлёт только изменения: новые и обновлённые свечи
+# окон графиков, цену маркировки, открытые имбалансы, события FVG, закрытия свечей и свою часть таблицы статусов
+
+
+# Номер воркера для символа (rendezvous hashing): при изменении набора символов переезжают только
+# добавленные и удалённые, остальные остаются на своих воркерах вместе с загруженной историей
+def assign_shard(symbol: str, workers: int) -> int:
+    return max(range(workers), key=lambda shard: zlib.crc32(f"{shard}:{symbol}".encode()))
+
+
+# Изменения одного воркера с прошлой отправки
+class ShardResult:
+    __slots__ = ('shard', 'markets', 'status_table', 'fvg_events', 'closed')
+
+    def __init__(self, shard: int, markets: dict, status_table, fvg_events: list, closed: list):
+        self.shard = shard
+        # symbol -> (цена маркировки, {таймфрейм: новые свечи окна}, {таймфрейм: открытые имбалансы} или None)
+        self.markets = markets
+        self.status_table = status_table
+        self.fvg_events = fvg_events
+        # (символ, таймфрейм) закрывшихся свечей
+        self.closed = closed
+
+
+# Символы воркера для его Exchange: тот же интерфейс, что у SymbolManager, но список задаёт координатор
+class ShardSymbols:
+    def __init__(self):
+        self.symbols = []
+        self.listeners = []
+
+    def get_symbols(self) -> list:
+        return list(self.symbols)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def set_symbols(self, symbols: list):
+        self.symbols = list(symbols)
+        for listener in self.listeners:
+            listener(self.get_symbols())
+
+
+# Сбор изменений рынков воркера. Для каждой пары (символ, таймфрейм) помнит последнюю отправленную свечу
+# и шлёт свечи, начиная с неё; свеча, не изменившаяся с прошлой отправки, не повторяется
+class ShardPublisher:
+    def __init__(self, shard: int, exchange):
+        self.shard = shard
+        self.exchange = exchange
+        self.sent = {}
+        self.mark_prices = {}
+        self.table_symbols = ()
+        self.fvg_events = []
+        self.closed = []
+        exchange.subscribe_fvg_events(self.fvg_events.append)
+        exchange.subscribe_candle_close(lambda symbol, timeframe: self.closed.append((symbol, timeframe)))
+
+    def collect(self):
+        status_table = self.exchange.screen_markets()
+        markets = {}
+        with self.exchange.market_data_lock:
+            for symbol, market in self.exchange.markets.items():
+                windows = {}
+                for timeframe in market.timeframes:
+                    delta = self._delta(symbol, timeframe, market.get_candles(timeframe))
+                    if delta is not None:
+                        windows[timeframe] = delta
+                mark_price = market.get_mark_price()
+                if windows or mark_price != self.mark_prices.get(symbol):
+                    open_fvgs = {timeframe: market.get_open_fvgs(timeframe) for timeframe in windows} or None
+                    markets[symbol] = (mark_price, windows, open_fvgs)
+                    self.mark_prices[symbol] = mark_price
+
+            for key in [key for key in self.sent if key[0] not in self.exchange.markets]:
+                del self.sent[key]
+            for symbol in [symbol for symbol in self.mark_prices if symbol not in self.exchange.markets]:
+                del self.mark_prices[symbol]
+
+        fvg_events, self.fvg_events[:] = list(self.fvg_events), []
+        closed, self.closed[:] = list(self.closed), []
+        # Без изменений свечей таблица меняется только с набором символов
+        table_changed = status_table.symbols != self.table_symbols
+        self.table_symbols = status_table.symbols
+        if not markets and not fvg_events and not closed and not table_changed:
+            return None
+        return ShardResult(self.shard, markets, status_table, fvg_events, closed)
+
+    def _delta(self, symbol: str, timeframe: str, candles):
+        if not len(candles):
+            return None
+        sent = self.sent.get((symbol, timeframe))
+        if sent is not None:
+            start = int(np.searchsorted(candles.timestamps, sent[0]))
+            candles = candles[start:]
+            if len(candles) == 1 and np.array_equal(self._row(candles), sent[1], equal_nan=True):
+                return None
+        candles = candles.copy()
+        self.sent[(symbol, timeframe)] = (candles.last_timestamp(), self._row(candles))
+        return candles
+
+    @staticmethod
+    def _row(candles) -> np.ndarray:
+        return np.array([getattr(candles, column)[-1] for column in candles.COLUMNS])
+
+
+def run_shard_worker(shard: int, exchange_class, settings: dict, commands, results):
+    logging.basicConfig(format=f"%(asctime)s - shard {shard} - %(name)s - %(levelname)s - %(message)s",
+                        level=logging.INFO)
+    logger = logging.getLogger(__name__)
+    symbols = ShardSymbols()
+    exchange = exchange_class(symbols, settings['api_key'], settings['api_secret'],
+                              ingestion_mode=settings['ingestion_mode'], stream_url=settings['stream_url'],
+                              cache_dir=settings['cache_dir'], timeframes=settings['timeframes'],
+                              rate_limit_share=1.0 / settings['workers'])
+    publisher = ShardPublisher(shard, exchange)
+    logger.info(f"Shard worker {shard} started")
+
+    try:
+        while True:
+            try:
+                command, argument = commands.get(timeout=settings['publish_interval'])
+            except queue.Empty:
+                command = None
+            if command == 'stop':
+                break
+            if command == 'assign':
+                symbols.set_symbols(argument)
+                logger.info(f"Shard worker {shard} assigned {len(argument)} symbols")
+
+            exchange.update_markets()
+            result = publisher.collect()
+            if result is not None:
+                results.put(result)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        exchange.stop()
+        logger.info(f"Shard worker {shard} stopped")
+
+
+# Координатор в процессе бота: запускает воркеры, раздаёт им символы, принимает их результаты
+# и перезапускает упавшие воркеры с тем же набором символов
+class ShardCoordinator:
+    # Как часто проверять, что воркеры живы, с
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, exchange, workers: int, exchange_class, settings: dict):
+        self.exchange = exchange
+        self.workers = workers
+        self.exchange_class = exchange_class
+        # Все воркеры ходят на биржу с одного IP и делят её лимиты поровну
+        self.settings = dict(settings, workers=workers)
+        # spawn: fork из многопоточного процесса бота может унаследовать захваченные блокировки
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue()
+        self.commands = {}
+        self.processes = {}
+        self.assignments = {shard: [] for shard in range(workers)}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.receiver = threading.Thread(target=self._receive, name='shard-receiver', daemon=True)
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        for shard in range(self.workers):
+            self._spawn(shard)
+        self.receiver.start()
+        self.logger.info(f"Started {self.workers} shard workers")
+        return self
+
+    def _spawn(self, shard: int):
+        commands = self.context.Queue()
+        process = self.context.Process(target=run_shard_worker, name=f'shard-{shard}', daemon=True,
+                                       args=(shard, self.exchange_class, self.settings, commands, self.results))
+        process.start()
+        self.commands[shard] = commands
+        self.processes[shard] = process
+        if self.assignments[shard]:
+            commands.put(('assign', self.assignments[shard]))
+
+    # Раздать символы воркерам; команды получают только воркеры, чей набор изменился
+    def rebalance(self, symbols: list):
+        assignments = {shard: [] for shard in range(self.workers)}
+        for symbol in sorted(symbols):
+            assignments[assign_shard(symbol, self.workers)].append(symbol)
+
+        with self.lock:
+            for shard, shard_symbols in assignments.items():
+                if shard_symbols != self.assignments[shard]:
+                    self.assignments[shard] = shard_symbols
+                    self.commands[shard].put(('assign', shard_symbols))
+        self.logger.info(f"Shards rebalanced: {[len(assignments[shard]) for shard in range(self.workers)]} symbols")
+
+    # Живость воркеров проверяется по таймеру, а не только когда очередь пуста: пока другие шарды шлют
+    # результаты, очередь не пустеет, и упавший воркер иначе не перезапустился бы никогда
+    def _receive(self):
+        next_check = time.monotonic() + self.CHECK_INTERVAL
+        while not self.stop_event.is_set():
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.CHECK_INTERVAL
+            try:
+                result = self.results.get(timeout=self.CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            try:
+                self.exchange.apply_shard_result(result)
+            except Exception:
+                self.logger.exception(f"Error applying result of shard {result.shard}")
+
+    def _check_workers(self):
+        with self.lock:
+            for shard, process in self.processes.items():
+                if not process.is_alive() and not self.stop_event.is_set():
+                    self.logger.error(f"Shard worker {shard} exited with code {process.exitcode}, restarting")
+                    self._spawn(shard)
+
+    def stop(self, timeout: float = 10):
+        self.stop_event.set()
+        for commands in self.commands.values():
+            commands.put(('stop', None))
+        for shard, process in self.processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                self.logger.warning(f"Shard worker {shard} did not stop in {timeout}s, terminating")
+                process.terminate()
+        self.receiver.join(timeout)
+        self.logger.info("Shard workers stopped")
@@ -47,8 +47,9 @@ class NotificationHistory(Base):
     symbol = Column(String(20), ForeignKey('symbols.symbol'))
     timestamp = Column(Integer)
     notification_type = Column(Enum('price', 'fvg', 'oi'), nullable=False)
-    price_status = Column(Enum('high', 'low'), nullable=True)
-    timeframe = Column(Enum('15m', '4h'), nullable=True)
+    # Для цены — крайний диапазон, для FVG — стадия имбаланса: у каждой своя пауза между уведомлениями
+    price_status = Column(Enum('high', 'low', 'created', 'partially_filled', 'filled'), nullable=True)
+    timeframe = Column(String(8), nullable=True)
     user = relationship("User", back_populates="notifications")
 
 
@@ -0,0 +1,76 @@
+import logging
+import threading
+
+from sqlalchemy import func, insert, select
+from lib.models import NotificationHistory
+
+
+# Время последней отправки для каждого ключа (пользователь, символ, тип, статус, таймфрейм).
+# Загружается одним агрегирующим запросом при старте и дальше ведётся в памяти;
+# записи истории копятся и сохраняются в БД пачками
+class NotificationCooldowns:
+    def __init__(self, async_session_maker, flush_size: int = 500):
+        self.AsyncSession = async_session_maker
+        self.flush_size = flush_size
+        self.last_sent = {}
+        self.pending = []
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    async def load(self):
+        async with self.AsyncSession() as session:
+            result = await session.execute(select(
+                NotificationHistory.user_id,
+                NotificationHistory.symbol,
+                NotificationHistory.notification_type,
+                NotificationHistory.price_status,
+                NotificationHistory.timeframe,
+                func.max(NotificationHistory.timestamp)
+            ).group_by(
+                NotificationHistory.user_id,
+                NotificationHistory.symbol,
+                NotificationHistory.notification_type,
+                NotificationHistory.price_status,
+                NotificationHistory.timeframe
+            ))
+            rows = result.all()
+
+        with self.lock:
+            self.last_sent = {tuple(row[:5]): row[5] for row in rows}
+        self.logger.info(f"Loaded {len(rows)} notification cooldowns")
+
+    def should_send(self, user_id, symbol, notification_type, status, timeframe, current_time, timeout) -> bool:
+        last_time = self.last_sent.get((user_id, symbol, notification_type, status, timeframe))
+        return last_time is None or (current_time - last_time) > timeout
+
+    async def record(self, user_id, symbol, notification_type, status, timeframe, timestamp):
+        with self.lock:
+            self.last_sent[(user_id, symbol, notification_type, status, timeframe)] = timestamp
+            self.pending.append({
+                'user_id': user_id,
+                'symbol': symbol,
+                'notification_type': notification_type,
+                'price_status': status,
+                'timeframe': timeframe,
+                'timestamp': timestamp
+            })
+            flush_needed = len(self.pending) >= self.flush_size
+        if flush_needed:
+            await self.flush()
+
+    # Записать накопленную историю одним INSERT; при ошибке записи остаются в очереди до следующей попытки
+    async def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+
+        try:
+            async with self.AsyncSession() as session:
+                await session.execute(insert(NotificationHistory), rows)
+                await session.commit()
+            self.logger.debug(f"Flushed {len(rows)} notification history records")
+        except Exception as e:
+            self.logger.error(f"Error flushing notification history ({len(rows)} records): {str(e)}")
+            with self.lock:
+                self.pending = rows + self.pending
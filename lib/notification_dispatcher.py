@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Awaitable, Callable, Iterable
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from .rate_limiter import TokenBucket
+
+
+# Итог рассылки одного уведомления
+class DeliveryReport:
+    __slots__ = ('label', 'sent', 'rejected', 'failed', 'retries', 'elapsed')
+
+    def __init__(self, label: str):
+        self.label = label
+        self.sent = []
+        # Чаты, которые Telegram отверг окончательно (бот заблокирован, чат не найден)
+        self.rejected = []
+        # Чаты, до которых не удалось достучаться за MAX_ATTEMPTS попыток
+        self.failed = []
+        self.retries = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return (f"<DeliveryReport {self.label}: {len(self.sent)} sent, {len(self.rejected)} rejected, "
+                f"{len(self.failed)} failed, {self.retries} retries in {self.elapsed:.2f}s>")
+
+
+# Параллельная рассылка уведомлений в пределах лимитов Telegram:
+# около 30 сообщений в секунду на бота, 1 в секунду в личный чат и 20 в минуту в группу
+class NotificationDispatcher:
+    GLOBAL_RATE = 30
+    PRIVATE_CHAT_RATE = 1
+    GROUP_CHAT_RATE = 20 / 60
+    MAX_ATTEMPTS = 3
+    RETRY_DELAY = 1.0
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, max_concurrency: int = 32):
+        self.global_limiter = TokenBucket(global_rate)
+        self.chat_limiters = {}
+        self.max_concurrency = max_concurrency
+        # После RetryAfter Telegram не принимает сообщения от бота до этого момента (time.monotonic)
+        self.paused_until = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    def _chat_limiter(self, chat_id: int) -> TokenBucket:
+        limiter = self.chat_limiters.get(chat_id)
+        if limiter is None:
+            rate = self.GROUP_CHAT_RATE if chat_id < 0 else self.PRIVATE_CHAT_RATE
+            limiter = self.chat_limiters[chat_id] = TokenBucket(rate, capacity=1)
+        return limiter
+
+    async def _wait_for_slot(self, chat_id: int):
+        limiter = self._chat_limiter(chat_id)
+        while (delay := limiter.try_acquire()) > 0:
+            await asyncio.sleep(delay)
+        while True:
+            delay = max(self.paused_until - time.monotonic(), self.global_limiter.try_acquire())
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _deliver_one(self, chat_id: int, send: Callable[[int], Awaitable], report: DeliveryReport,
+                           semaphore: asyncio.Semaphore):
+        async with semaphore:
+            for attempt in range(1, self.MAX_ATTEMPTS + 1):
+                if attempt > 1:
+                    report.retries += 1
+                await self._wait_for_slot(chat_id)
+                try:
+                    await send(chat_id)
+                    report.sent.append(chat_id)
+                    return
+                except RetryAfter as e:
+                    retry_after = e.retry_after
+                    if isinstance(retry_after, datetime.timedelta):
+                        retry_after = retry_after.total_seconds()
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                    self.logger.warning(f"Telegram flood control: pausing sends for {retry_after} seconds")
+                except (Forbidden, BadRequest) as e:
+                    self.logger.info(f"Notification to {chat_id} rejected: {str(e)}")
+                    report.rejected.append(chat_id)
+                    return
+                except NetworkError as e:
+                    self.logger.warning(f"Error sending notification to {chat_id} (attempt {attempt}): {str(e)}")
+                    await asyncio.sleep(self.RETRY_DELAY * attempt)
+                except Exception as e:
+                    self.logger.error(f"Error sending notification to {chat_id}: {str(e)}")
+                    break
+            report.failed.append(chat_id)
+
+    # Отправить одно уведомление всем чатам: send(chat_id) выполняет саму отправку
+    async def deliver(self, chat_ids: Iterable[int], send: Callable[[int], Awaitable],
+                      label: str = '') -> DeliveryReport:
+        report = DeliveryReport(label)
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*[self._deliver_one(chat_id, send, report, semaphore) for chat_id in chat_ids])
+        report.elapsed = time.monotonic() - started
+        self.logger.info(f"Notification delivery: {report}")
+        return report
@@ -1,97 +1,169 @@
+import asyncio
 import logging
+import threading
 import time
+from collections import defaultdict
 from telegram.ext import CallbackContext
-from lib.models import User, NotificationHistory, Symbol
-from sqlalchemy import and_
+from sqlalchemy import select
+from lib.models import User, Symbol
+from . import metrics
+from .chart_delivery import ChartDelivery
+from .fvg_tracker import FVGCreated, FVGFilled
+from .notification_cooldowns import NotificationCooldowns
+from .notification_dispatcher import NotificationDispatcher
+from .render_pool import RenderPoolBusy
+
+CHECK_SECONDS = metrics.histogram('izzy_notification_check_seconds',
+                                  'Time of one notification check: screening, decisions and delivery')
+DELIVERY_SECONDS = metrics.histogram('izzy_notification_delivery_seconds',
+                                     'Time to deliver one notification to all its recipients', ('type',))
+NOTIFICATIONS = metrics.counter('izzy_notifications_total', 'Notification messages by delivery result',
+                                ('type', 'result'))
 
 
 class NotificationManager:
-    def __init__(self, exchange, session_maker):
+    # clock — источник текущего времени для пауз между уведомлениями (в реплее — симулированные часы)
+    def __init__(self, exchange, async_session_maker, chart_delivery: ChartDelivery = None, clock=time.time,
+                 dispatcher: NotificationDispatcher = None):
         self.exchange = exchange
-        self.Session = session_maker
+        self.clock = clock
+        self.chart_delivery = chart_delivery or ChartDelivery(exchange)
+        self.AsyncSession = async_session_maker
         self.logger = logging.getLogger(__name__)
+        # События FVG приходят из потоков загрузки и шардов; проверка забирает накопленное целиком под блокировкой
+        self.fvg_events = defaultdict(list)
+        self.fvg_events_lock = threading.Lock()
+        self.cooldowns = NotificationCooldowns(async_session_maker)
+        self.dispatcher = dispatcher or NotificationDispatcher()
+        # Проверка может запускаться и минутной задачей, и по закрытию свечи в потоковом режиме
+        self.check_lock = asyncio.Lock()
+        self.exchange.subscribe_fvg_events(self.on_fvg_event)
+
+    # Загрузить состояние из БД; вызывается при запуске бота
+    async def start(self):
+        await self.cooldowns.load()
+
+    def on_fvg_event(self, event):
+        with self.fvg_events_lock:
+            self.fvg_events[event.symbol].append(event)
+
+    # Забрать события с прошлой проверки; пришедшие во время проверки попадут в следующую
+    def take_fvg_events(self) -> dict:
+        with self.fvg_events_lock:
+            events, self.fvg_events = self.fvg_events, defaultdict(list)
+        return events
 
     async def check_and_send_notifications(self, context: CallbackContext):
-        session = self.Session()
+        async with self.check_lock:
+            with CHECK_SECONDS.time():
+                await self._check_and_send_notifications(context)
+
+    async def _check_and_send_notifications(self, context: CallbackContext):
+        async with self.AsyncSession() as session:
+            users = (await session.scalars(select(User))).all()
+            symbol_settings = {symbol.symbol: symbol for symbol in await session.scalars(select(Symbol))}
+
+        current_time = int(self.clock())
+        fvg_events_by_symbol = self.take_fvg_events()
+        # Получатели каждого уведомления: одно уведомление готовится один раз и рассылается всем сразу
+        price_alerts = defaultdict(list)
+        fvg_alerts = []
         try:
-            current_time = int(time.time())
-            users = session.query(User).all()
-
-            for symbol in self.exchange.markets.keys():
+            # Статусы всех символов и таймфреймов считаются одним проходом; в цикле остаются только крайние
+            status_table = self.exchange.screen_markets()
+            price_users = [user for user in users if user.price_notifications]
+            for symbol, timeframe, status in status_table.extremes():
+                for user in price_users:
+                    if self.should_send_notification(user, symbol, 'price', status, timeframe, current_time):
+                        price_alerts[(symbol, timeframe, status)].append(user)
+
+            for symbol in status_table.symbols:
                 market = self.exchange.get_market(symbol)
                 if market is None:
                     self.logger.error(f"Skipping notifications for invalid symbol: {symbol}")
                     continue
 
-                status_15m = market.is_price_in_extreme_range('15m')
-                status_4h = market.is_price_in_extreme_range('4h')
-
-                for user in users:
-                    if user.price_notifications:
-                        if status_15m != 'normal' and self.should_send_notification(user, symbol, 'price', status_15m,
-                                                                                    '15m', current_time):
-                            await self.send_price_notification(context, user, symbol, status_15m, '15m')
-                            self.update_notification_history(session, user, symbol, 'price', status_15m, '15m',
-                                                             current_time)
-
-                        if status_4h != 'normal' and self.should_send_notification(user, symbol, 'price', status_4h,
-                                                                                   '4h', current_time):
-                            await self.send_price_notification(context, user, symbol, status_4h, '4h')
-                            self.update_notification_history(session, user, symbol, 'price', status_4h, '4h',
-                                                             current_time)
-
-                    # Add similar checks for FVG and OI notifications
-
-            session.commit()
+                # Add similar checks for OI notifications
+
+                fvg_events = self.check_fvg_status(market, fvg_events_by_symbol)
+                settings = symbol_settings.get(symbol)
+                if fvg_events and settings is not None and settings.monitor_fvg:
+                    fvg_users = [user for user in users if user.fvg_notifications]
+                    for event in fvg_events:
+                        if (event.fvg.size / event.fvg.start_price) * 100.0 < (settings.fvg_threshold or 0.0):
+                            continue
+                        # Образование и проторговка имбаланса — разные уведомления со своими паузами
+                        recipients = [user for user in fvg_users if self.should_send_notification(
+                            user, symbol, 'fvg', event.kind, event.timeframe, current_time)]
+                        if recipients:
+                            fvg_alerts.append((event, recipients))
+
+            await asyncio.gather(
+                *[self.send_price_notifications(context, users, symbol, status, timeframe, current_time)
+                  for (symbol, timeframe, status), users in price_alerts.items()],
+                *[self.send_fvg_notifications(context, users, event, current_time) for event, users in fvg_alerts]
+            )
         finally:
-            session.close()
+            await self.cooldowns.flush()
 
     def should_send_notification(self, user, symbol, notification_type, status, timeframe, current_time):
-        last_notification = self.Session().query(NotificationHistory).filter(
-            NotificationHistory.user_id == user.id,
-            NotificationHistory.symbol == symbol,
-            NotificationHistory.notification_type == notification_type,
-            NotificationHistory.price_status == status,
-            NotificationHistory.timeframe == timeframe
-        ).order_by(NotificationHistory.timestamp.desc()).first()
-
-        if last_notification:
-            return (current_time - last_notification.timestamp) > user.notification_timeout
-        return True
-
-    def update_notification_history(self, session, user, symbol, notification_type, status, timeframe, timestamp):
-        new_notification = NotificationHistory(
-            user_id=user.id,
-            symbol=symbol,
-            notification_type=notification_type,
-            price_status=status,
-            timeframe=timeframe,
-            timestamp=timestamp
-        )
-        session.add(new_notification)
-
-    async def send_price_notification(self, context, user, symbol, status, timeframe):
-        """
-        market = self.exchange.get_market(symbol)
-        if market:
-            message = self.create_price_notification_message(symbol, status, timeframe)
-            chart = market.get_chart(timeframe)
-            if chart:
-                if timeframe == '15m':
-                    chart.highlight_price_ranges(market.low_threshold_15m, market.high_threshold_15m)
-                elif timeframe == '4h':
-                    chart.highlight_price_ranges(market.low_threshold_4h, market.high_threshold_4h)
-                chart_bytes = chart.save()
-                await context.bot.send_photo(user.id, photo=chart_bytes, caption=message)
-            else:
-                await context.bot.send_message(user.id, text=message)
-        else:
-            self.logger.error(f"Market not found for symbol: {symbol}")
-        """
-        pass
+        return self.cooldowns.should_send(user.id, symbol, notification_type, status, timeframe, current_time,
+                                          user.notification_timeout)
+
+    async def update_notification_history(self, user, symbol, notification_type, status, timeframe, timestamp):
+        await self.cooldowns.record(user.id, symbol, notification_type, status, timeframe, timestamp)
+
+    # Сохранить накопленную историю уведомлений (при остановке бота)
+    async def flush_history(self):
+        await self.cooldowns.flush()
+
+    # Записать отправку в историю для всех, кому уведомление доставлено или кто его окончательно не принимает
+    async def record_delivery(self, report, users, symbol, notification_type, status, timeframe, timestamp):
+        DELIVERY_SECONDS.labels(notification_type).observe(report.elapsed)
+        for result in ('sent', 'rejected', 'failed'):
+            NOTIFICATIONS.labels(notification_type, result).inc(len(getattr(report, result)))
+        delivered = set(report.sent) | set(report.rejected)
+        for user in users:
+            if user.id in delivered:
+                await self.update_notification_history(user, symbol, notification_type, status, timeframe,
+                                                       timestamp)
+
+    async def send_price_notifications(self, context, users, symbol, status, timeframe, timestamp):
+        message = self.create_price_notification_message(symbol, status, timeframe)
+
+        # График загружается в Telegram один раз, остальным получателям уходит его file_id
+        async def send(chat_id):
+            try:
+                if await self.chart_delivery.send_chart(context.bot, chat_id, symbol, timeframe, 'range', message):
+                    return
+            except (RenderPoolBusy, asyncio.TimeoutError) as e:
+                self.logger.warning(f"Chart for {symbol} ({timeframe}) is not available, sending text: {str(e)}")
+            await context.bot.send_message(chat_id, text=message)
+
+        report = await self.dispatcher.deliver([user.id for user in users], send,
+                                               f"price {symbol} {timeframe} {status}")
+        await self.record_delivery(report, users, symbol, 'price', status, timeframe, timestamp)
+
+    async def send_fvg_notifications(self, context, users, event, timestamp):
+        message = self.create_fvg_notification_message(event)
+
+        async def send(chat_id):
+            await context.bot.send_message(chat_id, text=message)
+
+        report = await self.dispatcher.deliver([user.id for user in users], send,
+                                               f"{event.kind} {event.symbol} {event.timeframe}")
+        await self.record_delivery(report, users, event.symbol, 'fvg', event.kind, event.timeframe, timestamp)
+
+    def create_fvg_notification_message(self, event):
+        fvg = event.fvg
+        direction = "Бычий" if fvg.is_bullish() else "Медвежий"
+        bounds = f"{fvg.get_lower_bound():.4f} – {fvg.get_upper_bound():.4f}"
+        if isinstance(event, FVGFilled):
+            return f"{direction} имбаланс {bounds} для {event.symbol} ({event.timeframe}) проторгован"
+        return f"{direction} имбаланс {bounds} образовался для {event.symbol} ({event.timeframe})"
 
     def create_price_notification_message(self, symbol, status, timeframe):
-        timeframe_str = "краткосрочном" if timeframe == '15m' else "долгосрочном"
+        timeframe_str = "краткосрочном" if timeframe == self.exchange.base_timeframe else "долгосрочном"
         status_str = "верхнем" if status == 'high' else "нижнем"
         return f"Уведомление о цене для {symbol}: цена в {status_str} диапазоне на {timeframe_str} графике ({timeframe})"
 
@@ -101,9 +173,10 @@ class NotificationManager:
         # Implement price status check
         pass
 
-    def check_fvg_status(self, market):
-        # Implement FVG status check
-        pass
+    # Новые и проторгованные имбалансы, накопленные трекерами рынка с прошлой проверки
+    def check_fvg_status(self, market, fvg_events: dict):
+        events = fvg_events.get(market.symbol, [])
+        return [event for event in events if isinstance(event, (FVGCreated, FVGFilled))]
 
     def check_oi_status(self, market):
         # Implement Open Interest status check
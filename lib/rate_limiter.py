@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+# Потокобезопасное ведро токенов: rate токенов в секунду, не более capacity накопленных.
+# clock и sleep подменяются в тестах
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Забрать токены без ожидания; возвращает время, которое нужно подождать (0 — токены получены)
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            # Допуск на ошибку округления: иначе недостающие 1e-17 токена ждались бы бесконечно малыми паузами
+            if self.tokens >= tokens - 1e-9:
+                self.tokens = max(self.tokens - tokens, 0.0)
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    # Дождаться токенов; возвращает суммарное время ожидания в секундах
+    def acquire(self, tokens: float = 1.0) -> float:
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return waited
+            self.sleep(delay)
+            waited += delay
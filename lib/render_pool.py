@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .chart import render_chart, warm_up
+
+
+class RenderPoolBusy(Exception):
+    pass
+
+
+# Рендеринг графиков в отдельных процессах, чтобы matplotlib не останавливал event loop бота.
+# Процессы запускаются заранее и уже держат импортированные matplotlib/mplfinance и готовый стиль;
+# на вход получают описание графика с массивами свечей (см. render_chart)
+class RenderPool:
+    def __init__(self, workers: int = None, max_pending: int = None, timeout: float = 30.0):
+        self.workers = workers or os.cpu_count() or 1
+        # Сверх этого числа ожидающих рендеров новые запросы сразу отклоняются
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self.pending = 0
+        self.executor = None
+        self.logger = logging.getLogger(__name__)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: fork из многопоточного процесса бота может унаследовать захваченные блокировки
+        context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=warm_up)
+
+    def start(self):
+        self.executor = self._create_executor()
+        # Пул запускает процессы по мере надобности; одновременные задачи поднимают и прогревают все сразу
+        for _ in range(self.workers):
+            self.executor.submit(os.getpid)
+        self.logger.info(f"Render pool started with {self.workers} workers")
+        return self
+
+    async def render(self, payload: dict) -> bytes:
+        if self.pending >= self.max_pending:
+            raise RenderPoolBusy(f"{self.pending} charts are already waiting for rendering")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self.executor
+            try:
+                return await asyncio.wait_for(loop.run_in_executor(executor, render_chart, payload), self.timeout)
+            except BrokenProcessPool:
+                # Процесс рендеринга упал (например, по памяти) — пересоздаём пул для следующих запросов
+                if executor is self.executor:
+                    self.logger.error("Render pool is broken, restarting")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._create_executor()
+                raise
+        finally:
+            self.pending -= 1
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            self.logger.info("Render pool stopped")
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from .candle_store import CandleStore
+from .chart_cache import ChartCache
+from .db_utils import create_async_db_engine, create_async_session_maker
+from .market import Market
+from .models import Base, Symbol, User
+from .notification_dispatcher import NotificationDispatcher
+from .notification_manager import NotificationManager
+from .screener import ExtremeRangeScreener, StatusTable
+from .timeframes import DEFAULT_TIMEFRAMES, TIMEFRAME_MS, parse_timeframes, resample_history, resample_length
+
+# Реплей истории через анализ и уведомления: базовые свечи подаются рынкам по одной, как дельты при опросе
+# биржи, после каждой свечи NotificationManager принимает решения по симулированным часам, а сообщения
+# вместо Telegram попадают в CapturingBot. Так пороги и паузы можно настроить на месяцах истории за секунды
+
+
+# Симулированные часы: время задаёт реплей, а не система
+class SimulatedClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, now: float):
+        self.now = max(self.now, now)
+
+
+# Бот вместо Telegram: запоминает сообщения вместе с симулированным временем отправки
+class CapturingBot:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((self.clock(), chat_id, text))
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        self.sent.append((self.clock(), chat_id, caption))
+
+
+# Биржа без сети: рынки, таблица статусов и события FVG, как у Exchange, но данные подаёт вызывающий
+class ReplayExchange:
+    def __init__(self, timeframes=DEFAULT_TIMEFRAMES):
+        self.timeframes = parse_timeframes(timeframes)
+        self.base_timeframe = self.timeframes[0]
+        self.candle_store = None
+        self.markets = {}
+        self.screener = ExtremeRangeScreener(self.timeframes)
+        self.status_table = StatusTable.empty(self.timeframes)
+        self.chart_file_ids = ChartCache()
+        self.fvg_listeners = []
+
+    # Истории старших таймфреймов биржи здесь нет: она собирается из переданных базовых свечей
+    def add_market(self, symbol: str, candles) -> Market:
+        market = self.markets[symbol] = Market(self, symbol)
+        for tracker in market.fvg_trackers.values():
+            tracker.subscribe(self.publish_fvg_event)
+        market.update_from_data({self.base_timeframe: candles,
+                                 **resample_history(candles, self.timeframes, market.max_candles)})
+        return market
+
+    def screen_markets(self) -> StatusTable:
+        self.status_table = self.screener.screen(self.markets)
+        return self.status_table
+
+    def get_status_table(self) -> StatusTable:
+        return self.status_table
+
+    def get_market(self, symbol: str) -> Market:
+        return self.markets.get(symbol)
+
+    def subscribe_fvg_events(self, listener):
+        self.fvg_listeners.append(listener)
+
+    def publish_fvg_event(self, event):
+        for listener in self.fvg_listeners:
+            listener(event)
+
+    # Графики в реплее не рендерятся: уведомления уходят текстом
+    def get_chart_key(self, symbol: str, timeframe: str, overlay: str = 'plain'):
+        return None
+
+    def request_resync(self, symbol: str, timeframe: str = None):
+        pass
+
+
+# NotificationManager, который дополнительно записывает каждое принятое решение об уведомлении
+class ReplayNotificationManager(NotificationManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (симулированное время, символ, тип, статус, таймфрейм, число получателей)
+        self.alerts = []
+
+    async def record_delivery(self, report, users, symbol, notification_type, status, timeframe, timestamp):
+        self.alerts.append((timestamp, symbol, notification_type, status, timeframe, len(report.sent)))
+        await super().record_delivery(report, users, symbol, notification_type, status, timeframe, timestamp)
+
+
+class ReplayReport:
+    def __init__(self, symbols: int, candles: int, wall_time: float, check_latencies: list, alerts: list,
+                 messages: int, start: float, end: float):
+        self.symbols = symbols
+        self.candles = candles
+        self.wall_time = wall_time
+        self.check_latencies = check_latencies
+        self.alerts = alerts
+        self.messages = messages
+        # Симулированный интервал реплея, epoch s
+        self.start = start
+        self.end = end
+
+    @property
+    def candles_per_second(self) -> float:
+        return self.candles / self.wall_time if self.wall_time else 0.0
+
+    # symbol -> {'price': n, 'fvg': n}: число уведомлений (не сообщений) по символам
+    def alerts_per_symbol(self) -> dict:
+        counts = defaultdict(lambda: defaultdict(int))
+        for _, symbol, notification_type, _, _, _ in self.alerts:
+            counts[symbol][notification_type] += 1
+        return {symbol: dict(kinds) for symbol, kinds in sorted(counts.items())}
+
+    def latency_stats(self) -> dict:
+        latencies = sorted(self.check_latencies)
+        if not latencies:
+            return {}
+        return {
+            'checks': len(latencies),
+            'mean': statistics.fmean(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'max': latencies[-1],
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'symbols': self.symbols,
+            'candles': self.candles,
+            'wall_time': self.wall_time,
+            'candles_per_second': self.candles_per_second,
+            'simulated_start': self.start,
+            'simulated_end': self.end,
+            'alerts': len(self.alerts),
+            'messages': self.messages,
+            'alerts_per_symbol': self.alerts_per_symbol(),
+            'check_latency': self.latency_stats(),
+        }
+
+
+class ReplayEngine:
+    # history — базовые свечи по символам (CandleSeries базового таймфрейма). Первые warmup свечей загружаются
+    # сразу, без уведомлений (по умолчанию — сколько нужно для полных окон всех таймфреймов)
+    def __init__(self, history: dict, timeframes=DEFAULT_TIMEFRAMES, users: int = 1, notification_timeout: int = 3600,
+                 fvg_threshold: float = 0.0, warmup: int = None, check_every: int = 1, db_url: str = None):
+        self.history = history
+        self.exchange = ReplayExchange(timeframes)
+        self.base_ms = TIMEFRAME_MS[self.exchange.base_timeframe]
+        self.users = users
+        self.notification_timeout = notification_timeout
+        self.fvg_threshold = fvg_threshold
+        self.warmup = warmup if warmup is not None else resample_length(self.exchange.timeframes, 100)
+        # После разогрева должны остаться свечи для реплея, иначе отчёт был бы пустым, но выглядел бы успешным
+        short = sorted(symbol for symbol, candles in history.items() if len(candles) <= self.warmup)
+        if not history or short:
+            raise ValueError(f"Replay needs more than {self.warmup} {self.exchange.base_timeframe} candles per symbol "
+                             f"(warm-up), too short: {', '.join(short) or 'no history given'}")
+        self.check_every = check_every
+        self.db_url = db_url
+        self.clock = SimulatedClock()
+        self.bot = CapturingBot(self.clock)
+        self.logger = logging.getLogger(__name__)
+
+    def run(self) -> ReplayReport:
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> ReplayReport:
+        # Без db_url база реплея временная и удаляется вместе с каталогом после прогона
+        directory = tempfile.mkdtemp(prefix='izzy-replay-') if self.db_url is None else None
+        db_url = self.db_url or f"sqlite:///{os.path.join(directory, 'replay.db')}"
+        engine = create_async_db_engine(db_url)
+        try:
+            AsyncSession = create_async_session_maker(engine)
+            await self._prepare_database(engine, AsyncSession)
+            return await self._replay(AsyncSession)
+        finally:
+            await engine.dispose()
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    async def _prepare_database(self, engine, AsyncSession):
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        async with AsyncSession() as session:
+            for user_id in range(1, self.users + 1):
+                session.add(User(id=user_id, notification_timeout=self.notification_timeout,
+                                 price_notifications=True, fvg_notifications=True))
+            for symbol in self.history:
+                session.add(Symbol(symbol=symbol, icon_class='', monitor_fvg=True, fvg_threshold=self.fvg_threshold))
+            await session.commit()
+
+    async def _replay(self, AsyncSession) -> ReplayReport:
+        exchange = self.exchange
+        # Без лимитов Telegram: сообщения уходят в CapturingBot мгновенно
+        dispatcher = NotificationDispatcher(global_rate=1e9)
+        dispatcher.PRIVATE_CHAT_RATE = dispatcher.GROUP_CHAT_RATE = 1e9
+        manager = ReplayNotificationManager(exchange, AsyncSession, clock=self.clock, dispatcher=dispatcher)
+        context = SimpleNamespace(bot=self.bot)
+
+        for symbol, candles in self.history.items():
+            exchange.add_market(symbol, candles[:self.warmup])
+
+        # Шаги реплея — все моменты открытия базовых свечей после разогрева, по всем символам сразу
+        steps = sorted({int(timestamp) for candles in self.history.values()
+                        for timestamp in candles.timestamps[self.warmup:]})
+        positions = {symbol: self.warmup for symbol in self.history}
+        base_timeframe = exchange.base_timeframe
+        latencies = []
+        candles_applied = 0
+        started = time.perf_counter()
+
+        for step_index, timestamp in enumerate(steps):
+            for symbol, candles in self.history.items():
+                position = positions[symbol]
+                if position >= len(candles) or candles.timestamps[position] != timestamp:
+                    continue
+                # Дельта, как при опросе: последняя известная свеча и новая
+                exchange.markets[symbol].update_from_data({base_timeframe: candles[position - 1:position + 1],
+                                                           'delta': {base_timeframe: True}})
+                positions[symbol] = position + 1
+                candles_applied += 1
+
+            # Решения принимаются в момент закрытия новой свечи
+            self.clock.advance_to((timestamp + self.base_ms) / 1000)
+            if (step_index + 1) % self.check_every == 0:
+                check_started = time.perf_counter()
+                await manager.check_and_send_notifications(context)
+                latencies.append(time.perf_counter() - check_started)
+
+        wall_time = time.perf_counter() - started
+        report = ReplayReport(len(self.history), candles_applied, wall_time, latencies, manager.alerts,
+                              len(self.bot.sent), steps[0] / 1000 if steps else None, self.clock())
+        self.logger.info(f"Replayed {candles_applied} candles of {len(self.history)} symbols in {wall_time:.2f}s "
+                         f"({report.candles_per_second:,.0f} candles/s), {len(manager.alerts)} alerts")
+        return report
+
+
+# Записанная история из дискового кэша свечей бота (CACHE_DIR)
+def load_recorded_history(cache_dir: str, symbols=None, timeframe: str = '15m') -> dict:
+    store = CandleStore(cache_dir)
+    if symbols is None:
+        symbols = sorted(entry for entry in os.listdir(cache_dir)
+                         if os.path.isdir(os.path.join(cache_dir, entry, timeframe)))
+    history = {}
+    for symbol in symbols:
+        candles = store.load(symbol, timeframe)
+        if len(candles):
+            history[symbol] = candles
+    return history
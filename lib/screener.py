@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+
+STATUS_NAMES = ('low', 'normal', 'high')
+
+
+# Неизменяемая таблица статусов крайних диапазонов: строка на символ, столбец на таймфрейм.
+# Статус хранится кодом: -1 — нижний диапазон, 0 — обычный, 1 — верхний
+class StatusTable:
+    __slots__ = ('symbols', 'timeframes', 'rows', 'columns', 'status', 'low', 'high', 'version', 'computed_at')
+
+    def __init__(self, symbols, timeframes, status, low, high, version: int = 0, computed_at: float = None):
+        self.symbols = tuple(symbols)
+        self.timeframes = tuple(timeframes)
+        self.rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.columns = {timeframe: column for column, timeframe in enumerate(self.timeframes)}
+        for array in (status, low, high):
+            array.flags.writeable = False
+        self.status = status
+        self.low = low
+        self.high = high
+        self.version = version
+        self.computed_at = computed_at
+
+    @classmethod
+    def empty(cls, timeframes) -> 'StatusTable':
+        shape = (0, len(timeframes))
+        return cls((), timeframes, np.zeros(shape, dtype=np.int8), np.empty(shape), np.empty(shape))
+
+    # Объединить таблицы с разными символами (например, частичные таблицы воркеров)
+    @classmethod
+    def concat(cls, tables, timeframes) -> 'StatusTable':
+        tables = [table for table in tables if table.symbols]
+        if not tables:
+            return cls.empty(timeframes)
+        return cls([symbol for table in tables for symbol in table.symbols], timeframes,
+                   np.concatenate([table.status for table in tables]), np.concatenate([table.low for table in tables]),
+                   np.concatenate([table.high for table in tables]), max(table.version for table in tables),
+                   max(table.computed_at or 0 for table in tables))
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.rows
+
+    def get_status(self, symbol: str, timeframe: str) -> str:
+        row = self.rows.get(symbol)
+        if row is None:
+            return 'normal'
+        return STATUS_NAMES[self.status[row, self.columns[timeframe]] + 1]
+
+    # Нижний и верхний пороги; (None, None), если для символа нет свечей
+    def get_thresholds(self, symbol: str, timeframe: str):
+        row = self.rows.get(symbol)
+        if row is None:
+            return None, None
+        column = self.columns[timeframe]
+        low, high = float(self.low[row, column]), float(self.high[row, column])
+        return (None, None) if np.isnan(low) else (low, high)
+
+    # Все пары (символ, таймфрейм) в крайних диапазонах
+    def extremes(self):
+        for row, column in zip(*np.nonzero(self.status)):
+            yield self.symbols[row], self.timeframes[column], STATUS_NAMES[self.status[row, column] + 1]
+
+
+# Пороги и статус для массивов экстремумов и цен закрытия; работает и для одной свечи, и для таблицы
+def classify(high, low, close, range_fraction: float = 0.1):
+    range_size = high - low
+    high_threshold = high - range_fraction * range_size
+    low_threshold = low + range_fraction * range_size
+    with np.errstate(invalid='ignore'):
+        status = np.where(close >= high_threshold, 1, np.where(close <= low_threshold, -1, 0)).astype(np.int8)
+    return status, low_threshold, high_threshold
+
+
+# Скринер крайних диапазонов по всем символам сразу. Экстремумы закрытых свечей окна кэшируются и
+# пересчитываются, только когда окно свечей сдвигается или закрытая свеча меняется на месте; между ними в каждом цикле читается лишь
+# формирующаяся свеча, а пороги и статусы всех символов считаются одним векторным проходом
+class ExtremeRangeScreener:
+    def __init__(self, timeframes, range_fraction: float = 0.1):
+        self.timeframes = tuple(timeframes)
+        self.range_fraction = range_fraction
+        # timeframe -> symbol -> (первая свеча, последняя свеча, длина окна, версия закрытых свечей,
+        #                         max high, min low закрытых свечей)
+        self.closed_extremes = {timeframe: {} for timeframe in self.timeframes}
+        self.version = 0
+
+    def screen(self, markets: dict) -> StatusTable:
+        symbols = list(markets)
+        shape = (len(symbols), len(self.timeframes))
+        high = np.full(shape, np.nan)
+        low = np.full(shape, np.nan)
+        close = np.full(shape, np.nan)
+
+        for column, timeframe in enumerate(self.timeframes):
+            cache = self.closed_extremes[timeframe]
+            for row, symbol in enumerate(symbols):
+                candles = markets[symbol].get_candles(timeframe)
+                count = len(candles)
+                if not count:
+                    continue
+                window = (int(candles.timestamps[0]), int(candles.timestamps[-1]), count,
+                          markets[symbol].engine.closed_versions[timeframe])
+                cached = cache.get(symbol)
+                if cached is None or cached[:4] != window:
+                    closed_high = candles.high[:-1].max() if count > 1 else -np.inf
+                    closed_low = candles.low[:-1].min() if count > 1 else np.inf
+                    cached = cache[symbol] = window + (closed_high, closed_low)
+                high[row, column] = max(cached[4], candles.high[-1])
+                low[row, column] = min(cached[5], candles.low[-1])
+                close[row, column] = candles.close[-1]
+
+            for symbol in [symbol for symbol in cache if symbol not in markets]:
+                del cache[symbol]
+
+        status, low_threshold, high_threshold = classify(high, low, close, self.range_fraction)
+        self.version += 1
+        return StatusTable(symbols, self.timeframes, status, low_threshold, high_threshold, self.version,
+                           time.time())
@@ -1,16 +1,78 @@
+import asyncio
 import logging
+import threading
+from sqlalchemy import select
 from lib.models import Symbol
 
 
+# Снимок таблицы символов в памяти: чтение символов — обращение к словарю, а не запрос к БД.
+# Снимок перечитывается после add_symbol/remove_symbol и периодически (refresh_async), чтобы подхватить
+# изменения, сделанные в обход бота (например, командой insert-symbols из api.py)
 class SymbolManager:
-    def __init__(self, session_maker):
+    # Синхронные сессии — для потоков биржи, асинхронные — для обработчиков бота
+    def __init__(self, session_maker, async_session_maker=None):
         self.Session = session_maker
+        self.AsyncSession = async_session_maker
         self.logger = logging.getLogger(__name__)
+        self.symbols = {}
+        self.fingerprint = None
+        # Номер снимка: растёт при любом изменении таблицы символов
+        self.version = 0
+        self.listeners = []
+        self.lock = threading.Lock()
 
-    def get_symbols(self) -> list:
+    @staticmethod
+    def _row_fingerprint(symbol: Symbol) -> tuple:
+        return (symbol.symbol, symbol.icon_class, symbol.last_mark_price, symbol.monitor_oi, symbol.oi_threshold,
+                symbol.monitor_fvg, symbol.fvg_threshold)
+
+    # Применить свежие строки таблицы; слушатели вызываются, только если изменился сам набор символов
+    def _apply(self, rows: list) -> bool:
+        snapshot = {row.symbol: row for row in rows}
+        fingerprint = tuple(sorted(self._row_fingerprint(row) for row in rows))
+        with self.lock:
+            if self.version and fingerprint == self.fingerprint:
+                return False
+            set_changed = snapshot.keys() != self.symbols.keys()
+            self.symbols = snapshot
+            self.fingerprint = fingerprint
+            self.version += 1
+            version = self.version
+
+        self.logger.info(f"Symbol snapshot updated to version {version}: {len(snapshot)} symbols")
+        if set_changed:
+            symbols = self.get_symbols()
+            for listener in self.listeners:
+                try:
+                    listener(symbols)
+                except Exception:
+                    self.logger.exception("Error in symbol change listener")
+        return True
+
+    def reload(self) -> bool:
         with self.Session() as session:
-            symbols = session.query(Symbol.symbol).all()
-            return [symbol[0] for symbol in symbols]
+            return self._apply(session.query(Symbol).all())
+
+    # Вызывается из event loop: снимок меняется под threading.Lock, а слушатели (биржа) берут свои блокировки
+    # и читают дисковый кэш, поэтому применение уходит в поток и не задерживает обработчики бота
+    async def refresh_async(self) -> bool:
+        async with self.AsyncSession() as session:
+            rows = (await session.scalars(select(Symbol))).all()
+        return await asyncio.to_thread(self._apply, rows)
+
+    # listener(symbols) вызывается при добавлении или удалении символов
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def get_symbols(self) -> list:
+        if not self.version:
+            self.reload()
+        return list(self.symbols)
+
+    def get_symbol(self, symbol: str):
+        if not self.version:
+            self.reload()
+        return self.symbols.get(symbol)
 
     def add_symbol(self, symbol: str, icon_class: str):
         with self.Session() as session:
@@ -19,6 +81,7 @@ class SymbolManager:
                 new_symbol = Symbol(symbol=symbol, icon_class=icon_class)
                 session.add(new_symbol)
                 session.commit()
+        self.reload()
 
     def remove_symbol(self, symbol: str):
         with self.Session() as session:
@@ -26,3 +89,4 @@ class SymbolManager:
             if existing_symbol:
                 session.delete(existing_symbol)
                 session.commit()
+        self.reload()
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from lib.models import Symbol
+
+
+def dump_json(data) -> bytes:
+    return json.dumps(data, separators=(',', ':'), sort_keys=True).encode()
+
+
+# Готовый JSON-ответ и его сильный ETag
+class CachedResponse:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+# Снимок таблицы символов для API: ответы сериализуются заранее и пересобираются, только когда меняются данные.
+# БД опрашивается не чаще раза в check_interval секунд, остальные запросы обслуживаются из памяти
+class SymbolSnapshot:
+    def __init__(self, session_maker, check_interval: float = 5.0):
+        self.Session = session_maker
+        self.check_interval = check_interval
+        self.checked = None
+        self.fingerprint = None
+        self.version = 0
+        self.symbols = {}
+        self.symbols_response = CachedResponse(b'[]')
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def serialize(symbol: Symbol) -> dict:
+        return {
+            'symbol': symbol.symbol,
+            'icon_class': symbol.icon_class,
+            'last_mark_price': float(symbol.last_mark_price) if symbol.last_mark_price is not None else None
+        }
+
+    def refresh(self) -> bool:
+        with self.Session() as session:
+            rows = [self.serialize(symbol) for symbol in session.query(Symbol).order_by(Symbol.symbol)]
+
+        fingerprint = dump_json(rows)
+        if fingerprint == self.fingerprint:
+            return False
+
+        symbols = {row['symbol']: CachedResponse(dump_json(row)) for row in rows}
+        self.symbols, self.symbols_response = symbols, CachedResponse(fingerprint)
+        self.fingerprint = fingerprint
+        self.version += 1
+        self.logger.info(f"Symbol snapshot rebuilt: version {self.version}, {len(rows)} symbols")
+        return True
+
+    # Проверить БД, если снимок устарел; пока один поток перечитывает таблицу, остальные отвечают из старого снимка
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < self.check_interval:
+            return
+        if not self.lock.acquire(blocking=self.checked is None):
+            return
+        try:
+            if self.checked is None or now - self.checked >= self.check_interval:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    # Без первого снимка отвечать нечем; дальше при сбое БД отдаём последний удачный
+                    if self.checked is None:
+                        raise
+                    self.logger.error(f"Error refreshing symbol snapshot: {str(e)}")
+                self.checked = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def get_symbols(self) -> CachedResponse:
+        self.ensure_fresh()
+        return self.symbols_response
+
+    def get_symbol(self, symbol: str):
+        self.ensure_fresh()
+        return self.symbols.get(symbol)
+
+    # Несколько символов за один запрос: {"BTCUSDT": {...}, "UNKNOWN": null}
+    def get_batch(self, names: list) -> CachedResponse:
+        self.ensure_fresh()
+        symbols = self.symbols
+        items = [json.dumps(name).encode() + b':' + (symbols[name].body if name in symbols else b'null')
+                 for name in dict.fromkeys(names)]
+        return CachedResponse(b'{' + b','.join(items) + b'}')
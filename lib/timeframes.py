@@ -0,0 +1,186 @@
+import numpy as np
+
+from .candle_series import CandleSeries
+
+# Поддерживаемые таймфреймы: длительность свечи и интервалы Bybit для свечей и открытого интереса.
+# Все длительности делят сутки, поэтому границы свечей — просто кратные длительности от начала эпохи (UTC)
+TIMEFRAME_MS = {
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '2h': 2 * 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '6h': 6 * 60 * 60 * 1000,
+    '12h': 12 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+KLINE_INTERVALS = {'5m': '5', '15m': '15', '30m': '30', '1h': '60', '2h': '120', '4h': '240', '6h': '360',
+                   '12h': '720', '1d': 'D'}
+# Базовый таймфрейм загружается с биржи вместе с ОИ, поэтому он должен быть из этого списка
+OI_INTERVALS = {'5m': '5min', '15m': '15min', '30m': '30min', '1h': '1h', '4h': '4h', '1d': '1d'}
+INTERVAL_TIMEFRAMES = {interval: timeframe for timeframe, interval in KLINE_INTERVALS.items()}
+INTERVAL_MS = {interval: TIMEFRAME_MS[timeframe] for timeframe, interval in KLINE_INTERVALS.items()}
+
+DEFAULT_TIMEFRAMES = ('15m', '4h')
+
+
+# Проверить набор таймфреймов и упорядочить его от младшего к старшему; младший становится базовым
+def parse_timeframes(timeframes) -> tuple:
+    if isinstance(timeframes, str):
+        timeframes = [timeframe.strip() for timeframe in timeframes.split(',') if timeframe.strip()]
+    unknown = [timeframe for timeframe in timeframes if timeframe not in TIMEFRAME_MS]
+    if unknown or not timeframes:
+        raise ValueError(f"Invalid timeframes: {', '.join(unknown) or 'none given'}")
+
+    timeframes = tuple(sorted(set(timeframes), key=TIMEFRAME_MS.get))
+    base = timeframes[0]
+    if base not in OI_INTERVALS:
+        raise ValueError(f"Base timeframe {base} has no open interest interval on Bybit")
+    return timeframes
+
+
+# Собрать свечи старшего таймфрейма из базовых одним векторным проходом.
+# open — первой базовой свечи, close и ОИ — последней (ОИ — последнее известное значение), high/low — экстремумы,
+# объём — сумма. Первая корзина, для которой нет начальных базовых свечей, отбрасывается: её open неверен.
+# Последняя корзина может быть неполной — это формирующаяся свеча, как и у биржи
+def resample(base: CandleSeries, timeframe_ms: int) -> CandleSeries:
+    if not len(base):
+        return CandleSeries.empty()
+
+    buckets = base.timestamps - base.timestamps % timeframe_ms
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    if base.timestamps[0] != buckets[0]:
+        starts = starts[1:]
+        if not len(starts):
+            return CandleSeries.empty()
+        base = base[int(starts[0]):]
+        buckets = buckets[int(starts[0]):]
+        starts = starts - starts[0]
+    ends = np.append(starts[1:], len(base)) - 1
+
+    open_interest = base.open_interest
+    known = np.where(np.isnan(open_interest), -1, np.arange(len(open_interest)))
+    last_known = np.maximum.accumulate(known)[ends]
+    last_open_interest = np.where(last_known >= starts, open_interest[np.maximum(last_known, 0)], np.nan)
+
+    return CandleSeries(
+        buckets[starts],
+        base.open[starts],
+        np.maximum.reduceat(base.high, starts),
+        np.minimum.reduceat(base.low, starts),
+        base.close[ends],
+        np.add.reduceat(base.volume, starts),
+        last_open_interest,
+    )
+
+
+# Свечи всех таймфреймов рынка. История старших таймфреймов загружается один раз их собственным интервалом
+# (или из дискового кэша), а базовая серия хранит окно графика и формирующуюся корзину самого старшего
+# таймфрейма: из неё пересчитываются только корзины, которые затронуло обновление базы
+class TimeframeEngine:
+    def __init__(self, timeframes=DEFAULT_TIMEFRAMES, max_candles: int = 100):
+        self.timeframes = parse_timeframes(timeframes)
+        self.base_timeframe = self.timeframes[0]
+        self.base_ms = TIMEFRAME_MS[self.base_timeframe]
+        self.max_candles = max_candles
+        self.base_length = history_length(self.timeframes, max_candles)
+        self.base = CandleSeries.empty()
+        # Последние max_candles базовых свечей — срез base, общий с ней по памяти
+        self.base_window = self.base
+        self.series = {timeframe: CandleSeries.empty() for timeframe in self.timeframes[1:]}
+        # Версии закрытых свечей окон: растут, когда меняется свеча, уже не последняя в окне
+        # (поздняя правка, полная перезагрузка), чтобы кэши по закрытым свечам знали, что устарели
+        self.closed_versions = {timeframe: 0 for timeframe in self.timeframes}
+
+    def get(self, timeframe: str) -> CandleSeries:
+        if timeframe == self.base_timeframe:
+            return self.base_window
+        if timeframe not in self.series:
+            raise ValueError(f"Invalid timeframe: {timeframe}")
+        return self.series[timeframe]
+
+    # Новая базовая серия. changed_from — время первой изменившейся базовой свечи; None — пересчитать всё,
+    # что покрывает база. history — загруженная история старших таймфреймов, заменяет их прежние свечи.
+    # Возвращает таймфреймы, история которых не стыкуется с базой (база начинается позже их последней свечи)
+    def update(self, base: CandleSeries, changed_from: int = None, history: dict = None) -> list:
+        self.base = base.tail(self.base_length)
+        self.base_window = self.base.tail(self.max_candles)
+        self._touch_closed(self.base_timeframe, self.base_window, changed_from)
+        history = history or {}
+        detached = []
+        for timeframe, series in self.series.items():
+            timeframe_ms = TIMEFRAME_MS[timeframe]
+            touched = changed_from
+            if timeframe in history:
+                series, touched = history[timeframe], None
+            if touched is None:
+                fresh = resample(self.base, timeframe_ms)
+            else:
+                bucket = touched - touched % timeframe_ms
+                fresh = resample(self.base[int(np.searchsorted(self.base.timestamps, bucket)):], timeframe_ms)
+            if not len(fresh):
+                self.series[timeframe] = series.tail(self.max_candles)
+                if touched is None:
+                    self._touch_closed(timeframe, self.series[timeframe], None)
+                continue
+
+            first = int(fresh.timestamps[0])
+            kept = series[:int(np.searchsorted(series.timestamps, first))]
+            if len(kept) and kept.last_timestamp() + timeframe_ms < first:
+                detached.append(timeframe)
+            self.series[timeframe] = kept.merge(fresh, self.max_candles)
+            self._touch_closed(timeframe, self.series[timeframe], None if touched is None else first)
+        return detached
+
+    # ОИ из тикера — значение формирующихся свечей всех таймфреймов: пишется только в них, без пересчёта корзин.
+    # Одно значение, поэтому запись на месте не даёт читателю увидеть свечу наполовину обновлённой
+    def set_open_interest(self, value: float):
+        if not len(self.base):
+            return
+        self.base.open_interest[-1] = value
+        for series in self.series.values():
+            if len(series):
+                series.open_interest[-1] = value
+
+    def _touch_closed(self, timeframe: str, window: CandleSeries, changed_from):
+        if changed_from is None or (len(window) and changed_from < window.timestamps[-1]):
+            self.closed_versions[timeframe] += 1
+
+    # Принять готовые свечи таймфреймов, посчитанные в другом процессе: храним только окна по max_candles
+    def merge_windows(self, windows: dict):
+        for timeframe, candles in windows.items():
+            if timeframe == self.base_timeframe:
+                self.base = self.base_window = self.base.merge(candles, self.max_candles)
+            elif timeframe in self.series:
+                self.series[timeframe] = self.series[timeframe].merge(candles, self.max_candles)
+            else:
+                continue
+            if len(candles):
+                self._touch_closed(timeframe, self.get(timeframe), int(candles.timestamps[0]))
+
+    # Таймфреймы, свечи которых закрываются вместе с базовой свечой timestamp
+    def closing_timeframes(self, timestamp: int) -> list:
+        end = timestamp + self.base_ms
+        return [timeframe for timeframe in self.timeframes if end % TIMEFRAME_MS[timeframe] == 0]
+
+
+# Сколько базовых свечей хранить и загружать: окно графика и ещё одна корзина самого старшего таймфрейма,
+# чтобы его формирующаяся свеча всегда собиралась из базы целиком
+def history_length(timeframes, max_candles: int) -> int:
+    timeframes = parse_timeframes(timeframes)
+    return max_candles + TIMEFRAME_MS[timeframes[-1]] // TIMEFRAME_MS[timeframes[0]]
+
+
+# Сколько базовых свечей нужно, чтобы собрать max_candles свечей каждого таймфрейма только из базы
+# (плюс одна корзина на неполную первую): так история старших таймфреймов получается без биржи (реплей, бенчмарки)
+def resample_length(timeframes, max_candles: int) -> int:
+    timeframes = parse_timeframes(timeframes)
+    ratio = TIMEFRAME_MS[timeframes[-1]] // TIMEFRAME_MS[timeframes[0]]
+    return (max_candles + 1) * ratio
+
+
+# История старших таймфреймов, собранная из длинной базовой серии
+def resample_history(base: CandleSeries, timeframes, max_candles: int) -> dict:
+    return {timeframe: resample(base, TIMEFRAME_MS[timeframe]).tail(max_candles)
+            for timeframe in parse_timeframes(timeframes)[1:]}
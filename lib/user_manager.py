@@ -1,57 +1,101 @@
 import logging
+import threading
 import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from telegram import Update, Chat
 from lib.models import User, ChatGroup
 
 
+# Изменения профилей и last_seen копятся в памяти и записываются в БД пачкой (flush),
+# чтобы обработчики сообщений не ждали коммита в БД
 class UserManager:
-    def __init__(self, session_maker):
-        self.Session = session_maker
+    # last_seen без других изменений профиля записывается не чаще раза в LAST_SEEN_RESOLUTION секунд
+    LAST_SEEN_RESOLUTION = 60
+
+    def __init__(self, async_session_maker):
+        self.AsyncSession = async_session_maker
         self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.pending_users = {}
+        self.pending_chats = {}
+        # Последнее записанное состояние: id -> (профиль, last_seen) для пользователей, id -> название для чатов
+        self.saved_users = {}
+        self.saved_chats = {}
 
     def update_user_info(self, update: Update) -> None:
         now = int(time.time())
         chat = update.effective_chat
         is_group = (chat.type == Chat.GROUP or chat.type == Chat.SUPERGROUP)
 
-        session = self.Session()
-
-        try:
+        with self.lock:
             if is_group:
-                self.logger.info(f"Updating chat info for {chat.title} ({chat.id})")
-                chat_group = session.get(ChatGroup, chat.id)
-                if chat_group:
-                    chat_group.title = chat.title
-                else:
-                    chat_group = ChatGroup(id=chat.id, title=chat.title)
-                    session.add(chat_group)
+                if self.saved_chats.get(chat.id) != chat.title:
+                    self.pending_chats[chat.id] = chat.title
             else:
                 user = update.effective_user
-                self.logger.info(f"Updating user info for {user.first_name} {user.last_name} ({user.id})")
-                db_user = session.get(User, user.id)
-                if db_user:
-                    db_user.first_name = user.first_name
-                    db_user.last_name = user.last_name
-                    db_user.nickname = user.username
-                    db_user.is_premium = user.is_premium
-                    db_user.last_seen = now
-                else:
-                    db_user = User(id=user.id, first_name=user.first_name, last_name=user.last_name,
-                                   nickname=user.username, is_premium=user.is_premium, last_seen=now)
-                    session.add(db_user)
-
-            session.commit()
-        finally:
-            session.close()
-
-    def get_registered_users(self) -> str:
-        session = self.Session()
+                profile = (user.first_name, user.last_name, user.username, user.is_premium)
+                saved = self.saved_users.get(user.id)
+                if saved is None or saved[0] != profile or now - saved[1] >= self.LAST_SEEN_RESOLUTION:
+                    self.pending_users[user.id] = (profile, now)
+
+    # Записать накопленные изменения одной транзакцией; при ошибке они вернутся в очередь
+    async def flush(self) -> None:
+        with self.lock:
+            users, self.pending_users = self.pending_users, {}
+            chats, self.pending_chats = self.pending_chats, {}
+        if not users and not chats:
+            return
+
         try:
-            users = session.query(User).all()
-            message = f"Зарегистрированные пользователи:\n"
-            for user in users:
-                premium_str = " ✅" if user.is_premium else ''
-                message += f"{user.first_name} {user.last_name} (@{user.nickname}){premium_str}\n"
-            return message
-        finally:
-            session.close()
+            async with self.AsyncSession() as session:
+                if chats:
+                    rows = [{'id': chat_id, 'title': title} for chat_id, title in chats.items()]
+                    await self._upsert(session, ChatGroup, rows, ['title'])
+                if users:
+                    rows = [{'id': user_id, 'first_name': profile[0], 'last_name': profile[1], 'nickname': profile[2],
+                             'is_premium': profile[3], 'last_seen': last_seen}
+                            for user_id, (profile, last_seen) in users.items()]
+                    await self._upsert(session, User, rows,
+                                       ['first_name', 'last_name', 'nickname', 'is_premium', 'last_seen'])
+                await session.commit()
+        except Exception as e:
+            self.logger.error(f"Error saving user activity ({len(users)} users, {len(chats)} chats): {str(e)}")
+            with self.lock:
+                # Более свежие изменения, пришедшие во время записи, важнее возвращаемых
+                self.pending_users = {**users, **self.pending_users}
+                self.pending_chats = {**chats, **self.pending_chats}
+            return
+
+        with self.lock:
+            self.saved_users.update(users)
+            self.saved_chats.update(chats)
+        self.logger.debug(f"Saved activity of {len(users)} users and {len(chats)} chats")
+
+    # INSERT ... ON DUPLICATE KEY UPDATE (MySQL) или ON CONFLICT DO UPDATE (SQLite) одним запросом
+    async def _upsert(self, session, model, rows: list, update_columns: list) -> None:
+        dialect = session.bind.dialect.name
+        if dialect == 'mysql':
+            statement = mysql_insert(model).values(rows)
+            statement = statement.on_duplicate_key_update(
+                {column: statement.inserted[column] for column in update_columns})
+        elif dialect == 'sqlite':
+            statement = sqlite_insert(model).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=['id'], set_={column: statement.excluded[column] for column in update_columns})
+        else:
+            for row in rows:
+                await session.merge(model(**row))
+            return
+        await session.execute(statement)
+
+    async def get_registered_users(self) -> str:
+        async with self.AsyncSession() as session:
+            users = (await session.scalars(select(User))).all()
+        message = f"Зарегистрированные пользователи:\n"
+        for user in users:
+            premium_str = " ✅" if user.is_premium else ''
+            message += f"{user.first_name} {user.last_name} (@{user.nickname}){premium_str}\n"
+        return message
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+# Реплей истории через анализ и уведомления с симулированными часами, без Telegram и биржи:
+#   ./replay.py --cache-dir cache --symbols BTCUSDT,ETHUSDT     — записанные свечи из кэша бота
+#   ./replay.py --generate 20 --candles 5000                      — сгенерированная история
+import argparse
+import json
+import logging
+import sys
+
+from lib.replay import ReplayEngine, load_recorded_history
+from lib.timeframes import parse_timeframes, resample_length
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Replay candle history through IzzyMoonbow alert logic')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--cache-dir', help='replay candles recorded in the bot candle cache (CACHE_DIR)')
+    source.add_argument('--generate', type=int, metavar='SYMBOLS', help='replay generated history for N symbols')
+    parser.add_argument('--symbols', help='comma-separated symbols to replay from the cache (default: all)')
+    parser.add_argument('--candles', type=int, default=5000, help='generated candles per symbol, after warm-up')
+    parser.add_argument('--gap-density', type=float, default=0.05, help='share of impulse candles in generated history')
+    parser.add_argument('--timeframes', default='15m,4h')
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=3600, help='notification timeout of replay users, s')
+    parser.add_argument('--fvg-threshold', type=float, default=0.0, help='minimum FVG size, %% of price')
+    parser.add_argument('--check-every', type=int, default=1, help='run the notification check every N candles')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('lib').setLevel(logging.ERROR)
+
+    timeframes = parse_timeframes(args.timeframes)
+    base_timeframe = timeframes[0]
+    if args.cache_dir:
+        symbols = [symbol.strip() for symbol in args.symbols.split(',')] if args.symbols else None
+        history = load_recorded_history(args.cache_dir, symbols, base_timeframe)
+    else:
+        from benchmarks.generators import generate_universe
+        warmup = resample_length(timeframes, 100)
+        history = generate_universe(args.generate, warmup + args.candles, gap_density=args.gap_density,
+                                    timeframe=base_timeframe)
+    if not history:
+        print("No history to replay", file=sys.stderr)
+        return 1
+
+    try:
+        engine = ReplayEngine(history, timeframes, users=args.users, notification_timeout=args.timeout,
+                              fvg_threshold=args.fvg_threshold, check_every=args.check_every)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    report = engine.run()
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+        return 0
+
+    days = (report.end - report.start) / 86400 if report.start is not None else 0.0
+    print(f"Replayed {report.candles} {base_timeframe} candles of {report.symbols} symbols ({days:.1f} days) "
+          f"in {report.wall_time:.2f}s: {report.candles_per_second:,.0f} candles/s")
+    latency = report.latency_stats()
+    if latency:
+        print(f"Decision latency over {latency['checks']} checks: mean {latency['mean'] * 1000:.2f} ms, "
+              f"p50 {latency['p50'] * 1000:.2f} ms, p95 {latency['p95'] * 1000:.2f} ms, "
+              f"max {latency['max'] * 1000:.2f} ms")
+    print(f"{len(report.alerts)} alerts, {report.messages} messages")
+    for symbol, kinds in report.alerts_per_symbol().items():
+        print(f"  {symbol:<20} " + ', '.join(f"{kind} {count}" for kind, count in sorted(kinds.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
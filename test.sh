@@ -1,3 +1,3 @@
 #!/bin/bash
 
-python -m pytest tests/test_fvg_analysis.py
+python -m pytest tests
@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import json
+import logging
+import socket
+import struct
+import threading
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+# Локальный сервер, имитирующий публичный WebSocket Bybit, для офлайн-тестов потокового режима
+class FakeBybitStream:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.server = socket.create_server((host, port))
+        self.host, self.port = self.server.getsockname()[:2]
+        self.clients = []
+        self.subscriptions = set()
+        self.subscribe_requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/v5/public/linear"
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.drop_clients()
+        self.server.close()
+
+    # Разорвать все соединения, как при сбое на стороне биржи
+    def drop_clients(self):
+        with self.lock:
+            clients, self.clients = self.clients, []
+            self.subscriptions = set()
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+                client.close()
+            except OSError:
+                pass
+
+    def publish(self, message: dict):
+        frame = self._frame(json.dumps(message).encode())
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.sendall(frame)
+            except OSError:
+                pass
+
+    def publish_kline(self, symbol: str, interval: str, start: int, open: float, high: float, low: float,
+                      close: float, volume: float = 0.0, confirm: bool = False):
+        self.publish({
+            'topic': f"kline.{interval}.{symbol}",
+            'type': 'snapshot',
+            'data': [{
+                'start': start, 'interval': interval, 'open': str(open), 'high': str(high), 'low': str(low),
+                'close': str(close), 'volume': str(volume), 'turnover': '0', 'confirm': confirm
+            }]
+        })
+
+    def publish_ticker(self, symbol: str, **fields):
+        self.publish({'topic': f"tickers.{symbol}", 'type': 'delta',
+                      'data': {'symbol': symbol, **{key: str(value) for key, value in fields.items()}}})
+
+    def _accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket):
+        try:
+            self._handshake(client)
+            with self.lock:
+                self.clients.append(client)
+                self.connections += 1
+            while True:
+                opcode, payload = self._read_frame(client)
+                if opcode == 0x8:
+                    client.sendall(self._frame(payload[:2], 0x8))
+                    return
+                if opcode == 0x9:
+                    client.sendall(self._frame(payload, 0xA))
+                elif opcode == 0x1:
+                    self._handle_request(client, json.loads(payload))
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                if client in self.clients:
+                    self.clients.remove(client)
+            client.close()
+
+    def _handle_request(self, client: socket.socket, request: dict):
+        op = request.get('op')
+        args = request.get('args', [])
+        with self.lock:
+            if op == 'subscribe':
+                self.subscriptions.update(args)
+                self.subscribe_requests.append(args)
+            elif op == 'unsubscribe':
+                self.subscriptions.difference_update(args)
+        response = {'op': 'pong'} if op == 'ping' else {'success': True, 'ret_msg': '', 'op': op}
+        client.sendall(self._frame(json.dumps(response).encode()))
+
+    @staticmethod
+    def _handshake(client: socket.socket):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = client.recv(4096)
+            if not chunk:
+                raise ConnectionError("Client closed during handshake")
+            request += chunk
+
+        headers = dict(line.split(': ', 1) for line in request.decode().split('\r\n')[1:] if ': ' in line)
+        key = next(value for name, value in headers.items() if name.lower() == 'sec-websocket-key')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        client.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+
+    @staticmethod
+    def _recv_exact(client: socket.socket, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Client disconnected")
+            data += chunk
+        return data
+
+    def _read_frame(self, client: socket.socket):
+        first, second = self._recv_exact(client, 2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._recv_exact(client, 2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._recv_exact(client, 8))[0]
+        mask = self._recv_exact(client, 4) if second & 0x80 else b'\0\0\0\0'
+        payload = self._recv_exact(client, length)
+        return first & 0x0F, bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+    @staticmethod
+    def _frame(payload: bytes, opcode: int = 0x1) -> bytes:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        return header + payload
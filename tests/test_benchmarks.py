@@ -0,0 +1,35 @@
+import numpy as np
+
+from benchmarks.generators import generate_candles, generate_universe
+from benchmarks.runner import Benchmark, compare, measure
+from lib.fvg_detector import detect_series_fvgs
+
+
+def test_generators_are_deterministic_and_control_gap_density():
+    first, second = generate_candles(500, seed=3), generate_candles(500, seed=3)
+    for column in ('timestamps', 'open', 'high', 'low', 'close', 'volume', 'open_interest'):
+        np.testing.assert_array_equal(getattr(first, column), getattr(second, column))
+    assert np.all(first.high >= np.maximum(first.open, first.close))
+    assert np.all(first.low <= np.minimum(first.open, first.close))
+
+    sparse = len(detect_series_fvgs(generate_candles(2000, gap_density=0.0)))
+    dense = len(detect_series_fvgs(generate_candles(2000, gap_density=0.2)))
+    assert dense > 2 * sparse
+
+    # История символа не зависит от размера набора
+    small, large = generate_universe(2, 100), generate_universe(10, 100)
+    np.testing.assert_array_equal(small['SYM0001USDT'].close, large['SYM0001USDT'].close)
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {'a': {'min': 1.0}, 'b': {'min': 1.0}, 'c': {'min': 1.0}}}
+    current = {'results': {'a': {'min': 1.1}, 'b': {'min': 1.5}, 'c': {'min': 0.5}, 'd': {'min': 1.0}}}
+    statuses = {key: status for key, _, _, _, status in compare(current, baseline, tolerance=0.25)}
+    assert statuses == {'a': 'ok', 'b': 'regression', 'c': 'faster', 'd': 'new'}
+
+
+def test_measure_runs_teardown():
+    closed = []
+    benchmark = Benchmark('noop', {}, lambda: (lambda: None, lambda: closed.append(True)))
+    result = measure(benchmark, repeat=2, min_time=0.001)
+    assert result['repeat'] == 2 and closed == [True]
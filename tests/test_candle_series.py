@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from lib.candle_series import CandleSeries
+from lib.kline_parser import build_candle_series
+
+
+def make_dataframe():
+    index = pd.date_range('2023-01-01', periods=4, freq='15min', name='timestamp')
+    return pd.DataFrame({
+        'open': [100, 106, 114, 117],
+        'high': [110, 115, 120, 122],
+        'low': [90, 102, 108, 109],
+        'close': [105, 112, 118, 120],
+        'volume': [1, 2, 3, 4],
+        'open_interest': [10, 11, 12, 13],
+    }, index=index)
+
+
+def test_series_from_dataframe():
+    series = CandleSeries.from_dataframe(make_dataframe())
+    assert len(series) == 4
+    assert series.timestamps.dtype == np.int64
+    assert series[0].timestamp == pd.Timestamp('2023-01-01')
+    assert series[-1].close == 120
+    assert series[2].open_interest == 12
+    assert series[1].prev.high == 110
+    assert series[1].next.low == 108
+    assert series[0].prev is None
+    assert series[-1].next is None
+
+
+def test_series_slice_and_roundtrip():
+    series = CandleSeries.from_dataframe(make_dataframe())
+    tail = series.tail(2)
+    assert len(tail) == 2
+    assert tail[0].open == 114
+    assert tail[0].prev is None
+    assert series.to_dataframe().equals(make_dataframe().astype(float))
+
+
+def test_empty_dataframe():
+    series = CandleSeries.from_dataframe(pd.DataFrame())
+    assert len(series) == 0
+    assert series.last_timestamp() is None
+
+
+def test_merge_replaces_overlap_and_keeps_open_interest():
+    series = CandleSeries.from_dataframe(make_dataframe())
+    newer = CandleSeries.from_dataframe(make_dataframe().iloc[3:])
+    newer.close[0] = 121
+    newer.open_interest[0] = np.nan
+    later = CandleSeries(newer.timestamps + 900_000, newer.open, newer.high, newer.low, newer.close)
+
+    merged = series.merge(newer).merge(later, max_length=4)
+    assert len(merged) == 4
+    assert merged[-2].close == 121
+    assert merged[-2].open_interest == 13
+    assert merged[-1].open_interest is None
+    assert merged[0].open == 106
+
+
+def test_open_interest_alignment_policies():
+    klines = [[str(ts), '1', '2', '0.5', '1.5', '10', '15'] for ts in (3000, 2000, 1000)]
+    open_interest = [{'openInterest': '7', 'timestamp': '1000'}, {'openInterest': '9', 'timestamp': '2500'}]
+
+    series, report = build_candle_series(klines, open_interest, 'exact')
+    assert list(series.timestamps) == [1000, 2000, 3000]
+    assert series[0].open_interest == 7 and series[1].open_interest is None and series[2].open_interest is None
+    assert (report.matched, report.missing, report.unmatched_oi) == (1, 2, 1)
+
+    series, report = build_candle_series(klines, open_interest, 'asof')
+    assert list(series.open_interest) == [7, 7, 9]
+    assert (report.matched, report.filled, report.missing) == (1, 2, 0)
+
+    series, report = build_candle_series(klines, open_interest, 'drop')
+    assert list(series.timestamps) == [1000]
+    assert report.dropped == 2
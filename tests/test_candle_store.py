@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import numpy as np
+from lib.candle_series import CandleSeries
+from lib.candle_store import CandleStore
+from lib.market import Market
+from lib.timeframes import resample_history
+
+INTERVAL = 900_000
+
+
+def make_series(start, count, close=100.0):
+    timestamps = (np.arange(count, dtype=np.int64) + start) * INTERVAL
+    prices = np.full(count, close)
+    return CandleSeries(timestamps, prices, prices + 1, prices - 1, prices, np.ones(count), np.arange(count) + 0.5)
+
+
+def test_store_appends_and_replaces_forming_candle(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.write('BTCUSDT', '15m', make_series(0, 10))
+    store.write('BTCUSDT', '15m', make_series(9, 3, close=105.0), INTERVAL)
+
+    loaded = store.load('BTCUSDT', '15m')
+    assert len(loaded) == 12
+    assert list(loaded.timestamps) == list(np.arange(12) * INTERVAL)
+    assert loaded[8].close == 100 and loaded[9].close == 105
+    assert len(store.load('BTCUSDT', '15m', 5)) == 5
+
+
+def test_store_resets_on_gap_and_compacts(tmp_path):
+    store = CandleStore(str(tmp_path), max_records=20)
+    store.write('BTCUSDT', '15m', make_series(0, 10))
+    store.write('BTCUSDT', '15m', make_series(50, 5), INTERVAL)
+    assert list(store.load('BTCUSDT', '15m').timestamps) == list((np.arange(5) + 50) * INTERVAL)
+
+    store.write('BTCUSDT', '15m', make_series(55, 30), INTERVAL)
+    loaded = store.load('BTCUSDT', '15m')
+    assert len(loaded) == 10
+    assert loaded.last_timestamp() == 84 * INTERVAL
+
+
+def test_store_tolerates_torn_write(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.write('BTCUSDT', '15m', make_series(0, 10))
+    with open(tmp_path / 'BTCUSDT' / '15m' / 'close', 'r+b') as f:
+        f.truncate(8 * 7)
+    assert len(store.load('BTCUSDT', '15m')) == 7
+
+
+def test_market_restores_higher_timeframe_history(tmp_path):
+    exchange = SimpleNamespace(candle_store=CandleStore(str(tmp_path)), candle_store_executor=None,
+                               timeframes=('15m', '4h'))
+    base = make_series(0, 2000)
+    base.close[:] = np.arange(2000.0)
+    market = Market(exchange, 'BTCUSDT')
+    market.update_from_data({'15m': base, **resample_history(base, exchange.timeframes, 100)})
+    market.update_from_data({'15m': base[-2:], 'delta': {'15m': True}})
+
+    # После перезапуска история 4h берётся из кэша, а не собирается из короткой базовой серии
+    restored = Market(exchange, 'BTCUSDT')
+    last_timestamps = restored.load_from_store()
+    assert last_timestamps == {'15m': base.last_timestamp(), '4h': market.get_candles('4h').last_timestamp()}
+    assert len(restored.get_candles('4h')) == 100
+    np.testing.assert_array_equal(restored.get_candles('4h').close, market.get_candles('4h').close)
+
+
+class DeferredExecutor:
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, function, *args):
+        self.tasks.append((function, args))
+
+    def run(self):
+        for function, args in self.tasks:
+            function(*args)
+        self.tasks = []
+
+
+def test_market_hands_cache_writes_to_the_executor(tmp_path):
+    executor = DeferredExecutor()
+    exchange = SimpleNamespace(candle_store=CandleStore(str(tmp_path)), candle_store_executor=executor,
+                               timeframes=('15m', '4h'))
+    base = make_series(0, 2000)
+    market = Market(exchange, 'BTCUSDT')
+    market.update_from_data({'15m': base, **resample_history(base, exchange.timeframes, 100)})
+    assert market.apply_candle('15m', 2000 * INTERVAL, 100, 101, 99, 100, 1)
+
+    # Под блокировкой рынка файлы не пишутся: записи ждут потока кэша
+    assert executor.tasks and not (tmp_path / 'BTCUSDT').exists()
+    executor.run()
+    assert exchange.candle_store.load('BTCUSDT', '15m').last_timestamp() == 2000 * INTERVAL
+    assert exchange.candle_store.load('BTCUSDT', '4h').last_timestamp() == market.get_candles('4h').last_timestamp()
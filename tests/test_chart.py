@@ -0,0 +1,33 @@
+from io import BytesIO
+
+import matplotlib
+import numpy as np
+from PIL import Image
+from lib.candle_series import CandleSeries
+from lib.chart import render_chart
+
+matplotlib.use('Agg')
+
+
+def make_payload(seed, size=60):
+    rng = np.random.default_rng(seed)
+    close = np.cumsum(rng.normal(size=size)) + 100
+    open_ = close + rng.normal(size=size)
+    high = np.maximum(open_, close) + rng.random(size)
+    low = np.minimum(open_, close) - rng.random(size)
+    candles = CandleSeries(np.arange(size, dtype=np.int64) * 900_000 + 1_700_000_000_000 + seed * 86_400_000,
+                           open_, high, low, close, np.ones(size), np.cumsum(rng.random(size)))
+    return {'candles': candles, 'title': f'BTCUSDT - 15m #{seed}', 'ranges': [(close[5], close[6], 'green', 0.1)],
+            'price_ranges': (low.min() + 1, high.max() - 1) if seed % 2 else None}
+
+
+def decode(data):
+    return np.asarray(Image.open(BytesIO(data)).convert('RGB'))
+
+
+def test_template_render_matches_full_render():
+    # Шаблон переиспользуется между графиками: наложения предыдущего не должны оставаться на следующем
+    for seed in range(3):
+        payload = make_payload(seed)
+        expected = decode(render_chart(payload, use_template=False))
+        assert np.array_equal(decode(render_chart(payload)), expected)
@@ -0,0 +1,30 @@
+import asyncio
+
+from lib.chart_cache import ChartCache
+
+
+def test_concurrent_requests_render_once():
+    cache = ChartCache(max_entries=2)
+    renders = []
+
+    async def render():
+        renders.append(1)
+        await asyncio.sleep(0.01)
+        return b'png'
+
+    async def scenario():
+        key = ('BTCUSDT', '15m', 1, 'plain')
+        results = await asyncio.gather(*[cache.get_or_render(key, render) for _ in range(10)])
+        assert results == [b'png'] * 10
+        await cache.get_or_render(key, render)
+        assert len(renders) == 1
+
+        cache.invalidate('BTCUSDT', '15m')
+        await cache.get_or_render(key, render)
+        assert len(renders) == 2
+
+        for last_timestamp in (2, 3):
+            await cache.get_or_render(('BTCUSDT', '15m', last_timestamp, 'plain'), render)
+        assert len(cache.entries) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+
+from telegram.error import Forbidden
+
+from lib.chart_cache import ChartCache
+from lib.chart_delivery import ChartDelivery
+
+
+class StaticCharts:
+    def __init__(self):
+        self.chart_file_ids = ChartCache()
+        self.last_timestamp = 1
+        self.renders = 0
+
+    def get_chart_key(self, symbol, timeframe, overlay='plain'):
+        return symbol, timeframe, self.last_timestamp, overlay
+
+    async def get_chart_bytes(self, symbol, timeframe, overlay='plain'):
+        self.renders += 1
+        return b'png'
+
+
+class Photo:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class Message:
+    def __init__(self, file_id):
+        self.photo = [Photo(file_id + '-thumb'), Photo(file_id)]
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        await asyncio.sleep(0.01)
+        self.sent.append((chat_id, photo))
+        return Message(f'file-{len(self.sent)}')
+
+
+def test_chart_is_uploaded_once_per_content_key():
+    charts = StaticCharts()
+    delivery = ChartDelivery(charts)
+    bot = RecordingBot()
+
+    async def scenario():
+        await asyncio.gather(*[delivery.send_chart(bot, chat_id, 'BTCUSDT', '15m') for chat_id in range(10)])
+        # Новая свеча — новый ключ, график загружается заново
+        charts.last_timestamp = 2
+        await delivery.send_chart(bot, 100, 'BTCUSDT', '15m')
+        await delivery.send_chart(bot, 101, 'BTCUSDT', '15m')
+
+    asyncio.run(scenario())
+    uploads = [photo for _, photo in bot.sent if isinstance(photo, bytes)]
+    assert len(uploads) == 2 and charts.renders == 2
+    assert delivery.uploaded == 2 and delivery.reused == 10
+    assert bot.sent[-1] == (101, 'file-11')
+
+
+class BlockedChatBot(RecordingBot):
+    async def send_photo(self, chat_id, photo, caption=None):
+        if chat_id == 0:
+            await asyncio.sleep(0.01)
+            raise Forbidden('bot was blocked by the user')
+        return await super().send_photo(chat_id, photo, caption)
+
+
+def test_failed_upload_is_retried_by_one_waiter():
+    charts = StaticCharts()
+    delivery = ChartDelivery(charts)
+    bot = BlockedChatBot()
+
+    async def scenario():
+        return await asyncio.gather(*[delivery.send_chart(bot, chat_id, 'BTCUSDT', '15m') for chat_id in range(10)],
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[0], Forbidden) and results[1:] == [True] * 9
+    uploads = [chat_id for chat_id, photo in bot.sent if isinstance(photo, bytes)]
+    assert len(uploads) == 1 and charts.renders == 2
+    assert delivery.uploaded == 1 and delivery.reused == 8
@@ -0,0 +1,98 @@
+import random
+import time
+
+import pytest
+from pybit.exceptions import InvalidRequestError
+
+from lib.exchange import Exchange
+
+END = 1_704_067_200_000
+STEP = 900_000
+
+
+class StaticSymbols:
+    def __init__(self, symbols=()):
+        self.symbols = list(symbols)
+
+    def get_symbols(self):
+        return list(self.symbols)
+
+    def subscribe(self, listener):
+        pass
+
+
+# Сессия Bybit без сети: цены зависят от символа, ответы приходят в случайном порядке
+class FakeSession:
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+    def get_kline(self, symbol, limit, **params):
+        time.sleep(random.uniform(0, 0.01))
+        price = str(self.symbols.index(symbol) + 1)
+        return {'result': {'list': [[str(END - STEP * i), price, price, price, price, '1', '1']
+                                    for i in range(limit)]}}
+
+    def get_open_interest(self, symbol, limit, **params):
+        time.sleep(random.uniform(0, 0.01))
+        return {'result': {'list': [{'timestamp': str(END - STEP * i), 'openInterest': '5'} for i in range(limit)]}}
+
+
+def rate_limited(*args, **kwargs):
+    raise InvalidRequestError('GET /v5/market/kline', 'Too many visits', 10006, 0, {})
+
+
+@pytest.fixture
+def exchange():
+    exchange = Exchange(StaticSymbols(), None, None)
+    delays = exchange.delays = []
+    exchange.sleep = delays.append
+    yield exchange
+    exchange.stop()
+
+
+def test_rate_limited_request_backs_off_and_gives_up(exchange):
+    calls = []
+
+    def method(**params):
+        calls.append(params)
+        rate_limited()
+
+    with pytest.raises(InvalidRequestError):
+        exchange._request('kline', method, symbol='BTCUSDT')
+    assert len(calls) == exchange.MAX_RETRIES + 1
+    assert len(exchange.delays) == exchange.MAX_RETRIES
+    for attempt, delay in enumerate(exchange.delays):
+        assert 0 <= delay <= min(exchange.RETRY_MAX_DELAY, exchange.RETRY_BASE_DELAY * 2 ** attempt)
+    assert exchange.fetch_stats['retries'] == exchange.MAX_RETRIES and exchange.fetch_stats['failures'] == 1
+
+
+def test_request_succeeds_after_retry_and_does_not_retry_client_errors(exchange):
+    responses = iter([rate_limited, lambda **params: {'result': {'list': []}}])
+    assert exchange._request('kline', lambda **params: next(responses)(**params)) == {'result': {'list': []}}
+    assert len(exchange.delays) == 1
+
+    def invalid_symbol(**params):
+        raise InvalidRequestError('GET /v5/market/kline', 'Symbol invalid', 10001, 0, {})
+
+    with pytest.raises(InvalidRequestError):
+        exchange._request('kline', invalid_symbol)
+    assert len(exchange.delays) == 1
+
+
+def test_concurrent_fetch_keeps_results_per_symbol(exchange):
+    symbols = [f"SYM{index}USDT" for index in range(20)]
+    exchange.session = FakeSession(symbols)
+    exchange.history_length = 50
+
+    market_data = exchange.fetch_markets(symbols)
+    assert sorted(market_data) == sorted(symbols)
+    for index, symbol in enumerate(symbols):
+        candles = market_data[symbol]['15m']
+        assert len(candles) == 50 and set(candles.close) == {index + 1}
+        assert len(market_data[symbol]['4h']) == exchange.max_candles
+    # История 4h загружается один раз (свечи и ОИ), дальше только базовый таймфрейм
+    assert exchange.last_fetch_stats['requests'] == 4 * len(symbols)
+
+    market_data = exchange.fetch_markets(symbols)
+    assert all('4h' not in data for data in market_data.values())
+    assert exchange.last_fetch_stats['requests'] == 2 * len(symbols)
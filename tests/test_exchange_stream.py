@@ -0,0 +1,138 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from lib.candle_series import CandleSeries
+from lib.exchange import Exchange
+from lib.market import Market
+from fake_stream import FakeBybitStream
+
+START = pd.Timestamp('2024-01-01')
+
+
+class StaticSymbols:
+    def get_symbols(self):
+        return ['BTCUSDT']
+
+    def subscribe(self, listener):
+        pass
+
+
+# limit синтетических свечей, заканчивающихся на START
+def synthetic_candles(interval_ms, limit):
+    step = pd.Timedelta(milliseconds=interval_ms)
+    index = pd.DatetimeIndex([START - step * i for i in range(limit - 1, -1, -1)], name='timestamp')
+    prices = np.linspace(100, 110, limit)
+    return CandleSeries(index.values.astype('datetime64[ms]').astype(np.int64), prices, prices + 1, prices - 1,
+                        prices, np.ones(limit), np.full(limit, 5.0))
+
+
+class OfflineExchange(Exchange):
+    # REST-догрузка без сети
+    def get_kline(self, symbol, interval, limit, start=None):
+        return synthetic_candles(self.INTERVAL_MS[interval], limit)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def stream():
+    server = FakeBybitStream().start()
+    exchange = OfflineExchange(StaticSymbols(), None, None, ingestion_mode='stream', stream_url=server.url)
+    exchange.stream.reconnect_delay = 0.1
+    yield server, exchange
+    exchange.stop()
+    server.stop()
+
+
+def test_stream_updates_market_in_place(stream):
+    server, exchange = stream
+    assert wait_for(lambda: exchange.get_market('BTCUSDT') is not None)
+    assert 'kline.15.BTCUSDT' in server.subscriptions and 'tickers.BTCUSDT' in server.subscriptions
+
+    closed = []
+    exchange.subscribe_candle_close(lambda symbol, timeframe: closed.append((symbol, timeframe)))
+    last = int(START.value // 1_000_000)
+    server.publish_kline('BTCUSDT', '15', last, 110, 115, 109, 114, confirm=True)
+    server.publish_kline('BTCUSDT', '15', last + 900_000, 114, 116, 113, 115)
+    server.publish_ticker('BTCUSDT', markPrice=115.5, openInterest=7)
+
+    market = exchange.get_market('BTCUSDT')
+    assert wait_for(lambda: market.get_mark_price() == 115.5)
+    candles = market.get_candles('15m')
+    assert len(candles) == 100
+    assert candles[-2].close == 114 and candles[-1].close == 115
+    assert candles[-1].open_interest == 7
+    assert closed == [('BTCUSDT', '15m')]
+    # Таблица статусов между проверками уведомлений пересчитывается по новым свечам
+    assert exchange.get_status_table().get_thresholds('BTCUSDT', '15m') == \
+        pytest.approx(market.get_price_thresholds('15m'))
+
+    # Формирующаяся свеча 4h собрана из базовых и видит их последние значения
+    candles_4h = market.get_candles('4h')
+    assert len(candles_4h) == 100
+    assert candles_4h.timestamps[-1] == last + 900_000 - (last + 900_000) % (4 * 3600 * 1000)
+    assert candles_4h[-1].close == 115 and candles_4h[-1].open_interest == 7
+
+
+def test_stream_resubscribes_after_disconnect(stream):
+    server, exchange = stream
+    assert wait_for(lambda: server.connections == 1 and server.subscriptions)
+    server.drop_clients()
+    assert wait_for(lambda: server.connections == 2 and 'tickers.BTCUSDT' in server.subscriptions)
+    # Старшие таймфреймы собираются из базовых свечей, отдельной подписки на них нет
+    assert 'kline.15.BTCUSDT' in server.subscriptions and 'kline.240.BTCUSDT' not in server.subscriptions
+
+
+def test_gap_backfill_is_not_repeated_while_in_flight(stream):
+    server, exchange = stream
+    assert wait_for(lambda: exchange.get_market('BTCUSDT') is not None and not exchange.backfilling)
+
+    release = threading.Event()
+    fetched = []
+
+    def fetch_markets(symbols):
+        fetched.append(list(symbols))
+        release.wait(5)
+        return {}
+
+    exchange.fetch_markets = fetch_markets
+    # Свечи после дыры в данных: каждое сообщение не применяется и требует догрузки
+    gap = int(START.value // 1_000_000) + 10 * 900_000
+    for i in range(5):
+        server.publish_kline('BTCUSDT', '15', gap + i * 900_000, 110, 115, 109, 114)
+    assert wait_for(lambda: fetched)
+    time.sleep(0.2)
+    assert fetched == [['BTCUSDT']]
+
+    release.set()
+    assert wait_for(lambda: not exchange.backfilling)
+    server.publish_kline('BTCUSDT', '15', gap + 10 * 900_000, 110, 115, 109, 114)
+    assert wait_for(lambda: len(fetched) == 2)
+
+
+def test_stream_updates_replace_candles_instead_of_writing_in_place():
+    last = int(START.value // 1_000_000)
+    market = Market(None, 'BTCUSDT')
+    market.update_from_data({'15m': synthetic_candles(900_000, 116), '4h': synthetic_candles(4 * 3_600_000, 100)})
+    window = market.get_candles('15m')
+
+    # Окно, уже отданное на рендер, не меняется: обновлённая свеча приходит в новой серии
+    assert market.apply_candle('15m', last, 110, 120, 100, 118, 2)
+    assert window[-1].close == 110 and market.get_candles('15m')[-1].close == 118
+    assert market.get_candles('4h')[-1].high == 120
+
+    # ОИ из тикера попадает в формирующиеся свечи без пересборки старших таймфреймов
+    window_4h = market.get_candles('4h')
+    market.apply_ticker(open_interest=9)
+    assert market.get_candles('4h') is window_4h
+    assert window_4h[-1].open_interest == 9 and market.get_candles('15m')[-1].open_interest == 9
@@ -1,7 +1,11 @@
+import numpy as np
 import pandas as pd
 import pytest
 from lib.candle import Candle
+from lib.candle_series import CandleSeries
 from lib.fvg import FVG
+from lib.fvg_detector import detect_series_fvgs, detect_batch_fvgs
+from lib.fvg_tracker import FVGTracker, FVGCreated, FVGFilled
 
 
 def test_candle_creation():
@@ -33,6 +37,69 @@ def test_fvg_detection():
     assert fvg.is_bullish == True
 
 
+
+def make_random_series(seed, size=300):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 2, size))
+    open_ = close + rng.normal(0, 1.5, size)
+    high = np.maximum(open_, close) + rng.random(size)
+    low = np.minimum(open_, close) - rng.random(size)
+    timestamps = np.arange(size, dtype=np.int64) * 900_000
+    return CandleSeries(timestamps, open_, high, low, close)
+
+
+def test_vectorized_fvgs_match_candle_scan():
+    series = make_random_series(42)
+    expected = [fvg for candle in series if (fvg := candle.get_fvg(0.5)) is not None]
+    gaps = detect_series_fvgs(series, 0.5)
+
+    assert len(gaps) == len(expected) > 0
+    for gap, fvg in zip(gaps, expected):
+        assert gap['index'] == fvg.parent_candle.index
+        assert gap['bullish'] == fvg.is_bullish()
+        assert gap['start_price'] == fvg.start_price
+        assert gap['end_price'] == fvg.end_price
+        assert gap['covered_size'] == fvg.get_covered_size()
+        assert gap['lower_bound'] == fvg.get_lower_bound()
+        assert gap['upper_bound'] == fvg.get_upper_bound()
+
+    uncovered = detect_series_fvgs(series, 0.5, max_covered_percent=90)
+    assert len(uncovered) == sum(not fvg.is_covered() for fvg in expected)
+
+
+def test_batch_fvgs_match_single_series():
+    series_list = [make_random_series(seed, size) for seed, size in ((1, 200), (2, 50), (3, 120))]
+    batch = detect_batch_fvgs(series_list, 0.5)
+    for row, series in enumerate(series_list):
+        single = detect_series_fvgs(series, 0.5)
+        rows = batch[batch['row'] == row]
+        assert np.array_equal(rows['index'], single['index'])
+        assert np.array_equal(rows['covered_size'], single['covered_size'])
+
+
+
+def test_tracker_matches_full_rescan():
+    series = make_random_series(7, 400)
+    tracker = FVGTracker('TEST', '15m', min_gap_percent=0.5)
+    events = []
+    tracker.subscribe(events.append)
+
+    tracker.update(series[:100])
+    seeded = len(tracker.open_fvgs)
+    for end in range(101, len(series) + 1):
+        tracker.update(series[:end])
+
+    # Трекер учитывает только закрытые свечи, поэтому сравниваем с полным пересчётом без последней
+    expected = detect_series_fvgs(series[:-1], 0.5, max_covered_percent=90)
+    assert [fvg.parent_candle.timestamp_ms for fvg in tracker.open_fvgs] == list(series.timestamps[expected['index']])
+    assert [fvg.get_covered_size() for fvg in tracker.open_fvgs] == list(expected['covered_size'])
+
+    created = sum(isinstance(event, FVGCreated) for event in events)
+    filled = sum(isinstance(event, FVGFilled) for event in events)
+    assert created > 0 and filled > 0
+    assert seeded + created - filled == len(tracker.open_fvgs)
+
+
 """
 def test_fvg_coverage():
     candle1 = Candle(pd.Series({'open': 100, 'high': 110, 'low': 90, 'close': 105}, name=pd.Timestamp('2023-01-01')))
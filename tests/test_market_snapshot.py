@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from lib.candle_series import CandleSeries
+from lib.market_snapshot import MarketSnapshotReader, MarketSnapshotUnavailable, MarketSnapshotWriter
+from lib.screener import StatusTable
+
+
+class StubFVG:
+    def __init__(self, lower, upper, bullish):
+        self.lower, self.upper, self.bullish = lower, upper, bullish
+
+    def get_lower_bound(self):
+        return self.lower
+
+    def get_upper_bound(self):
+        return self.upper
+
+    def is_bullish(self):
+        return self.bullish
+
+
+class StubMarket:
+    def __init__(self, symbol, price, count=10):
+        self.symbol = symbol
+        self.mark_price = price
+        close = np.linspace(price - 10, price, count)
+        self.candles = CandleSeries(np.arange(count) * 900_000, close, close + 1, close - 1, close,
+                                    np.ones(count), None)
+
+    def get_candles(self, timeframe):
+        return self.candles
+
+    def is_price_in_extreme_range(self, timeframe):
+        return 'high'
+
+    def get_price_thresholds(self, timeframe):
+        return self.mark_price - 5, self.mark_price - 1
+
+    def get_open_fvgs(self, timeframe):
+        return [StubFVG(self.mark_price - 3, self.mark_price - 2, True)]
+
+    def get_mark_price(self):
+        return self.mark_price
+
+
+class StubExchange:
+    def __init__(self, markets):
+        self.markets = {market.symbol: market for market in markets}
+        self.market_data_lock = threading.Lock()
+        self.status_table = StatusTable.empty(('15m', '4h'))
+
+    def get_status_table(self):
+        return self.status_table
+
+
+@pytest.fixture
+def snapshot_name():
+    return f"izzy_test_{os.getpid()}"
+
+
+def test_reader_sees_published_markets(snapshot_name):
+    writer = MarketSnapshotWriter(snapshot_name, max_symbols=4, candles=5)
+    reader = MarketSnapshotReader(snapshot_name)
+    try:
+        writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0), StubMarket('ETHUSDT', 50.0)]))
+
+        market = reader.get_market('ETHUSDT')
+        assert market['mark_price'] == 50.0 and market['version'] == 1
+        timeframe = market['timeframes']['4h']
+        assert timeframe['status'] == 'high'
+        assert (timeframe['low_threshold'], timeframe['high_threshold']) == (45.0, 49.0)
+        assert timeframe['candles']['close'][-1] == 50.0 and len(timeframe['candles']['close']) == 5
+        assert timeframe['candles']['open_interest'] == [None] * 5
+        assert timeframe['open_fvgs'] == [{'lower': 47.0, 'upper': 48.0, 'bullish': True}]
+        assert reader.get_market('SOLUSDT') is None
+        assert reader.get_mark_prices() == {'BTCUSDT': 100.0, 'ETHUSDT': 50.0}
+
+        # Символ пропал с биржи — после следующей публикации его нет и в снимке
+        writer.publish(StubExchange([StubMarket('BTCUSDT', 101.0)]))
+        assert reader.get_mark_prices() == {'BTCUSDT': 101.0}
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_retries_while_writer_is_mid_update(snapshot_name):
+    writer = MarketSnapshotWriter(snapshot_name, max_symbols=4, candles=5)
+    reader = MarketSnapshotReader(snapshot_name)
+    try:
+        writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0)]))
+        attempts = []
+
+        # Первая попытка чтения пересекается с записью: seq меняется, и читатель должен перечитать
+        def read_prices(header, arrays):
+            attempts.append(header[4])
+            if len(attempts) == 1:
+                writer.publish(StubExchange([StubMarket('BTCUSDT', 200.0)]))
+            return float(arrays['mark_price'][0])
+
+        assert reader.read(read_prices) == 200.0
+        assert attempts == [1, 2]
+
+        # Пока seq нечётный, согласованного снимка нет
+        writer.seq[0] += 1
+        reader.max_retries = 10
+        with pytest.raises(MarketSnapshotUnavailable):
+            reader.get_mark_prices()
+        writer.seq[0] += 1
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_snapshot_grows_past_initial_capacity(snapshot_name):
+    writer = MarketSnapshotWriter(snapshot_name, max_symbols=4, candles=5)
+    reader = MarketSnapshotReader(snapshot_name)
+    try:
+        writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0)]))
+        assert reader.get_mark_prices() == {'BTCUSDT': 100.0}
+
+        # Символов больше ёмкости: сегмент пересоздаётся, подключённый читатель видит все символы
+        markets = [StubMarket(f"SYM{i}USDT", float(i + 1)) for i in range(10)]
+        writer.publish(StubExchange(markets))
+        assert writer.max_symbols == 10
+        assert reader.get_mark_prices() == {market.symbol: market.mark_price for market in markets}
+        assert reader.get_market('SYM9USDT')['version'] == 2
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_reattaches_after_bot_restart(snapshot_name):
+    reader = MarketSnapshotReader(snapshot_name)
+    with pytest.raises(MarketSnapshotUnavailable):
+        reader.get_mark_prices()
+
+    writer = MarketSnapshotWriter(snapshot_name)
+    writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0)]))
+    assert reader.get_mark_prices() == {'BTCUSDT': 100.0}
+    writer.close()
+
+    writer = MarketSnapshotWriter(snapshot_name)
+    try:
+        writer.publish(StubExchange([StubMarket('ETHUSDT', 50.0)]))
+        assert reader.get_mark_prices() == {'ETHUSDT': 50.0}
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_follows_segment_recreated_after_writer_crash(snapshot_name):
+    crashed = MarketSnapshotWriter(snapshot_name)
+    crashed.publish(StubExchange([StubMarket('BTCUSDT', 100.0)]))
+    reader = MarketSnapshotReader(snapshot_name, stale_after=0.1)
+    assert reader.get_mark_prices() == {'BTCUSDT': 100.0}
+
+    # Писатель упал, не закрыв снимок: состояние сегмента осталось STATE_LIVE
+    del crashed.seq, crashed.arrays
+    crashed.shm.close()
+    time.sleep(0.2)
+
+    writer = MarketSnapshotWriter(snapshot_name)
+    try:
+        writer.publish(StubExchange([StubMarket('ETHUSDT', 50.0)]))
+        assert reader.get_mark_prices() == {'ETHUSDT': 50.0}
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_treats_unwritten_header_as_not_ready(snapshot_name):
+    shm = shared_memory.SharedMemory(snapshot_name, create=True, size=4096)
+    reader = MarketSnapshotReader(snapshot_name)
+    try:
+        with pytest.raises(MarketSnapshotUnavailable, match='not ready'):
+            reader.get_mark_prices()
+    finally:
+        reader.close()
+        shm.close()
+        shm.unlink()
+
+
+def test_reader_is_shared_between_threads(snapshot_name):
+    writer = MarketSnapshotWriter(snapshot_name, max_symbols=4, candles=5)
+    writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0)]))
+    reader = MarketSnapshotReader(snapshot_name)
+    stop = threading.Event()
+    errors = []
+
+    def read_loop():
+        while not stop.is_set():
+            try:
+                reader.get_market('BTCUSDT')
+            except MarketSnapshotUnavailable:
+                pass
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        # Бот перезапускается, пока читатели работают: сегмент закрывается и создаётся заново
+        for price in range(5):
+            writer.close()
+            writer = MarketSnapshotWriter(snapshot_name, max_symbols=4, candles=5)
+            writer.publish(StubExchange([StubMarket('BTCUSDT', 100.0 + price)]))
+            time.sleep(0.02)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        reader.close()
+        writer.close()
+    assert not errors
@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from lib.candle_series import CandleSeries
+from lib.exchange import Exchange
+from lib.market_workers import ShardCoordinator, ShardPublisher, ShardSymbols, assign_shard
+
+START = pd.Timestamp('2024-01-01')
+SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT']
+
+
+class StaticSymbols:
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+    def get_symbols(self):
+        return list(self.symbols)
+
+    def subscribe(self, listener):
+        pass
+
+
+class OfflineExchange(Exchange):
+    # Загрузка без сети: синтетические свечи, заканчивающиеся на START; цены зависят от символа
+    def get_kline(self, symbol, interval, limit, start=None):
+        step = pd.Timedelta(milliseconds=self.INTERVAL_MS[interval])
+        index = pd.DatetimeIndex([START - step * i for i in range(limit - 1, -1, -1)], name='timestamp')
+        prices = np.linspace(100, 110, limit) * (SYMBOLS.index(symbol) + 1)
+        return CandleSeries(index.values.astype('datetime64[ms]').astype(np.int64), prices, prices + 1, prices - 1,
+                            prices, np.ones(limit), np.full(limit, 5.0))
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_assign_shard_is_stable_and_balanced():
+    symbols = [f"SYM{i}USDT" for i in range(1000)]
+    counts = Counter(assign_shard(symbol, 4) for symbol in symbols)
+    assert set(counts) == {0, 1, 2, 3} and min(counts.values()) > 200
+
+    # Пятый воркер забирает часть символов, остальные символы остаются на своих воркерах
+    moved = [symbol for symbol in symbols if assign_shard(symbol, 5) != assign_shard(symbol, 4)]
+    assert all(assign_shard(symbol, 5) == 4 for symbol in moved)
+    assert 100 < len(moved) < 300
+
+
+def test_publisher_sends_only_changed_candles():
+    symbols = ShardSymbols()
+    exchange = OfflineExchange(symbols, None, None)
+    try:
+        exchange.updater.update_interval = 3600
+        publisher = ShardPublisher(0, exchange)
+        symbols.set_symbols(['BTCUSDT'])
+        # Добавление символов будит загрузчик, не дожидаясь очередного цикла
+        assert wait_for(lambda: exchange.update_markets() or exchange.get_market('BTCUSDT') is not None, 5)
+
+        result = publisher.collect()
+        mark_price, windows, open_fvgs = result.markets['BTCUSDT']
+        assert len(windows['15m']) == 100 and len(windows['4h']) == 100
+        assert set(open_fvgs) == {'15m', '4h'}
+        assert result.status_table.symbols == ('BTCUSDT',)
+        assert publisher.collect() is None
+
+        # Формирующаяся свеча изменилась — уходит только она
+        market = exchange.get_market('BTCUSDT')
+        with exchange.market_data_lock:
+            market.engine.base.close[-1] += 1
+            market.engine.update(market.engine.base, market.engine.base.last_timestamp())
+        windows = publisher.collect().markets['BTCUSDT'][1]
+        assert len(windows['15m']) == 1 and windows['15m'].close[-1] == market.get_candles('15m').close[-1]
+        assert len(windows['4h']) == 1
+    finally:
+        exchange.stop()
+
+
+def test_workers_feed_bot_markets_and_status_table():
+    exchange = OfflineExchange(StaticSymbols(SYMBOLS), None, None, shard_workers=2, shard_publish_interval=0.2)
+    try:
+        assert wait_for(lambda: len(exchange.status_table.symbols) == len(SYMBOLS))
+        assert sorted(exchange.markets) == SYMBOLS
+        for index, symbol in enumerate(SYMBOLS):
+            market = exchange.get_market(symbol)
+            candles = market.get_candles('15m')
+            assert len(candles) == 100 and candles.close[-1] == 110 * (index + 1)
+            assert len(market.get_candles('4h')) == 100
+            assert exchange.status_table.get_status(symbol, '4h') == 'high'
+
+        # Удалённый символ пропадает из рынков бота и из таблицы статусов
+        exchange.symbol_manager.symbols = SYMBOLS[:3]
+        exchange.on_symbols_changed(SYMBOLS[:3])
+        assert wait_for(lambda: 'XRPUSDT' not in exchange.status_table)
+        assert sorted(exchange.markets) == SYMBOLS[:3]
+    finally:
+        exchange.stop()
+
+
+class FakeProcess:
+    exitcode = 1
+
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_coordinator_restarts_dead_worker_while_results_keep_arriving():
+    coordinator = ShardCoordinator(None, 2, OfflineExchange, {})
+    assert coordinator.settings['workers'] == 2
+    coordinator.CHECK_INTERVAL = 0.05
+    coordinator.results = queue.Queue()
+    coordinator.exchange = type('Mirror', (), {'apply_shard_result': lambda self, result: None})()
+    coordinator.processes = {0: FakeProcess(False), 1: FakeProcess(False)}
+    spawned = []
+
+    def spawn(shard):
+        spawned.append(shard)
+        coordinator.processes[shard] = FakeProcess(True)
+
+    coordinator._spawn = spawn
+
+    # Очередь результатов не пустеет ни на момент: живой шард публикует непрерывно
+    def publish():
+        while not coordinator.stop_event.is_set():
+            coordinator.results.put(object())
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=publish), threading.Thread(target=coordinator._receive)]
+    for thread in threads:
+        thread.start()
+    try:
+        assert wait_for(lambda: sorted(spawned) == [0, 1], timeout=5)
+    finally:
+        coordinator.stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+def test_worker_exchange_takes_its_share_of_rate_limits():
+    exchange = OfflineExchange(StaticSymbols([]), None, None, rate_limit_share=0.25)
+    try:
+        assert exchange.ip_rate_limiter.rate == Exchange.IP_RATE_LIMIT / 4
+        assert exchange.rate_limiters['kline'].rate == Exchange.ENDPOINT_RATE_LIMITS['kline'] / 4
+    finally:
+        exchange.stop()
@@ -0,0 +1,55 @@
+import urllib.request
+
+import pytest
+
+from lib.metrics import MetricsRegistry, MetricsServer
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter('izzy_requests_total', 'Requests', ('endpoint',))
+    requests.labels('kline').inc()
+    requests.labels('kline').inc(2)
+    requests.labels('say "hi"\n').inc()
+    depth = registry.gauge('izzy_queue_depth', 'Queue depth')
+    depth.set_function(lambda: 3)
+    ages = registry.gauge('izzy_age_seconds', 'Age', ('symbol',))
+    ages.set_function(lambda: {('BTCUSDT',): 1.5})
+    duration = registry.histogram('izzy_duration_seconds', 'Duration', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        duration.observe(value)
+
+    # Повторное объявление возвращает ту же метрику, с другим типом — ошибка
+    assert registry.counter('izzy_requests_total', 'Requests', ('endpoint',)) is requests
+    with pytest.raises(ValueError):
+        registry.gauge('izzy_requests_total', 'Requests')
+    with pytest.raises(ValueError):
+        requests.inc()
+
+    lines = registry.render().splitlines()
+    assert '# TYPE izzy_requests_total counter' in lines
+    assert 'izzy_requests_total{endpoint="kline"} 3.0' in lines
+    assert 'izzy_requests_total{endpoint="say \\"hi\\"\\n"} 1.0' in lines
+    assert 'izzy_queue_depth 3.0' in lines
+    assert 'izzy_age_seconds{symbol="BTCUSDT"} 1.5' in lines
+    assert lines[-5:] == [
+        'izzy_duration_seconds_bucket{le="0.1"} 2.0',
+        'izzy_duration_seconds_bucket{le="1.0"} 3.0',
+        'izzy_duration_seconds_bucket{le="+Inf"} 4.0',
+        'izzy_duration_seconds_sum 5.65',
+        'izzy_duration_seconds_count 4.0',
+    ]
+
+
+def test_server_exposes_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.counter('izzy_started_total', 'Starts').inc()
+    server = MetricsServer('127.0.0.1', 0, registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'izzy_started_total 1.0' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other")
+    finally:
+        server.stop()
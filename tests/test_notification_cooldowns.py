@@ -0,0 +1,48 @@
+import asyncio
+
+from sqlalchemy import func, select
+from lib.db_utils import create_async_db_engine, create_async_session_maker
+from lib.models import Base, NotificationHistory
+from lib.notification_cooldowns import NotificationCooldowns
+
+
+async def count_history(AsyncSession):
+    async with AsyncSession() as session:
+        return await session.scalar(select(func.count()).select_from(NotificationHistory))
+
+
+def test_cooldowns_load_latest_and_flush_in_batches(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'izzy.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        AsyncSession = create_async_session_maker(engine)
+        async with AsyncSession() as session:
+            for timestamp in (100, 300, 200):
+                session.add(NotificationHistory(user_id=1, symbol='BTCUSDT', notification_type='price',
+                                                price_status='high', timeframe='15m', timestamp=timestamp))
+            await session.commit()
+
+        cooldowns = NotificationCooldowns(AsyncSession, flush_size=3)
+        await cooldowns.load()
+        assert cooldowns.last_sent == {(1, 'BTCUSDT', 'price', 'high', '15m'): 300}
+        assert not cooldowns.should_send(1, 'BTCUSDT', 'price', 'high', '15m', 350, 60)
+        assert cooldowns.should_send(1, 'BTCUSDT', 'price', 'high', '15m', 400, 60)
+        assert cooldowns.should_send(1, 'BTCUSDT', 'fvg', None, '15m', 350, 60)
+
+        await cooldowns.record(1, 'BTCUSDT', 'fvg', None, '15m', 350)
+        await cooldowns.record(2, 'BTCUSDT', 'fvg', None, '4h', 350)
+        assert not cooldowns.should_send(1, 'BTCUSDT', 'fvg', None, '15m', 360, 60)
+        assert await count_history(AsyncSession) == 3
+
+        # Третья запись заполняет пачку и сбрасывает её в БД
+        await cooldowns.record(1, 'BTCUSDT', 'price', 'high', '15m', 400)
+        assert not cooldowns.pending
+        assert await count_history(AsyncSession) == 6
+
+        reloaded = NotificationCooldowns(AsyncSession)
+        await reloaded.load()
+        assert reloaded.last_sent == cooldowns.last_sent
+        await engine.dispose()
+
+    asyncio.run(scenario())
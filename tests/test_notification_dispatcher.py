@@ -0,0 +1,28 @@
+import asyncio
+
+from telegram.error import Forbidden, RetryAfter
+from lib.notification_dispatcher import NotificationDispatcher
+
+
+def test_dispatcher_delivers_concurrently_within_limits():
+    dispatcher = NotificationDispatcher(global_rate=40)
+    dispatcher.RETRY_DELAY = 0
+    sent = []
+    flood = {'raised': False}
+
+    async def send(chat_id):
+        if chat_id == 13:
+            raise Forbidden('bot was blocked by the user')
+        if chat_id == 7 and not flood['raised']:
+            flood['raised'] = True
+            raise RetryAfter(1)
+        await asyncio.sleep(0.05)
+        sent.append(chat_id)
+
+    report = asyncio.run(dispatcher.deliver(range(60), send, 'test'))
+
+    assert sorted(report.sent) == sorted(sent) == [chat_id for chat_id in range(60) if chat_id != 13]
+    assert report.rejected == [13] and report.failed == [] and report.retries == 1
+    # 60 отправок при ведре на 40 сообщений: первые 40 сразу, остальные — по мере пополнения (и паузы RetryAfter),
+    # но не последовательно по 50 мс на каждую
+    assert 0.9 <= report.elapsed < 2.0
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.generators import generate_candles
+from lib.db_utils import create_async_db_engine, create_async_session_maker
+from lib.fvg import FVG
+from lib.fvg_tracker import FVGCreated, FVGFilled
+from lib.models import Base, Symbol, User
+from lib.notification_manager import NotificationManager
+from lib.replay import CapturingBot, ReplayExchange, SimulatedClock
+
+
+class BullishCandle:
+    def is_bullish(self):
+        return True
+
+
+def test_fvg_fill_is_sent_within_timeout_of_its_creation(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'izzy.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        AsyncSession = create_async_session_maker(engine)
+        async with AsyncSession() as session:
+            session.add(User(id=1, notification_timeout=3600, price_notifications=False, fvg_notifications=True))
+            session.add(Symbol(symbol='BTCUSDT', icon_class='', monitor_fvg=True, fvg_threshold=0.0))
+            await session.commit()
+
+        exchange = ReplayExchange(('15m',))
+        exchange.add_market('BTCUSDT', generate_candles(200))
+        clock = SimulatedClock(1_000_000)
+        bot = CapturingBot(clock)
+        manager = NotificationManager(exchange, AsyncSession, clock=clock)
+        context = SimpleNamespace(bot=bot)
+        fvg = FVG(100.0, 101.0, BullishCandle(), covered_size=0.0)
+
+        manager.on_fvg_event(FVGCreated('BTCUSDT', '15m', fvg, 0))
+        await manager.check_and_send_notifications(context)
+        # Проторговка через 15 минут — в пределах паузы после уведомления об образовании, но это другое уведомление
+        clock.advance_to(1_000_900)
+        manager.on_fvg_event(FVGFilled('BTCUSDT', '15m', fvg, 0))
+        await manager.check_and_send_notifications(context)
+        # Повторное образование в пределах паузы не отправляется
+        clock.advance_to(1_001_800)
+        manager.on_fvg_event(FVGCreated('BTCUSDT', '15m', fvg, 0))
+        await manager.check_and_send_notifications(context)
+        await engine.dispose()
+        return bot.sent
+
+    sent = asyncio.run(scenario())
+    assert [(timestamp, text.endswith('проторгован')) for timestamp, _, text in sent] == [
+        (1_000_000, False), (1_000_900, True)]
@@ -0,0 +1,29 @@
+from lib.rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def test_bucket_throttles_at_configured_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(10, clock=clock, sleep=clock.sleep)
+
+    # Накопленные capacity токенов выдаются сразу, дальше — по одному каждые 1/rate секунды
+    assert all(bucket.acquire() == 0 for _ in range(10))
+    assert bucket.try_acquire() == 0.1
+    for _ in range(50):
+        bucket.acquire()
+    assert abs(clock.now - 5.0) < 1e-9
+
+    # Простой не копит больше capacity
+    clock.now += 60
+    assert all(bucket.acquire() == 0 for _ in range(10))
+    assert bucket.try_acquire() > 0
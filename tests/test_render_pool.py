@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from lib.candle_series import CandleSeries
+from lib.render_pool import RenderPool, RenderPoolBusy
+
+
+def make_payload(size=100):
+    prices = np.linspace(100, 110, size)
+    candles = CandleSeries(np.arange(size, dtype=np.int64) * 900_000, prices, prices + 1, prices - 1, prices,
+                           np.ones(size), np.full(size, 5.0))
+    return {'candles': candles, 'title': 'BTCUSDT - 15m', 'ranges': [(101, 103, 'green', 0.1)],
+            'price_ranges': (102, 108)}
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = RenderPool(workers=2, max_pending=3).start()
+    yield pool
+    pool.stop()
+
+
+def test_render_does_not_block_event_loop(pool):
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        started = time.monotonic()
+        images = await asyncio.gather(*[pool.render(make_payload()) for _ in range(3)])
+        elapsed = time.monotonic() - started
+        task.cancel()
+        return images, ticks, elapsed
+
+    images, ticks, elapsed = asyncio.run(scenario())
+    assert all(image.startswith(b'\x89PNG') for image in images)
+    # Пока процессы рендерят, event loop продолжает крутиться
+    assert ticks >= elapsed / 0.01 * 0.5
+
+
+def test_render_rejects_when_queue_is_full(pool):
+    async def scenario():
+        renders = [asyncio.ensure_future(pool.render(make_payload())) for _ in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(RenderPoolBusy):
+            await pool.render(make_payload())
+        await asyncio.gather(*renders)
+
+    asyncio.run(scenario())
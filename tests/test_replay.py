@@ -0,0 +1,65 @@
+import tempfile
+
+import pytest
+
+from benchmarks.generators import generate_universe
+from lib.candle_store import CandleStore
+from lib.replay import ReplayEngine, load_recorded_history
+from lib.timeframes import resample_length
+
+TIMEFRAMES = ('15m', '4h')
+
+
+def test_replay_reports_alerts_latency_and_throughput(tmp_path):
+    warmup = resample_length(TIMEFRAMES, 100)
+    history = generate_universe(2, warmup + 200, gap_density=0.2)
+    engine = ReplayEngine(history, TIMEFRAMES, users=2, notification_timeout=3600,
+                          db_url=f"sqlite:///{tmp_path / 'replay.db'}")
+    report = engine.run()
+
+    assert report.candles == 400
+    assert report.latency_stats()['checks'] == 200
+    assert report.candles_per_second > 0
+    assert report.end - report.start == 200 * 15 * 60
+    per_symbol = report.alerts_per_symbol()
+    assert set(per_symbol) == set(history)
+    assert all(kinds.get('fvg') for kinds in per_symbol.values())
+    # Оба пользователя получают каждое уведомление
+    assert report.messages == 2 * len(report.alerts)
+
+    # Паузы считаются по симулированным часам: повтор того же уведомления не раньше чем через час
+    last_sent = {}
+    for timestamp, symbol, kind, status, timeframe, recipients in report.alerts:
+        if kind != 'price':
+            continue
+        key = (symbol, status, timeframe)
+        if key in last_sent:
+            assert timestamp - last_sent[key] >= 3600
+        last_sent[key] = timestamp
+    assert all(sent_at >= report.start for sent_at, _, _ in engine.bot.sent)
+
+
+def test_replay_removes_temporary_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    history = generate_universe(1, resample_length(TIMEFRAMES, 100) + 5)
+    assert ReplayEngine(history, TIMEFRAMES).run().candles == 5
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_replay_rejects_history_shorter_than_warmup():
+    warmup = resample_length(TIMEFRAMES, 100)
+    history = generate_universe(2, warmup + 10)
+    history['SYM0001USDT'] = history['SYM0001USDT'][:warmup]
+    with pytest.raises(ValueError, match='SYM0001USDT'):
+        ReplayEngine(history, TIMEFRAMES)
+
+
+def test_load_recorded_history(tmp_path):
+    history = generate_universe(2, 50)
+    store = CandleStore(str(tmp_path))
+    for symbol, candles in history.items():
+        store.write(symbol, '15m', candles)
+
+    loaded = load_recorded_history(str(tmp_path))
+    assert sorted(loaded) == sorted(history)
+    assert list(loaded['SYM0001USDT'].close) == list(history['SYM0001USDT'].close)
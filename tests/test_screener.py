@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from lib.candle_series import CandleSeries
+from lib.market import Market
+from lib.screener import ExtremeRangeScreener
+
+QUARTER = 15 * 60 * 1000
+
+
+def make_market(symbol, seed, count=1700):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    market = Market(None, symbol)
+    market.engine.update(CandleSeries(np.arange(count) * QUARTER, open_, np.maximum(open_, close) + 0.5,
+                                      np.minimum(open_, close) - 0.5, close, np.ones(count)))
+    return market
+
+
+def assert_matches_markets(table, markets):
+    for symbol, market in markets.items():
+        for timeframe in market.timeframes:
+            assert table.get_status(symbol, timeframe) == market.is_price_in_extreme_range(timeframe)
+            assert table.get_thresholds(symbol, timeframe) == pytest.approx(market.get_price_thresholds(timeframe))
+
+
+def test_screener_matches_per_market_computation():
+    markets = {f"S{i}USDT": make_market(f"S{i}USDT", i) for i in range(20)}
+    markets['EMPTYUSDT'] = Market(None, 'EMPTYUSDT')
+    screener = ExtremeRangeScreener(('15m', '4h'))
+
+    table = screener.screen(markets)
+    assert_matches_markets(table, markets)
+    assert table.get_thresholds('EMPTYUSDT', '4h') == (None, None)
+    assert set(table.extremes()) == {(symbol, timeframe, table.get_status(symbol, timeframe))
+                                     for symbol in markets for timeframe in ('15m', '4h')
+                                     if table.get_status(symbol, timeframe) != 'normal'}
+    with pytest.raises(ValueError):
+        table.status[0, 0] = 1
+
+    # Формирующаяся свеча пробивает максимум — кэш закрытых свечей не мешает увидеть новый экстремум
+    market = markets['S3USDT']
+    base = market.engine.base
+    base.high[-1] = base.close[-1] = base.high.max() + 10
+    market.engine.update(base, base.last_timestamp())
+    updated = screener.screen(markets)
+    assert updated.get_status('S3USDT', '15m') == 'high' and updated.get_status('S3USDT', '4h') == 'high'
+    assert_matches_markets(updated, markets)
+    # Предыдущая таблица не изменилась
+    assert table.version == 1 and updated.version == 2
+
+    # Поздняя правка закрытой свечи не сдвигает окно, но должна сбросить кэш её экстремумов
+    base = market.engine.base
+    index = len(base) - 3
+    market.apply_candle('15m', int(base.timestamps[index]), base.open[index], base.high.max() + 50,
+                        base.low[index], base.close[index], base.volume[index])
+    assert_matches_markets(screener.screen(markets), markets)
+
+    del markets['S5USDT']
+    assert 'S5USDT' not in screener.screen(markets)
+    assert 'S5USDT' not in screener.closed_extremes['15m']
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from lib.db_utils import create_async_db_engine, create_async_session_maker
+from lib.models import Base, Symbol
+from lib.symbol_manager import SymbolManager
+
+
+def test_snapshot_versions_and_change_notifications(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'izzy.db'}"
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    async_engine = create_async_db_engine(db_url)
+    manager = SymbolManager(Session, create_async_session_maker(async_engine))
+    changes = []
+    manager.subscribe(changes.append)
+    threads = []
+    manager.subscribe(lambda symbols: threads.append(threading.current_thread()))
+
+    manager.add_symbol('BTCUSDT', 'fab fa-bitcoin')
+    assert manager.get_symbols() == ['BTCUSDT'] and changes == [['BTCUSDT']]
+    version = manager.version
+
+    # Изменения в обход бота (настройки BTCUSDT и новый ETHUSDT) видны только после перечитывания:
+    # одна новая версия снимка, и слушатели узнают о добавленном символе
+    with Session() as session:
+        session.get(Symbol, 'BTCUSDT').monitor_fvg = True
+        session.add(Symbol(symbol='ETHUSDT', icon_class='fab fa-ethereum'))
+        session.commit()
+    assert manager.get_symbols() == ['BTCUSDT']
+    assert asyncio.run(manager.refresh_async())
+    assert manager.version == version + 1
+    assert manager.get_symbol('BTCUSDT').monitor_fvg
+    assert changes[-1] == ['BTCUSDT', 'ETHUSDT']
+    # Слушатели вызываются не в потоке event loop
+    assert threads[-1] is not threading.main_thread()
+
+    assert not manager.reload()
+    manager.remove_symbol('ETHUSDT')
+    assert changes == [['BTCUSDT'], ['BTCUSDT', 'ETHUSDT'], ['BTCUSDT']]
+    asyncio.run(async_engine.dispose())
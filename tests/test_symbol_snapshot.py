@@ -0,0 +1,35 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from lib.models import Base, Symbol
+from lib.symbol_snapshot import SymbolSnapshot
+
+
+def test_snapshot_rebuilds_only_when_data_changes():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all([Symbol(symbol='BTCUSDT', icon_class='fab fa-bitcoin', last_mark_price=65000),
+                         Symbol(symbol='ETHUSDT', icon_class='fab fa-ethereum')])
+        session.commit()
+
+    snapshot = SymbolSnapshot(Session, check_interval=0)
+    first = snapshot.get_symbols()
+    assert [row['symbol'] for row in json.loads(first.body)] == ['BTCUSDT', 'ETHUSDT']
+    assert json.loads(snapshot.get_symbol('BTCUSDT').body)['last_mark_price'] == 65000.0
+    assert snapshot.get_symbol('SOLUSDT') is None
+    assert json.loads(snapshot.get_batch(['ETHUSDT', 'SOLUSDT', 'ETHUSDT']).body) == {
+        'ETHUSDT': {'symbol': 'ETHUSDT', 'icon_class': 'fab fa-ethereum', 'last_mark_price': None},
+        'SOLUSDT': None
+    }
+
+    # Без изменений в БД — тот же объект ответа и тот же ETag
+    assert snapshot.get_symbols() is first and snapshot.version == 1
+
+    with Session() as session:
+        session.get(Symbol, 'ETHUSDT').last_mark_price = 3500
+        session.commit()
+    updated = snapshot.get_symbols()
+    assert snapshot.version == 2 and updated.etag != first.etag
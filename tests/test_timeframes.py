@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from lib.candle_series import CandleSeries
+from lib.timeframes import TimeframeEngine, history_length, parse_timeframes, resample, resample_history
+
+HOUR = 60 * 60 * 1000
+QUARTER = 15 * 60 * 1000
+
+
+def make_base(count, start=0, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    open_interest = rng.uniform(1000, 2000, count)
+    open_interest[rng.random(count) < 0.2] = np.nan
+    return CandleSeries(start + np.arange(count) * QUARTER, open_, np.maximum(open_, close) + 1,
+                        np.minimum(open_, close) - 1, close, rng.uniform(1, 10, count), open_interest)
+
+
+def test_resample_matches_pandas():
+    # Начало не кратно часу: первая неполная часовая свеча должна быть отброшена
+    base = make_base(50, start=2 * QUARTER)
+    hourly = resample(base, HOUR)
+
+    df = base.to_dataframe()
+    expected = df.resample('1h').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                      'volume': 'sum', 'open_interest': 'last'}).iloc[1:]
+    assert list(hourly.timestamps) == list(expected.index.values.astype('datetime64[ms]').astype(np.int64))
+    for column in ('open', 'high', 'low', 'close', 'volume', 'open_interest'):
+        np.testing.assert_allclose(getattr(hourly, column), expected[column].to_numpy(), equal_nan=True)
+    # Последняя свеча формируется из двух базовых из четырёх
+    assert hourly.timestamps[-1] == 12 * HOUR and hourly.close[-1] == base.close[-1]
+
+
+def test_incremental_update_matches_full_resample():
+    base = make_base(400)
+    timeframes = ('15m', '1h', '4h')
+    engine = TimeframeEngine(timeframes, max_candles=20)
+    # Окно графика и одна корзина 4h: историю старших таймфреймов база не хранит
+    assert engine.base_length == history_length(('4h', '15m'), 20) == 20 + 16
+
+    assert engine.update(base[:300], history=resample_history(base[:300], timeframes, 20)) == []
+    for count in range(301, 401):
+        engine.update(base[:count], int(base.timestamps[count - 1]))
+        # Формирующаяся базовая свеча обновляется
+        base.close[count - 1] += 0.5
+        engine.update(base[:count], int(base.timestamps[count - 1]))
+
+    expected_windows = dict(resample_history(base, timeframes, 20), **{'15m': base.tail(20)})
+    for timeframe in timeframes:
+        incremental, expected = engine.get(timeframe), expected_windows[timeframe]
+        assert len(incremental) == 20
+        np.testing.assert_array_equal(incremental.timestamps, expected.timestamps)
+        np.testing.assert_allclose(incremental.close, expected.close)
+        np.testing.assert_allclose(incremental.high, expected.high)
+        np.testing.assert_allclose(incremental.open_interest, expected.open_interest, equal_nan=True)
+
+
+def test_history_joins_base_and_reports_gaps():
+    base = make_base(400)
+    timeframes = ('15m', '4h')
+    history = resample_history(base[:300], timeframes, 20)
+    engine = TimeframeEngine(timeframes, max_candles=20)
+
+    # Полная загрузка базы: закрытые свечи 4h остаются из истории, корзины под базой пересобираются
+    engine.update(base[:300], history=history)
+    assert engine.update(base[:310]) == []
+    np.testing.assert_allclose(engine.get('4h').close, resample_history(base[:310], timeframes, 20)['4h'].close)
+
+    # База после долгого перерыва не стыкуется с историей: таймфрейм нужно загрузить заново
+    engine = TimeframeEngine(timeframes, max_candles=20)
+    assert engine.update(base[300:], history=resample_history(base[:200], timeframes, 20)) == ['4h']
+
+
+def test_timeframes_are_validated_and_closing_timeframes_found():
+    assert parse_timeframes('4h, 15m,1h') == ('15m', '1h', '4h')
+    with pytest.raises(ValueError):
+        parse_timeframes('15m,3h')
+    # Для 2h у Bybit нет интервала ОИ, базовым он быть не может
+    with pytest.raises(ValueError):
+        parse_timeframes('2h,4h')
+
+    engine = TimeframeEngine(('15m', '1h', '4h'))
+    assert engine.closing_timeframes(3 * HOUR + 3 * QUARTER) == ['15m', '1h', '4h']
+    assert engine.closing_timeframes(HOUR + 3 * QUARTER) == ['15m', '1h']
+    assert engine.closing_timeframes(HOUR) == ['15m']
+    with pytest.raises(ValueError):
+        engine.get('1d')
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+from telegram import Chat
+from lib.db_utils import create_async_db_engine, create_async_session_maker
+from lib.models import Base, ChatGroup, User
+from lib.user_manager import UserManager
+
+
+def make_update(user_id, first_name='Izzy', chat_type=Chat.PRIVATE, chat_id=None, title=None):
+    user = SimpleNamespace(id=user_id, first_name=first_name, last_name='Moon', username='izzy', is_premium=False)
+    chat = SimpleNamespace(id=chat_id or user_id, type=chat_type, title=title)
+    return SimpleNamespace(effective_user=user, effective_chat=chat)
+
+
+def test_activity_is_buffered_and_upserted_in_batches(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'izzy.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        AsyncSession = create_async_session_maker(engine)
+        manager = UserManager(AsyncSession)
+
+        for _ in range(5):
+            manager.update_user_info(make_update(1))
+        manager.update_user_info(make_update(2))
+        manager.update_user_info(make_update(3, chat_type=Chat.GROUP, chat_id=-100, title='Traders'))
+        async with AsyncSession() as session:
+            assert await session.get(User, 1) is None
+
+        await manager.flush()
+        async with AsyncSession() as session:
+            assert await session.scalar(select(func.count()).select_from(User)) == 2
+            assert (await session.get(ChatGroup, -100)).title == 'Traders'
+
+        # Только свежий last_seen — записывать нечего; смена профиля попадает в следующую пачку
+        manager.update_user_info(make_update(1))
+        assert not manager.pending_users
+        manager.update_user_info(make_update(2, first_name='Izzy Moonbow'))
+        await manager.flush()
+        async with AsyncSession() as session:
+            assert (await session.get(User, 2)).first_name == 'Izzy Moonbow'
+        assert 'Izzy Moonbow' in await manager.get_registered_users()
+        await engine.dispose()
+
+    asyncio.run(scenario())